@@ -5,6 +5,7 @@ from flask import Flask
 from flask_cors import CORS
 from routes.api import api
 from models.db import db
+from config import database_url, engine_binds, engine_options, install_engine_hooks
 from dotenv import load_dotenv
 
 app = Flask(__name__)
@@ -16,23 +17,18 @@ load_dotenv()
 os.makedirs(app.instance_path, exist_ok=True)
 
 # Prefer DATABASE_URL/POSTGRES_URL if provided; else fallback to SQLite in instance/
-db_url = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
-if db_url:
-    # Normalize Heroku-style URLs
-    if db_url.startswith("postgres://"):
-        db_url = db_url.replace("postgres://", "postgresql://", 1)
-    # Use Postgres when provided; do not silently fall back
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url
-else:
-    # Fallback only when no DB URL is provided
-    db_path = os.path.join(app.instance_path, 'carondor.db')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url(app.instance_path)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_BINDS'] = engine_binds(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 CORS(app)
 db.init_app(app)
 
+with app.app_context():
+    for engine in db.engines.values():
+        install_engine_hooks(engine)
+
 # Register blueprints
 app.register_blueprint(api)
 
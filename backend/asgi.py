@@ -0,0 +1,350 @@
+"""ASGI entry point with async handlers for the hot read endpoints
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+These endpoints run as native coroutines on SQLAlchemy's async engine:
+
+    GET /api/game/town/<id>
+    GET /api/game/load/<id>
+    GET /api/game/list
+    GET /api/map/<id>
+
+A worker therefore does not park a thread per request while it waits on
+the database. Every other request is handed to the regular Flask app
+through asgiref's WSGI adapter. Both modes share the same models,
+blueprints and response shapes, and the WSGI entry points (app.py,
+run.py) keep working unchanged, so the two can be compared side by
+side.
+
+The async engine uses the same database as Flask. sqlite URLs are
+switched to aiosqlite and postgresql URLs to psycopg's async mode.
+ASYNC_DATABASE_URL overrides the URL, e.g. to use asyncpg.
+
+The handlers only read through it. The one write they make, crediting
+production in the town view, runs on the Flask session in a worker
+thread, so in SQLite high-concurrency mode it queues for the single
+writer like every other write; the async engine then opens the file
+read-only.
+"""
+
+import asyncio
+import os
+import re
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from app import app as flask_app
+from config import engine_options, install_engine_hooks, is_sqlite_single_writer, read_only_url
+from models.db import db, SavedGame, Building, ConstructionJob, MapTile, Resource, TrainingBatch
+from models.modifiers import cached_modifiers
+from models.resource_buffer import resource_writes
+from models.world_map import TERRAIN_TRAITS
+from routes.game import accrue_production
+from routes.streaming import STREAM_BATCH_SIZE, stream_error
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync SQLAlchemy URL to its async driver"""
+    if url.startswith('sqlite:'):
+        return url.replace('sqlite:', 'sqlite+aiosqlite:', 1)
+    if url.startswith('postgresql:'):
+        return url.replace('postgresql:', 'postgresql+psycopg:', 1)
+    return url  # postgresql+psycopg is already async-capable
+
+
+def default_async_url(url: str) -> str:
+    """Async URL for the Flask database; read-only when SQLite has a single writer"""
+    if is_sqlite_single_writer(url):
+        return to_async_url(read_only_url(url))
+    return to_async_url(url)
+
+
+ASYNC_URL = os.getenv('ASYNC_DATABASE_URL') or default_async_url(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+engine = create_async_engine(ASYNC_URL, **engine_options(ASYNC_URL, is_async=True))
+install_engine_hooks(engine.sync_engine)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+# Returned by a handler to pass the request on to the Flask app
+DELEGATE = object()
+
+
+class Streamed:
+    """A JSON object whose collections are streamed row by row"""
+
+    def __init__(self, fields, collections):
+        self.fields = fields
+        self.collections = collections  # key -> (async row iterator, serializer)
+
+
+class StreamedArray:
+    """A top-level JSON array streamed row by row"""
+
+    def __init__(self, rows, serialize):
+        self.rows = rows
+        self.serialize = serialize
+
+
+# ==================== HANDLERS ====================
+
+async def stream_rows(session, statement):
+    result = await session.stream_scalars(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+    async for row in result:
+        yield row
+
+
+async def load_game_rows(session, game_id):
+    """Load a game with its resources eagerly (lazy loads are not allowed in async)"""
+    if resource_writes.has_pending():
+        # The async session bypasses the sync session's flush-before-read hook
+        await asyncio.to_thread(resource_writes.flush_all)
+    return await session.get(SavedGame, game_id, options=[selectinload(SavedGame.resources)])
+
+
+async def queues_due(session, game_id, now):
+    """True if a training wave or construction job finished by `now` is not yet applied"""
+    batches = await session.scalars(
+        select(TrainingBatch).where(TrainingBatch.game_id == game_id, TrainingBatch.started_at <= now)
+    )
+    if any(batch.next_wave_at() <= now for batch in batches):
+        return True
+    statement = select(ConstructionJob.id).where(ConstructionJob.game_id == game_id, ConstructionJob.completes_at <= now)
+    return await session.scalar(statement.limit(1)) is not None
+
+
+def store_production(game_id, since, now, amounts, created):
+    """Write production credited by town_status through the Flask session
+
+    `since` is the game's updated_at the credit was computed from; if
+    another request has credited production in the meantime nothing is
+    written and False is returned.
+    """
+    with flask_app.app_context():
+        try:
+            claimed = db.session.execute(
+                update(SavedGame)
+                .where(SavedGame.id == game_id, SavedGame.updated_at == since)
+                .values(updated_at=now)
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                return False
+            for resource_type, amount in amounts.items():
+                if resource_type in created:
+                    db.session.add(Resource(game_id=game_id, resource_type=resource_type, amount=amount))
+                else:
+                    db.session.execute(
+                        update(Resource)
+                        .where(Resource.game_id == game_id, Resource.resource_type == resource_type)
+                        .values(amount=amount)
+                    )
+            db.session.commit()
+            return True
+        finally:
+            db.session.remove()
+
+
+def stream_game(session, game):
+    return Streamed(game.to_summary_dict(), {
+        key: (stream_rows(session, statement), lambda row: row.to_dict())
+        for key, statement in game.collection_statements().items()
+    })
+
+
+async def town_status(session, game_id):
+    """Async GET /api/game/town/<id>"""
+    game = await load_game_rows(session, game_id)
+    if not game:
+        return 404, {'error': 'Game not found'}
+    now = datetime.utcnow()
+    if await queues_due(session, game_id, now):
+        # Completing training and construction are writes; leave them to Flask
+        return DELEGATE
+
+    modifiers = cached_modifiers(game_id)
+    if modifiers is None or modifiers.version != (game.stats_version or 0):
+        # Compiling them reads talents and items on the sync session
+        return DELEGATE
+
+    buildings = (await session.scalars(select(Building).where(Building.game_id == game_id))).all()
+    resources = {r.resource_type: r for r in game.resources}
+    since = game.updated_at
+    created = accrue_production(game, buildings, resources, now, modifiers)
+    if created is not None:
+        amounts = {resource_type: r.amount for resource_type, r in resources.items()}
+        created_types = {r.resource_type for r in created}
+        # Drop the in-memory credit so it is never flushed through this engine
+        session.expire_all()
+        if not await asyncio.to_thread(store_production, game_id, since, now, amounts, created_types):
+            # Another request credited production first; Flask serves the current state
+            return DELEGATE
+        # Reload the committed rows, rounded to the column's precision like the sync route
+        game = await load_game_rows(session, game_id)
+
+    return 200, stream_game(session, game)
+
+
+async def load_game(session, game_id):
+    """Async GET /api/game/load/<id>"""
+    game = await load_game_rows(session, game_id)
+    if not game:
+        return 404, {'error': 'Game not found'}
+    if await queues_due(session, game_id, datetime.utcnow()):
+        return DELEGATE
+    return 200, stream_game(session, game)
+
+
+async def list_games(session):
+    """Async GET /api/game/list"""
+    statement = select(SavedGame).order_by(SavedGame.updated_at.desc())
+    return 200, StreamedArray(stream_rows(session, statement), SavedGame.to_list_dict)
+
+
+async def world_map(session, game_id):
+    """Async GET /api/map/<id>"""
+    if not await session.get(SavedGame, game_id):
+        return 404, {'error': 'Game not found'}
+
+    tile_count = await session.scalar(
+        select(func.count(MapTile.id)).where(MapTile.game_id == game_id)
+    )
+    if not tile_count:
+        # First visit generates the map; leave that write path to Flask
+        return DELEGATE
+
+    statement = select(MapTile).where(MapTile.game_id == game_id).order_by(MapTile.id)
+    return 200, Streamed({
+        'game_id': game_id,
+        'tile_count': tile_count,
+        'terrain_types': list(TERRAIN_TRAITS.keys()),
+    }, {
+        'tiles': (stream_rows(session, statement), MapTile.to_dict),
+    })
+
+
+ROUTES = [
+    (re.compile(r'^/api/game/town/(\d+)$'), town_status),
+    (re.compile(r'^/api/game/load/(\d+)$'), load_game),
+    (re.compile(r'^/api/game/list$'), list_games),
+    (re.compile(r'^/api/map/(\d+)$'), world_map),
+]
+
+
+# ==================== ASGI PLUMBING ====================
+
+def dumps(value) -> str:
+    # Same encoder settings as jsonify()
+    return flask_app.json.dumps(value)
+
+
+async def encode(body, ndjson):
+    """Yield the response body as text chunks"""
+    if isinstance(body, StreamedArray):
+        first = True
+        if not ndjson:
+            yield '['
+        async for row in body.rows:
+            if ndjson:
+                yield dumps(body.serialize(row)) + '\n'
+            else:
+                yield ('' if first else ',') + dumps(body.serialize(row))
+            first = False
+        if not ndjson:
+            yield ']'
+        return
+
+    if not isinstance(body, Streamed):
+        yield dumps(body)
+        return
+
+    if ndjson:
+        yield dumps(body.fields) + '\n'
+        for key, (rows, serialize) in body.collections.items():
+            async for row in rows:
+                yield dumps({'collection': key, 'item': serialize(row)}) + '\n'
+        return
+
+    yield dumps(body.fields)[:-1] + (',' if body.fields else '')
+    for index, (key, (rows, serialize)) in enumerate(body.collections.items()):
+        yield ('' if index == 0 else ',') + dumps(key) + ':['
+        first = True
+        async for row in rows:
+            yield ('' if first else ',') + dumps(serialize(row))
+            first = False
+        yield ']'
+    yield '}'
+
+
+def wants_ndjson(scope) -> bool:
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if query.get('format') == ['ndjson']:
+        return True
+    accept = dict(scope.get('headers', [])).get(b'accept', b'')
+    return b'application/x-ndjson' in accept
+
+
+async def handle(handler, args, scope, receive, send):
+    ndjson = wants_ndjson(scope)
+    async with async_session() as session:
+        try:
+            result = await handler(session, *args)
+        except Exception as e:
+            await session.rollback()
+            result = 500, {'error': str(e)}
+
+        if result is DELEGATE:
+            await flask_asgi(scope, receive, send)
+            return
+
+        status, body = result
+        streamed = isinstance(body, (Streamed, StreamedArray))
+        content_type = b'application/x-ndjson' if ndjson and streamed else b'application/json'
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', content_type),
+                (b'access-control-allow-origin', b'*'),
+            ],
+        })
+        try:
+            async for chunk in encode(body, ndjson and streamed):
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        except Exception as e:
+            # The status has been sent; end the body so the client sees the failure
+            flask_app.logger.exception('Streamed response failed')
+            chunk = stream_error(e, ndjson and streamed, dumps)
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        for pattern, handler in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                await handle(handler, [int(g) for g in match.groups()], scope, receive, send)
+                return
+
+    await flask_asgi(scope, receive, send)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""Throughput benchmark: development server (run.py) vs production runner (serve.py)
+
+    python bench_server.py [--concurrency 16] [--seconds 10] [--path /api/game/list]
+
+Starts each server in turn on a free port, waits for /api/health, then
+hammers the given paths from `concurrency` keep-alive client threads and
+reports requests per second and latency percentiles. Both servers use the
+same database, so run it against a copy of your data.
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Server name -> command line; run.py hard-codes port 5000, so the
+# development server is started the same way through app.run()
+SERVERS = {
+    'dev (run.py)': ['-c', 'import os; from app import app; '
+                           'app.run(host="127.0.0.1", port=int(os.environ["PORT"]), '
+                           'debug=False, use_reloader=False)'],
+    'production (serve.py)': ['serve.py'],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not become ready')
+
+
+def run_load(port: int, paths, concurrency: int, seconds: float):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, failed, i, reused = [], 0, 0, False
+        while time.time() < stop_at:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                # A keep-alive connection closed by the server (e.g. a
+                # recycled worker) is retried like any HTTP client would
+                if not reused:
+                    failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                reused = False
+                continue
+            reused = True
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / seconds,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+        'errors': errors[0],
+    }
+
+
+def bench(command, args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), HOST='127.0.0.1')
+    proc = subprocess.Popen([sys.executable] + command, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        run_load(port, args.path, args.concurrency, 1)  # warm up
+        return run_load(port, args.path, args.concurrency, args.seconds)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--path', action='append',
+                        help='path to request (repeatable, default /api/health)')
+    args = parser.parse_args()
+    args.path = args.path or ['/api/health']
+
+    print(f'{"server":<24}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    for name, command in SERVERS.items():
+        result = bench(command, args)
+        print(f'{name:<24}{result["rps"]:>10.0f}{result["p50_ms"]:>10.1f}'
+              f'{result["p99_ms"]:>10.1f}{result["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
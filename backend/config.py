@@ -0,0 +1,271 @@
+"""Database connection configuration
+
+Builds the SQLAlchemy URL and engine options from environment variables,
+so deployments can tune the pool without code changes:
+
+    DB_POOL_SIZE            connections kept open per process (serve.py derives it)
+    DB_MAX_OVERFLOW         extra connections allowed under load
+    DB_POOL_TIMEOUT         seconds to wait for a free connection before failing (30)
+    DB_POOL_RECYCLE         reconnect connections older than this many seconds (1800)
+    DB_POOL_PRE_PING        test connections before handing them out (1)
+    DB_QUERY_CACHE_SIZE     compiled SQL statements cached per engine (500)
+    DB_POOL_WAIT_WARN_MS    log pool checkouts that waited longer than this (100)
+
+SQLite:
+    SQLITE_SINGLE_WRITER    high-concurrency mode: one queued writer connection plus
+                            read-only connections for SELECTs (1)
+    SQLITE_MEMORY           use a shared-cache in-memory database, e.g. for tests (0)
+    SQLITE_BUSY_TIMEOUT_MS  how long a writer waits for the lock (5000)
+    SQLITE_MMAP_SIZE        bytes of the file memory-mapped for reads (256 MiB)
+    SQLITE_SYNCHRONOUS      synchronous pragma; NORMAL is safe with WAL (NORMAL)
+
+Postgres (psycopg 3):
+    PG_PREPARE_THRESHOLD    executions before a statement is prepared server-side;
+                            0 prepares everything, "none" disables (for pgbouncer
+                            in transaction mode) (1)
+    PG_PREPARED_MAX         prepared statements kept per connection (256)
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from models.session import READ_BIND
+
+logger = logging.getLogger(__name__)
+
+
+def env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.lower() not in ('0', 'false', 'no', 'off')
+
+
+# Name of the shared in-memory database used with SQLITE_MEMORY
+SQLITE_MEMORY_NAME = 'carondor_memory'
+
+# Keeps each shared in-memory database alive while the pools recycle
+_memory_keepers: Dict[str, sqlite3.Connection] = {}
+
+
+def database_url(instance_path: str) -> str:
+    """DATABASE_URL/POSTGRES_URL if set, else SQLite in the instance folder"""
+    db_url = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
+    if not db_url:
+        if env_bool('SQLITE_MEMORY', False):
+            return f"sqlite:///file:{SQLITE_MEMORY_NAME}?mode=memory&cache=shared&uri=true"
+        return f"sqlite:///{os.path.join(instance_path, 'carondor.db')}"
+
+    # Normalize Heroku-style URLs
+    if db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
+    # psycopg 3 is the installed driver; plain postgresql:// would pick psycopg2
+    if db_url.startswith("postgresql://"):
+        db_url = db_url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return db_url
+
+
+def is_sqlite_memory(url: str) -> bool:
+    if not url.startswith('sqlite'):
+        return False
+    return (url.endswith(':memory:') or 'mode=memory' in url
+            or url.rstrip('/') in ('sqlite:', 'sqlite+aiosqlite:'))
+
+
+def is_sqlite_single_writer(url: str) -> bool:
+    """True if the URL is a SQLite file database in high-concurrency mode"""
+    return (url.startswith('sqlite:') and not is_sqlite_memory(url) and 'mode=ro' not in url
+            and env_bool('SQLITE_SINGLE_WRITER', True))
+
+
+def read_only_url(url: str) -> str:
+    """URI form of a SQLite file URL that opens the file read-only"""
+    path = Path(make_url(url).database).resolve().as_posix()
+    # file:///C:/... on Windows, file:///home/... elsewhere
+    return f"sqlite:///file:///{path.lstrip('/')}?mode=ro&uri=true"
+
+
+def engine_binds(url: str) -> Dict[str, Dict[str, Any]]:
+    """Extra engines (SQLALCHEMY_BINDS) for the given database URL"""
+    if not is_sqlite_single_writer(url):
+        return {}
+    reader_url = read_only_url(url)
+    return {READ_BIND: {'url': reader_url, **engine_options(reader_url)}}
+
+
+# ==================== POOL WAIT TIMING ====================
+
+class PoolWaitStats:
+    """Running totals of how long checkouts waited for a pooled connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.slow_checkouts = 0
+
+    def record(self, seconds: float, slow: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if slow:
+                self.slow_checkouts += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'slow_checkouts': self.slow_checkouts,
+            }
+
+
+class TimedPoolMixin:
+    """Measures how long each checkout waits for a free connection"""
+
+    wait_stats: PoolWaitStats
+    warn_after_ms: int
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            slow = waited * 1000 > self.warn_after_ms
+            if slow:
+                logger.warning('Waited %.1f ms for a database connection (%s)', waited * 1000, self.status())
+            self.wait_stats.record(waited, slow)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+        self.warn_after_ms = env_int('DB_POOL_WAIT_WARN_MS', 100)
+
+    def recreate(self):
+        # Keep the totals across dispose() (e.g. after fork in serve.py)
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+        self.warn_after_ms = env_int('DB_POOL_WAIT_WARN_MS', 100)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+def pool_report(engine) -> Dict[str, Any]:
+    """Pool occupancy plus checkout wait statistics for one engine"""
+    pool = engine.pool
+    report: Dict[str, Any] = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        report.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+    stats = getattr(pool, 'wait_stats', None)
+    if stats is not None:
+        report['wait'] = stats.to_dict()
+    return report
+
+
+# ==================== ENGINE OPTIONS ====================
+
+def engine_options(url: str, is_async: bool = False) -> Dict[str, Any]:
+    """create_engine() keyword arguments for the given URL"""
+    options: Dict[str, Any] = {
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+        'query_cache_size': env_int('DB_QUERY_CACHE_SIZE', 500),
+    }
+
+    if not is_sqlite_memory(url):
+        # In-memory SQLite uses a single-connection pool that takes no sizing
+        options['poolclass'] = TimedAsyncQueuePool if is_async else TimedQueuePool
+        options['pool_timeout'] = env_int('DB_POOL_TIMEOUT', 30)
+        options['pool_recycle'] = env_int('DB_POOL_RECYCLE', 1800)
+        for key, name in (('pool_size', 'DB_POOL_SIZE'), ('max_overflow', 'DB_MAX_OVERFLOW')):
+            value = env_int(name, None)
+            if value is not None:
+                options[key] = value
+
+    if is_sqlite_single_writer(url) and not is_async:
+        # The pool's wait queue is the write queue: one writer at a time
+        options['pool_size'] = 1
+        options['max_overflow'] = 0
+
+    if url.startswith('postgresql+psycopg'):
+        threshold = os.getenv('PG_PREPARE_THRESHOLD', '1')
+        options['connect_args'] = {
+            'prepare_threshold': None if threshold.lower() == 'none' else int(threshold),
+        }
+
+    return options
+
+
+def install_engine_hooks(engine) -> None:
+    """Per-connection setup: SQLite pragmas, psycopg prepared statement cache"""
+    dialect = engine.dialect.name
+
+    if dialect == 'sqlite':
+        busy_timeout = env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+        mmap_size = env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+        synchronous = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+        url = str(engine.url)
+        memory = is_sqlite_memory(url)
+        read_only = 'mode=ro' in url
+
+        if memory and 'cache=shared' in url and url not in _memory_keepers:
+            # A shared in-memory database disappears with its last connection
+            query = '&'.join(f'{k}={v}' for k, v in engine.url.query.items() if k != 'uri')
+            _memory_keepers[url] = sqlite3.connect(f'{engine.url.database}?{query}', uri=True,
+                                                   check_same_thread=False)
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            if read_only:
+                cursor.execute('PRAGMA query_only=1')
+                cursor.execute(f'PRAGMA mmap_size={mmap_size}')
+            elif not memory:
+                # Readers no longer block the writer and vice versa
+                cursor.execute('PRAGMA journal_mode=WAL')
+                cursor.execute(f'PRAGMA synchronous={synchronous}')
+                cursor.execute(f'PRAGMA mmap_size={mmap_size}')
+            cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+            cursor.close()
+
+    elif dialect == 'postgresql' and engine.dialect.driver == 'psycopg':
+        prepared_max = env_int('PG_PREPARED_MAX', 256)
+
+        @event.listens_for(engine, 'connect')
+        def set_prepared_max(dbapi_connection, connection_record):
+            # Async connections are wrapped by SQLAlchemy's adapter
+            raw = getattr(dbapi_connection, 'driver_connection', dbapi_connection)
+            raw.prepared_max = prepared_max
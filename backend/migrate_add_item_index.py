@@ -0,0 +1,14 @@
+"""Add the (game_id, id) index used to page through items"""
+
+from app import app
+from models.db import db
+from sqlalchemy import text
+
+with app.app_context():
+    with db.engine.connect() as conn:
+        # Both SQLite and PostgreSQL support IF NOT EXISTS here
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_items_game_id ON items (game_id, id)"))
+        conn.commit()
+        print("ix_items_game_id is in place")
+
+    print("Migration completed successfully!")
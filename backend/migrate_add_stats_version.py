@@ -0,0 +1,30 @@
+"""Add stats_version column to saved_games table"""
+
+from app import app
+from models.db import db
+from sqlalchemy import text
+
+with app.app_context():
+    db_url = app.config['SQLALCHEMY_DATABASE_URI']
+    is_sqlite = 'sqlite' in db_url
+
+    with db.engine.connect() as conn:
+        if is_sqlite:
+            result = conn.execute(text("PRAGMA table_info(saved_games)"))
+            existing_columns = [row[1] for row in result]
+        else:
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='saved_games' AND column_name='stats_version'
+            """))
+            existing_columns = [row[0] for row in result]
+
+        if 'stats_version' not in existing_columns:
+            conn.execute(text("ALTER TABLE saved_games ADD COLUMN stats_version INTEGER DEFAULT 0"))
+            conn.commit()
+            print("Added stats_version column")
+        else:
+            print("stats_version column already exists")
+
+    print("Migration completed successfully!")
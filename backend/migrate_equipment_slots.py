@@ -0,0 +1,48 @@
+"""Move equipped items from items.equipped into the equipment_slots table
+
+Items are equipped through equipment_slots now. This copies the old
+flags over, keeping the newest item where a slot had several, and
+leaves items.equipped unused. Running it again does nothing.
+"""
+
+from app import app
+from models.db import db, EquipmentSlot, ITEM_TEMPLATES
+from sqlalchemy import text
+
+with app.app_context():
+    db_url = app.config['SQLALCHEMY_DATABASE_URI']
+    is_sqlite = 'sqlite' in db_url
+
+    with db.engine.connect() as conn:
+        if is_sqlite:
+            result = conn.execute(text("PRAGMA table_info(items)"))
+            existing_columns = [row[1] for row in result]
+        else:
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='items' AND column_name='equipped'
+            """))
+            existing_columns = [row[0] for row in result]
+
+    if 'equipped' not in existing_columns:
+        print("items.equipped does not exist; nothing to migrate")
+    else:
+        rows = db.session.execute(text(
+            "SELECT id, game_id, item_template FROM items WHERE equipped ORDER BY id"
+        )).all()
+        occupied = {(s.game_id, s.slot) for s in EquipmentSlot.query}
+
+        # Later (newer) items overwrite earlier ones in the same slot
+        slots = {}
+        for item_id, game_id, template in rows:
+            slot = ITEM_TEMPLATES.get(template, {}).get('type')
+            if slot and (game_id, slot) not in occupied:
+                slots[(game_id, slot)] = item_id
+
+        for (game_id, slot), item_id in slots.items():
+            db.session.add(EquipmentSlot(game_id=game_id, slot=slot, item_id=item_id))
+        db.session.commit()
+        print(f"Moved {len(slots)} equipped items to equipment_slots")
+
+    print("Migration completed successfully!")
@@ -0,0 +1,67 @@
+"""Add quantity column to items and stack duplicate unequipped items
+
+Unequipped items of the same template and rarity are merged into the
+oldest of them, whose quantity becomes their total. Equipped items are
+left alone. Running it again does nothing.
+"""
+
+from app import app
+from models.db import db
+from sqlalchemy import text
+
+UNEQUIPPED = "id NOT IN (SELECT item_id FROM equipment_slots)"
+
+with app.app_context():
+    db_url = app.config['SQLALCHEMY_DATABASE_URI']
+    is_sqlite = 'sqlite' in db_url
+
+    with db.engine.connect() as conn:
+        if is_sqlite:
+            result = conn.execute(text("PRAGMA table_info(items)"))
+            existing_columns = [row[1] for row in result]
+        else:
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='items' AND column_name='quantity'
+            """))
+            existing_columns = [row[0] for row in result]
+
+        if 'quantity' not in existing_columns:
+            conn.execute(text("ALTER TABLE items ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1"))
+            conn.commit()
+            print("Added quantity column")
+        else:
+            print("quantity column already exists")
+
+    with db.engine.begin() as conn:
+        conn.execute(text("UPDATE items SET rarity = 'common' WHERE rarity IS NULL"))
+        before = conn.execute(text("SELECT COUNT(*) FROM items")).scalar()
+
+        # The oldest item of each stack takes the quantity of the whole stack
+        conn.execute(text(f"""
+            UPDATE items SET quantity = (
+                SELECT SUM(other.quantity) FROM items other
+                WHERE other.game_id = items.game_id
+                  AND other.item_template = items.item_template
+                  AND other.rarity = items.rarity
+                  AND other.id NOT IN (SELECT item_id FROM equipment_slots)
+            )
+            WHERE id IN (
+                SELECT MIN(id) FROM items WHERE {UNEQUIPPED}
+                GROUP BY game_id, item_template, rarity HAVING COUNT(*) > 1
+            )
+        """))
+        conn.execute(text(f"""
+            DELETE FROM items
+            WHERE {UNEQUIPPED}
+              AND id NOT IN (
+                  SELECT MIN(id) FROM items WHERE {UNEQUIPPED}
+                  GROUP BY game_id, item_template, rarity
+              )
+        """))
+
+        after = conn.execute(text("SELECT COUNT(*) FROM items")).scalar()
+        print(f"Stacked items: {before} rows -> {after} rows")
+
+    print("Migration completed successfully!")
@@ -0,0 +1,60 @@
+"""Convert resources.amount from a float to fixed-point thousandths (BIGINT)
+
+Run once after upgrading; running it again does nothing.
+"""
+
+from app import app
+from models.db import db
+from sqlalchemy import text
+
+with app.app_context():
+    db_url = app.config['SQLALCHEMY_DATABASE_URI']
+    is_sqlite = 'sqlite' in db_url
+
+    # Pending buffered resource changes are written in the old format
+    from models.resource_buffer import resource_writes
+    resource_writes.flush_all()
+
+    with db.engine.connect() as conn:
+        if is_sqlite:
+            result = conn.execute(text("PRAGMA table_info(resources)"))
+            column_types = {row[1]: row[2].upper() for row in result}
+
+            if column_types.get('amount') == 'BIGINT':
+                print("resources.amount is already fixed-point")
+            else:
+                # SQLite cannot change a column's type, so rebuild the table
+                conn.execute(text("""
+                    CREATE TABLE resources_fixed (
+                        id INTEGER NOT NULL PRIMARY KEY,
+                        game_id INTEGER NOT NULL REFERENCES saved_games (id),
+                        resource_type VARCHAR(50) NOT NULL,
+                        amount BIGINT
+                    )
+                """))
+                conn.execute(text("""
+                    INSERT INTO resources_fixed (id, game_id, resource_type, amount)
+                    SELECT id, game_id, resource_type, CAST(ROUND(COALESCE(amount, 0) * 1000) AS INTEGER)
+                    FROM resources
+                """))
+                conn.execute(text("DROP TABLE resources"))
+                conn.execute(text("ALTER TABLE resources_fixed RENAME TO resources"))
+                conn.commit()
+                print("Converted resources.amount to fixed-point thousandths")
+        else:
+            result = conn.execute(text("""
+                SELECT data_type
+                FROM information_schema.columns
+                WHERE table_name='resources' AND column_name='amount'
+            """))
+            data_type = result.scalar()
+
+            if data_type == 'bigint':
+                print("resources.amount is already fixed-point")
+            else:
+                conn.execute(text("""
+                    ALTER TABLE resources
+                    ALTER COLUMN amount TYPE BIGINT USING ROUND(COALESCE(amount, 0) * 1000)::BIGINT
+                """))
+                conn.commit()
+                print("Converted resources.amount to fixed-point thousandths")
@@ -3,18 +3,52 @@
 
 Usage:
   Ensure DATABASE_URL points to your Postgres. Then run:
-    python migrate_sqlite_to_postgres.py
+    python migrate_sqlite_to_postgres.py [--source PATH] [--batch-size N] [--fresh] [--verify-only]
 
-This script preserves existing IDs and syncs Postgres sequences.
+Every table of the current schema is copied, parents before children,
+with its IDs preserved. Source rows are read in primary-key order, one
+batch at a time, so memory use does not grow with the table. Batches are
+written with COPY on Postgres and with executemany elsewhere.
+
+Each batch commits together with a checkpoint (the last key copied) in
+the target's migration_checkpoints table, so an interrupted run picks up
+where it stopped when started again; --fresh empties the target first.
+Afterwards the Postgres sequences are synced and every table's row count
+and checksum is compared between source and target.
+
+Columns missing from the source get their model default. Run the other
+migrate_*.py scripts against the source first so it has the current
+schema; a float resources.amount is converted to fixed point here.
 """
+import argparse
+import hashlib
 import sqlite3
+import sys
+import time
 from datetime import datetime
 
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Float, Integer, MetaData, String, Table,
+    column, func, select, table, text,
+)
+from sqlalchemy.types import TypeDecorator
+
 from app import app
-from models.db import db, SavedGame, Resource, Building, Unit
+from models.db import db, FixedPoint
 
 SQLITE_DB_PATH = 'instance/carondor.db'
 
+# Source rows per batch (and per target transaction)
+BATCH_SIZE = 10000
+
+checkpoints = Table(
+    'migration_checkpoints', MetaData(),
+    Column('table_name', String(100), primary_key=True),
+    Column('last_key', BigInteger),
+    Column('rows_copied', BigInteger, nullable=False, default=0),
+    Column('completed', Boolean, nullable=False, default=False),
+)
+
 
 def parse_dt(val):
     if not val:
@@ -27,103 +61,271 @@ def parse_dt(val):
         return None
 
 
-def migrate():
+def storage_type(col_type):
+    """The type a column is stored as, without TypeDecorator conversions"""
+    return col_type.impl_instance if isinstance(col_type, TypeDecorator) else col_type
+
+
+def converter(target_column, source_declared_type):
+    """Function turning a raw SQLite value into the target's stored value"""
+    col_type = target_column.type
+    if isinstance(col_type, FixedPoint):
+        if source_declared_type in ('BIGINT', 'INTEGER'):
+            return lambda v: v
+        # Not yet converted by migrate_resource_fixed_point.py
+        return lambda v: None if v is None else int(round(float(v) * col_type.scale))
+    stored = storage_type(col_type)
+    if isinstance(stored, DateTime):
+        return parse_dt
+    if isinstance(stored, Boolean):
+        return lambda v: None if v is None else bool(v)
+    if isinstance(stored, Float):
+        return lambda v: None if v is None else float(v)
+    if isinstance(stored, Integer):
+        return lambda v: None if v is None else int(v)
+    return lambda v: v
+
+
+def default_value(target_column):
+    """Model-side default for a column the source does not have"""
+    default = target_column.default
+    if default is None:
+        return None
+    if default.is_scalar:
+        return default.arg
+    if default.is_callable:
+        return default.arg(None)
+    return None
+
+
+def canonical(value):
+    """Text form of a stored value, the same whichever database it came from"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class TablePlan:
+    """What to copy from one source table, and how"""
+
+    def __init__(self, target_table, source_columns):
+        self.name = target_table.name
+        pk = list(target_table.primary_key.columns)
+        if len(pk) != 1:
+            raise ValueError(f'{self.name}: only single-column primary keys are supported')
+        self.key = pk[0].name
+
+        # Columns in both databases are copied; target-only columns get defaults
+        self.shared = [c for c in target_table.columns if c.name in source_columns]
+        self.missing = [c for c in target_table.columns if c.name not in source_columns]
+        self.convert = [converter(c, source_columns[c.name]) for c in self.shared]
+        self.defaults = [default_value(c) for c in self.missing]
+        self.columns = [c.name for c in self.shared] + [c.name for c in self.missing]
+        self.key_index = self.columns.index(self.key)
+
+        # Raw column types, so values are written and read as stored
+        self.raw = table(self.name, *[column(c.name, storage_type(c.type)) for c in target_table.columns])
+
+    def source_batches(self, source, after, batch_size):
+        names = ', '.join(f'"{c.name}"' for c in self.shared)
+        query = f'SELECT {names} FROM "{self.name}" WHERE "{self.key}" > ? ORDER BY "{self.key}" LIMIT ?'
+        while True:
+            rows = source.execute(query, (after, batch_size)).fetchall()
+            if not rows:
+                return
+            batch = [
+                tuple(convert(v) for convert, v in zip(self.convert, row)) + tuple(self.defaults)
+                for row in rows
+            ]
+            after = batch[-1][self.key_index]
+            yield batch
+
+    def target_batches(self, conn, batch_size):
+        key = self.raw.c[self.key]
+        shared = [self.raw.c[c.name] for c in self.shared]
+        after = None
+        while True:
+            query = select(*shared).order_by(key).limit(batch_size)
+            if after is not None:
+                query = query.where(key > after)
+            rows = conn.execute(query).all()
+            if not rows:
+                return
+            after = rows[-1][self.columns.index(self.key)]
+            yield rows
+
+
+def write_batch(conn, plan, rows):
+    if conn.dialect.name == 'postgresql':
+        # psycopg COPY streams the rows without a statement per row
+        names = ', '.join(f'"{c}"' for c in plan.columns)
+        with conn.connection.driver_connection.cursor() as cursor:
+            with cursor.copy(f'COPY "{plan.name}" ({names}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+    else:
+        conn.execute(plan.raw.insert(), [dict(zip(plan.columns, row)) for row in rows])
+
+
+def save_checkpoint(conn, name, last_key, rows_copied, completed=False):
+    values = {'last_key': last_key, 'rows_copied': rows_copied, 'completed': completed}
+    updated = conn.execute(
+        checkpoints.update().where(checkpoints.c.table_name == name).values(**values)
+    ).rowcount
+    if not updated:
+        conn.execute(checkpoints.insert().values(table_name=name, **values))
+
+
+def sync_sequence(conn, plan):
+    if conn.dialect.name != 'postgresql':
+        return
+    # NULL (and a no-op) for keys without a sequence, such as map_configs.game_id
+    conn.execute(
+        text(
+            f'SELECT setval(pg_get_serial_sequence(:t, :c), '
+            f'COALESCE((SELECT MAX("{plan.key}") FROM "{plan.name}"), 1))'
+        ),
+        {'t': plan.name, 'c': plan.key},
+    )
+
+
+def copy_table(engine, source, plan, batch_size):
+    with engine.connect() as conn:
+        state = conn.execute(
+            select(checkpoints.c.last_key, checkpoints.c.rows_copied, checkpoints.c.completed)
+            .where(checkpoints.c.table_name == plan.name)
+        ).first()
+        if state is None:
+            existing = conn.execute(select(func.count()).select_from(plan.raw)).scalar()
+            if existing:
+                raise RuntimeError(
+                    f'{plan.name} already has {existing} rows in the target; run with --fresh to replace them'
+                )
+    if state is not None and state.completed:
+        print(f'  {plan.name}: done in an earlier run ({state.rows_copied} rows)')
+        return
+
+    last_key = state.last_key if state is not None and state.last_key is not None else -sys.maxsize
+    copied = state.rows_copied if state is not None else 0
+    if copied:
+        print(f'  {plan.name}: resuming after key {last_key} ({copied} rows copied)')
+
+    started = time.monotonic()
+    for rows in plan.source_batches(source, last_key, batch_size):
+        with engine.begin() as conn:
+            write_batch(conn, plan, rows)
+            last_key = rows[-1][plan.key_index]
+            copied += len(rows)
+            save_checkpoint(conn, plan.name, last_key, copied)
+        rate = copied / max(time.monotonic() - started, 1e-6)
+        print(f'  {plan.name}: {copied} rows ({rate:.0f} rows/s)', end='\r')
+
+    with engine.begin() as conn:
+        sync_sequence(conn, plan)
+        save_checkpoint(conn, plan.name, last_key, copied, completed=True)
+    print(f'  {plan.name}: {copied} rows copied' + ' ' * 20)
+
+
+def checksum(batches, canonical_row):
+    digest = hashlib.md5()
+    count = 0
+    for rows in batches:
+        for row in rows:
+            digest.update('\x1f'.join(canonical_row(row)).encode('utf-8'))
+            digest.update(b'\x1e')
+        count += len(rows)
+    return count, digest.hexdigest()
+
+
+def verify(engine, source, plans, batch_size):
+    """Compare row counts and checksums of the shared columns; True if all match"""
+    ok = True
+    shared_count = {plan.name: len(plan.shared) for plan in plans}
+    with engine.connect() as conn:
+        for plan in plans:
+            n = shared_count[plan.name]
+            source_count, source_sum = checksum(
+                plan.source_batches(source, -sys.maxsize, batch_size),
+                lambda row: [canonical(v) for v in row[:n]],
+            )
+            target_count, target_sum = checksum(
+                plan.target_batches(conn, batch_size),
+                lambda row: [canonical(v) for v in row],
+            )
+            match = source_count == target_count and source_sum == target_sum
+            ok = ok and match
+            print(f'  {plan.name}: {source_count} -> {target_count} rows, '
+                  f'checksum {"OK" if match else "MISMATCH"}')
+    return ok
+
+
+def source_tables(source):
+    """{table: {column: declared type}} of the SQLite database"""
+    tables = {}
+    names = [row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for name in names:
+        tables[name] = {row[1]: (row[2] or '').upper() for row in source.execute(f'PRAGMA table_info("{name}")')}
+    return tables
+
+
+def empty_target(engine, plans):
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            names = ', '.join(f'"{plan.name}"' for plan in plans)
+            conn.execute(text(f'TRUNCATE {names} RESTART IDENTITY CASCADE'))
+        else:
+            for plan in reversed(plans):
+                conn.execute(plan.raw.delete())
+        conn.execute(checkpoints.delete())
+
+
+def migrate(source_path=SQLITE_DB_PATH, batch_size=BATCH_SIZE, fresh=False, verify_only=False):
     with app.app_context():
         # Ensure tables exist in target DB
         db.create_all()
+        engine = db.engine
+        checkpoints.create(engine, checkfirst=True)
 
-        # Connect to source SQLite
-        con = sqlite3.connect(SQLITE_DB_PATH)
-        con.row_factory = sqlite3.Row
-        cur = con.cursor()
-
-        # Read source data
-        cur.execute('SELECT * FROM saved_games')
-        saved_games = cur.fetchall()
-
-        cur.execute('SELECT * FROM resources')
-        resources = cur.fetchall()
-
-        cur.execute('SELECT * FROM buildings')
-        buildings = cur.fetchall()
-
-        cur.execute('SELECT * FROM units')
-        units = cur.fetchall()
-
-        # Insert into target DB preserving IDs
-        # Saved games
-        for g in saved_games:
-            obj = SavedGame(
-                id=g['id'],
-                hero_name=g['hero_name'],
-                hero_class=g['hero_class'],
-                hero_race=g['hero_race'],
-                level=g['level'],
-                experience=g['experience'],
-                created_at=parse_dt(g['created_at']) or datetime.utcnow(),
-                updated_at=parse_dt(g['updated_at']) or datetime.utcnow(),
-            )
-            db.session.merge(obj)
-
-        # Resources
-        for r in resources:
-            obj = Resource(
-                id=r['id'],
-                game_id=r['game_id'],
-                resource_type=r['resource_type'],
-                amount=r['amount'],
-            )
-            db.session.merge(obj)
-
-        # Buildings
-        for b in buildings:
-            obj = Building(
-                id=b['id'],
-                game_id=b['game_id'],
-                building_type=b['building_type'],
-                level=b['level'],
-                built_at=parse_dt(b['built_at']) or datetime.utcnow(),
-            )
-            db.session.merge(obj)
-
-        # Units
-        for u in units:
-            obj = Unit(
-                id=u['id'],
-                game_id=u['game_id'],
-                unit_type=u['unit_type'],
-                race=u['race'],
-                count=u['count'],
-                hired_at=parse_dt(u['hired_at']) or datetime.utcnow(),
-            )
-            db.session.merge(obj)
-
-        db.session.commit()
-
-        # Sync sequences in Postgres (no-op on SQLite)
-        try:
-            for table, col in [
-                ('saved_games', 'id'),
-                ('resources', 'id'),
-                ('buildings', 'id'),
-                ('units', 'id'),
-            ]:
-                db.session.execute(
-                    db.text(
-                        "SELECT setval(pg_get_serial_sequence(:t, :c), COALESCE((SELECT MAX(id) FROM "
-                        + table
-                        + "), 1))"
-                    ),
-                    {"t": table, "c": col},
-                )
-            db.session.commit()
-        except Exception:
-            # Likely not Postgres; ignore
-            pass
+        # Connect to source SQLite, read-only
+        source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+        available = source_tables(source)
+
+        plans = []
+        for target_table in db.metadata.sorted_tables:
+            if target_table.name not in available:
+                print(f'  {target_table.name}: not in the source, skipped')
+                continue
+            plans.append(TablePlan(target_table, available[target_table.name]))
+
+        if not verify_only:
+            if fresh:
+                empty_target(engine, plans)
+            print(f'Copying {len(plans)} tables from {source_path}')
+            for plan in plans:
+                copy_table(engine, source, plan, batch_size)
+
+        print('Verifying')
+        ok = verify(engine, source, plans, batch_size)
+        source.close()
 
-        con.close()
+        if not ok:
+            print('Migration finished with mismatches.')
+            return False
         print('Migration complete.')
+        return True
 
 
 if __name__ == '__main__':
-    migrate()
+    parser = argparse.ArgumentParser(description='Copy a SQLite database into the DATABASE_URL database')
+    parser.add_argument('--source', default=SQLITE_DB_PATH, help='SQLite file to read')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows per batch')
+    parser.add_argument('--fresh', action='store_true', help='empty the target tables and checkpoints first')
+    parser.add_argument('--verify-only', action='store_true', help='only compare source and target')
+    args = parser.parse_args()
+    sys.exit(0 if migrate(args.source, args.batch_size, args.fresh, args.verify_only) else 1)
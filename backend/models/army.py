@@ -0,0 +1,257 @@
+"""Cached army summary
+
+ArmySummary keeps a game's unit stacks together with their stats after
+the game's compiled modifiers (see modifiers), plus running totals (power per race
+and unit type, per-stat totals, upkeep). GET /api/game/unit/<id>/summary
+serves it from memory instead of loading and iterating the units.
+
+The summary is loaded once per game and then kept up to date:
+- `units_changed` after recruits or casualties are committed adjusts the
+  totals by the stack's per-unit values;
+- `bonuses_changed` after talents or special buildings change recomputes
+  the per-unit values from the stack counts, without reading units.
+
+The cache is per process, so the summary also records the versions it
+reflects: SavedGame.stats_version (through its modifiers) and
+SavedGame.units_version, which every change to a game's units bumps in
+its own transaction (`bump_units_version`). `get_army_summary` compares
+them with the game's: a newer stats_version recomputes the per-unit
+values, a newer units_version reloads the summary.
+
+Unit power is the formula the attack screen uses:
+attack + defense + hp / 10.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from .db import db, SavedGame, Unit, UNITS
+from .game_cache import GameCache
+from .modifiers import Modifiers, get_modifiers, invalidate_modifiers
+
+# Units that fight with magic; the rest benefit from physical attack bonuses
+MAGICAL_UNIT_TYPES = {'mage', 'healer', 'druid', 'shaman', 'warlock', 'fire_mage'}
+
+StackKey = Tuple[str, str]  # (race, unit_type)
+
+
+class ArmyModifiers:
+    """Unit stat and cost multipliers from a game's compiled modifiers"""
+
+    def __init__(self, modifiers: Modifiers):
+        self.version = modifiers.version  # SavedGame.stats_version
+        self.physical_attack = 1 + modifiers.unit_physical_attack
+        self.magical_attack = 1 + modifiers.unit_magical_attack
+        self.defense = 1 + modifiers.unit_defense
+        self.hp_bonus = modifiers.unit_hp_flat
+        self.hp = 1 + modifiers.unit_hp
+        self.cost = modifiers.unit_cost_multiplier()
+
+    def unit_stats(self, race: str, unit_type: str) -> Dict[str, float]:
+        """Per-unit attack, defense, hp and power after bonuses"""
+        unit_def = UNITS.get(race, {}).get(unit_type, {})
+        attack_multiplier = self.magical_attack if unit_type in MAGICAL_UNIT_TYPES else self.physical_attack
+        attack = unit_def.get('attack', 0) * attack_multiplier
+        defense = unit_def.get('defense', 0) * self.defense
+        hp = (unit_def.get('hp', 0) + self.hp_bonus) * self.hp
+        return {'attack': attack, 'defense': defense, 'hp': hp, 'power': attack + defense + hp / 10}
+
+    def unit_upkeep(self, race: str, unit_type: str) -> Dict[str, float]:
+        cost = UNITS.get(race, {}).get(unit_type, {}).get('cost', {})
+        return {resource: amount * self.cost for resource, amount in cost.items()}
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'physical_attack_multiplier': round(self.physical_attack, 4),
+            'magical_attack_multiplier': round(self.magical_attack, 4),
+            'defense_multiplier': round(self.defense, 4),
+            'hp_bonus': self.hp_bonus,
+            'hp_multiplier': round(self.hp, 4),
+            'cost_multiplier': round(self.cost, 4),
+        }
+
+
+class ArmySummary:
+    """A game's unit stacks and their running totals"""
+
+    def __init__(self, game_id: int, counts: Dict[StackKey, int], modifiers: ArmyModifiers,
+                 units_version: int = 0):
+        self.game_id = game_id
+        self.units_version = units_version  # SavedGame.units_version the counts were read at
+        self.lock = threading.Lock()
+        self.counts: Dict[StackKey, int] = {k: v for k, v in counts.items() if v > 0}
+        self._dict: Optional[Dict] = None
+        self._apply_modifiers(modifiers)
+
+    @classmethod
+    def load(cls, game_id: int) -> 'ArmySummary':
+        # Read before the units, so a change made in between is seen as newer
+        _, units_version = army_versions(game_id)
+        counts: Dict[StackKey, int] = {}
+        for race, unit_type, count in db.session.query(Unit.race, Unit.unit_type, Unit.count).filter(
+            Unit.game_id == game_id
+        ):
+            counts[(race, unit_type)] = counts.get((race, unit_type), 0) + (count or 0)
+        return cls(game_id, counts, load_modifiers(game_id), units_version)
+
+    def _apply_modifiers(self, modifiers: ArmyModifiers) -> None:
+        """Recompute per-unit values and totals from the stack counts"""
+        self.modifiers = modifiers
+        self.unit_stats: Dict[StackKey, Dict[str, float]] = {}
+        self.unit_upkeep: Dict[StackKey, Dict[str, float]] = {}
+        self.totals = {'attack': 0.0, 'defense': 0.0, 'hp': 0.0, 'power': 0.0}
+        self.race_power: Dict[str, float] = {}
+        self.upkeep: Dict[str, float] = {}
+        self.total_units = 0
+        for key, count in self.counts.items():
+            self._add(key, count)
+        self._dict = None
+
+    def _stats_for(self, key: StackKey) -> Tuple[Dict[str, float], Dict[str, float]]:
+        if key not in self.unit_stats:
+            self.unit_stats[key] = self.modifiers.unit_stats(*key)
+            self.unit_upkeep[key] = self.modifiers.unit_upkeep(*key)
+        return self.unit_stats[key], self.unit_upkeep[key]
+
+    def _add(self, key: StackKey, count: int) -> None:
+        stats, upkeep = self._stats_for(key)
+        for stat in self.totals:
+            self.totals[stat] += stats[stat] * count
+        self.race_power[key[0]] = self.race_power.get(key[0], 0) + stats['power'] * count
+        for resource, amount in upkeep.items():
+            self.upkeep[resource] = self.upkeep.get(resource, 0) + amount * count
+        self.total_units += count
+
+    def change_units(self, deltas: Iterable[Tuple[str, str, int]], version: int) -> bool:
+        """Apply committed (race, unit_type, delta) changes that bumped units_version to `version`
+
+        Returns False, changing nothing, unless the summary was current
+        just before them.
+        """
+        with self.lock:
+            if self.units_version != version - 1:
+                return False
+            for race, unit_type, delta in deltas:
+                key = (race, unit_type)
+                # Never remove more units than the stack holds
+                delta = max(delta, -self.counts.get(key, 0))
+                if not delta:
+                    continue
+                self._add(key, delta)
+                self.counts[key] = self.counts.get(key, 0) + delta
+                if self.counts[key] == 0:
+                    del self.counts[key]
+            self.units_version = version
+            self._dict = None
+            return True
+
+    def stack_power(self, race: str, unit_type: str, count: int) -> float:
+        """Battle power of `count` units of one stack"""
+        with self.lock:
+            stats, _ = self._stats_for((race, unit_type))
+            return stats['power'] * count
+
+    def set_modifiers(self, modifiers: ArmyModifiers) -> None:
+        with self.lock:
+            self._apply_modifiers(modifiers)
+
+    def to_dict(self) -> Dict:
+        """JSON body for the summary endpoint, rebuilt only after a change"""
+        with self.lock:
+            if self._dict is None:
+                self._dict = self._build_dict()
+            return self._dict
+
+    def _build_dict(self) -> Dict:
+        units = []
+        for (race, unit_type), count in sorted(self.counts.items()):
+            stats = self.unit_stats[(race, unit_type)]
+            units.append({
+                'race': race,
+                'type': unit_type,
+                'name': UNITS.get(race, {}).get(unit_type, {}).get('name', unit_type),
+                'count': count,
+                'attack': round(stats['attack'], 2),
+                'defense': round(stats['defense'], 2),
+                'hp': round(stats['hp'], 2),
+                'power': round(stats['power'] * count, 2),
+            })
+        return {
+            'game_id': self.game_id,
+            'total_units': self.total_units,
+            'total_power': round(self.totals['power'], 2),
+            'stats': {stat: round(self.totals[stat], 2) for stat in ('attack', 'defense', 'hp')},
+            'power_by_race': {race: round(power, 2) for race, power in sorted(self.race_power.items())
+                              if any(k[0] == race for k in self.counts)},
+            'units': units,
+            'upkeep': {resource: round(amount, 2) for resource, amount in sorted(self.upkeep.items())},
+            'modifiers': self.modifiers.to_dict(),
+        }
+
+
+def load_modifiers(game_id: int) -> ArmyModifiers:
+    return ArmyModifiers(get_modifiers(game_id))
+
+
+def army_versions(game_id: int) -> Tuple[int, int]:
+    """The game's (stats_version, units_version)"""
+    row = db.session.query(SavedGame.stats_version, SavedGame.units_version).filter(
+        SavedGame.id == game_id
+    ).first()
+    return (row[0] or 0, row[1] or 0) if row else (0, 0)
+
+
+def bump_units_version(game_id: int) -> int:
+    """Mark the game's units changed; the caller commits. Returns the new version"""
+    version = db.session.execute(
+        db.update(SavedGame)
+        .where(SavedGame.id == game_id)
+        .values({
+            SavedGame.units_version: db.func.coalesce(SavedGame.units_version, 0) + 1,
+            # updated_at marks the last production accrual; keep it
+            SavedGame.updated_at: SavedGame.updated_at,
+        })
+        .returning(SavedGame.units_version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    return version or 0
+
+
+_army_summaries: GameCache[ArmySummary] = GameCache(ArmySummary.load)
+
+
+def get_army_summary(game_id: int) -> ArmySummary:
+    """The game's cached summary, brought up to date with its versions"""
+    summary = _army_summaries.peek(game_id)
+    if summary is not None:
+        stats_version, units_version = army_versions(game_id)
+        if summary.units_version == units_version:
+            if summary.modifiers.version != stats_version:
+                summary.set_modifiers(load_modifiers(game_id))
+            return summary
+        _army_summaries.invalidate(game_id)
+    return _army_summaries.get(game_id)
+
+
+def cached_army_summary(game_id: int) -> Optional[ArmySummary]:
+    return _army_summaries.peek(game_id)
+
+
+def units_changed(game_id: int, deltas: Iterable[Tuple[str, str, int]], version: int) -> None:
+    """Apply committed recruits (delta > 0) or casualties (delta < 0) that bumped units to `version`"""
+    summary = _army_summaries.peek(game_id)
+    if summary is not None and not summary.change_units(deltas, version):
+        # Another change came first; reload on next use
+        _army_summaries.invalidate(game_id)
+
+
+def bonuses_changed(game_id: int) -> None:
+    """Recompile the game's modifiers after talents, special buildings or equipped items changed"""
+    invalidate_modifiers(game_id)
+    summary = _army_summaries.peek(game_id)
+    if summary is not None:
+        summary.set_modifiers(load_modifiers(game_id))
+
+
+def invalidate_army_summary(game_id: int) -> None:
+    _army_summaries.invalidate(game_id)
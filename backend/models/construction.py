@@ -0,0 +1,72 @@
+"""Timed construction queue
+
+Building or upgrading pays the cost up front and appends a
+ConstructionJob to the game's construction queue. Jobs run one after
+another. Taking a building from level L to L + 1 takes
+base * (L + 1) seconds, where base is the building's base cost / 20
+(at least 1 s). A multi-level upgrade is one job lasting the sum of its
+levels.
+
+Jobs are never run by a timer. When the game is read, apply_production
+(routes/game.py) loads the jobs finished since the last update. It
+credits production piecewise between their completion times, applying
+each level change at the exact moment it happened.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+from sqlalchemy import func
+
+from .db import db, ConstructionJob, BUILDINGS
+
+# Resource value of base cost built per second
+BUILD_COST_PER_SECOND = 20
+
+
+def construction_seconds(building_type: str, from_level: int, levels: int) -> float:
+    """Seconds to raise a building from `from_level` by `levels` (0 -> 1 builds it)"""
+    base_cost = BUILDINGS.get(building_type, {}).get('base_cost', {})
+    base = max(1.0, sum(base_cost.values()) / BUILD_COST_PER_SECOND)
+    # sum of base * (L + 1) for L = from_level .. from_level + levels - 1
+    return base * levels * (2 * from_level + levels + 1) / 2
+
+
+def queued_building_types(game_id: int) -> Set[str]:
+    """Building types with a job in the queue"""
+    rows = db.session.query(ConstructionJob.building_type).filter(ConstructionJob.game_id == game_id)
+    return {row[0] for row in rows}
+
+
+def queued_level(game_id: int, building_type: str) -> Optional[int]:
+    """Level the building will have once its queued jobs finish, if any are queued"""
+    return db.session.query(func.max(ConstructionJob.target_level)).filter(
+        ConstructionJob.game_id == game_id,
+        ConstructionJob.building_type == building_type,
+    ).scalar()
+
+
+def queue_construction(game_id: int, building_type: str, from_level: int, levels: int,
+                       now: datetime) -> ConstructionJob:
+    """Add a job at the end of the game's queue; the caller commits"""
+    queue_end = db.session.query(func.max(ConstructionJob.completes_at)).filter(
+        ConstructionJob.game_id == game_id,
+    ).scalar()
+    started_at = max(now, queue_end) if queue_end else now
+    duration = construction_seconds(building_type, from_level, levels)
+
+    job = ConstructionJob(
+        game_id=game_id, building_type=building_type,
+        from_level=from_level, target_level=from_level + levels,
+        started_at=started_at, completes_at=started_at + timedelta(seconds=duration),
+    )
+    db.session.add(job)
+    return job
+
+
+def due_construction(game_id: int, now: datetime) -> List[ConstructionJob]:
+    """Jobs finished by `now`, in completion order"""
+    return ConstructionJob.query.filter(
+        ConstructionJob.game_id == game_id,
+        ConstructionJob.completes_at <= now,
+    ).order_by(ConstructionJob.completes_at, ConstructionJob.id).all()
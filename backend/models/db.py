@@ -1,10 +1,40 @@
 """Database configuration and models"""
 
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
-db = SQLAlchemy()
+from sqlalchemy.types import BigInteger, TypeDecorator
+
+from .session import Session
+
+db = SQLAlchemy(session_options={'class_': Session})
+
+
+class FixedPoint(TypeDecorator):
+    """Decimal amount stored as an exact integer count of 1/scale units
+
+    Python code keeps working with plain numbers; every write rounds to
+    the nearest 1/scale, so stored totals never drift the way repeated
+    float additions do. SQL arithmetic and comparisons against the column
+    (e.g. amount + :delta) are scaled the same way.
+    """
+    impl = BigInteger
+    cache_ok = True
+    
+    def __init__(self, scale=1000):
+        super().__init__()
+        self.scale = scale
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int(round(value * self.scale))
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value / self.scale
 
 # ==================== RESOURCE TYPES ====================
 
@@ -77,6 +107,14 @@ BUILDINGS = {
         'production_per_second': 0,
         'description': 'Train soldiers'
     },
+    'warehouse': {
+        'name': 'Warehouse',
+        'resource': None,
+        'base_cost': {'gold': 150, 'wood': 200, 'stone': 150},
+        'production_per_second': 0,
+        'description': 'Raises the storage limit of every resource',
+        'storage_per_level': 100000
+    },
     'academy': {
         'name': 'Academy',
         'resource': None,
@@ -142,6 +180,9 @@ BUILDINGS = {
     },
 }
 
+# Storage limit of every resource before any warehouse; production stops at the limit
+BASE_STORAGE_CAPACITY = 50000
+
 # ==================== UNIT DEFINITIONS ====================
 
 UNITS = {
@@ -399,6 +440,32 @@ UNITS = {
     }
 }
 
+# ==================== UPGRADE COST MATH ====================
+
+# Most levels a single upgrade request may add
+MAX_UPGRADE_LEVELS = 1000
+
+
+def floor_sum(n, m, a, b):
+    """Sum of (a * i + b) // m for i in 0..n-1, for non-negative integers
+
+    Euclidean-style reduction: O(log m) steps regardless of n.
+    """
+    total = 0
+    while n > 0:
+        if a >= m:
+            total += (n - 1) * n // 2 * (a // m)
+            a %= m
+        if b >= m:
+            total += n * (b // m)
+            b %= m
+        y_max = a * n + b
+        if y_max < m:
+            break
+        n, b, m, a = y_max // m, y_max % m, a, m
+    return total
+
+
 # ==================== DATABASE MODELS ====================
 
 class SavedGame(db.Model):
@@ -411,6 +478,9 @@ class SavedGame(db.Model):
     hero_race = db.Column(db.String(50), nullable=False)
     level = db.Column(db.Integer, default=1)
     experience = db.Column(db.Integer, default=0)
+    stats_version = db.Column(db.Integer, default=0)  # Bumped when equipment, talents or special buildings change
+    map_version = db.Column(db.Integer, default=0)  # Bumped when the world map changes
+    units_version = db.Column(db.Integer, default=0)  # Bumped when units are added or removed
     
     def get_xp_needed_for_next_level(self):
         """Calculate XP needed to reach next level"""
@@ -440,8 +510,16 @@ class SavedGame(db.Model):
     map_tiles = db.relationship('MapTile', backref='game', lazy=True, cascade='all, delete-orphan')
     talents = db.relationship('Talent', backref='game', lazy=True, cascade='all, delete-orphan')
     items = db.relationship('Item', backref='game', lazy=True, cascade='all, delete-orphan')
+    map_config = db.relationship('MapConfig', backref='game', uselist=False, cascade='all, delete-orphan')
+    map_chunks = db.relationship('MapChunk', backref='game', lazy=True, cascade='all, delete-orphan')
+    command_results = db.relationship('CommandResult', backref='game', lazy=True, cascade='all, delete-orphan')
+    training_batches = db.relationship('TrainingBatch', backref='game', lazy=True, cascade='all, delete-orphan')
+    construction_jobs = db.relationship('ConstructionJob', backref='game', lazy=True, cascade='all, delete-orphan')
+    talent_summary = db.relationship('TalentSummary', backref='game', uselist=False, cascade='all, delete-orphan')
+    equipment_slots = db.relationship('EquipmentSlot', backref='game', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    def to_summary_dict(self):
+        """Scalar fields and resources, without the row collections"""
         return {
             'id': self.id,
             'hero_name': self.hero_name,
@@ -454,11 +532,44 @@ class SavedGame(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'resources': {r.resource_type: r.amount for r in self.resources},
+        }
+    
+    def collection_statements(self):
+        """SELECTs for the row collections included in to_dict, in output order
+
+        Plain statements rather than Query objects so they can run on both
+        the Flask session and an AsyncSession.
+        """
+        return {
+            key: db.select(model).where(model.game_id == self.id).order_by(model.id)
+            for key, model in (
+                ('buildings', Building),
+                ('units', Unit),
+                ('talents', Talent),
+                ('items', Item),
+            )
+        }
+    
+    def to_dict(self):
+        return {
+            **self.to_summary_dict(),
             'buildings': [b.to_dict() for b in self.buildings],
             'units': [u.to_dict() for u in self.units],
             'talents': [t.to_dict() for t in self.talents],
             'items': [i.to_dict() for i in self.items],
         }
+    
+    def to_list_dict(self):
+        """Short form used by the saved game list"""
+        return {
+            'id': self.id,
+            'hero_name': self.hero_name,
+            'hero_class': self.hero_class,
+            'hero_race': self.hero_race,
+            'level': self.level,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
 
 
 class Resource(db.Model):
@@ -468,7 +579,7 @@ class Resource(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
     resource_type = db.Column(db.String(50), nullable=False)  # wood, food, gold, etc.
-    amount = db.Column(db.Float, default=0)
+    amount = db.Column(FixedPoint(), default=0)  # Thousandths in the database
     
     def to_dict(self):
         return {
@@ -495,14 +606,51 @@ class Building(db.Model):
         base_rate = building_def.get('production_per_second', 0)
         return base_rate * self.level
     
+    def get_storage_capacity(self):
+        """Storage this building adds to every resource at its current level"""
+        return BUILDINGS.get(self.building_type, {}).get('storage_per_level', 0) * self.level
+    
     def get_build_cost(self):
         """Get cost to build this building at next level"""
-        building_def = BUILDINGS.get(self.building_type, {})
-        base_cost = building_def.get('base_cost', {})
+        return self.get_upgrade_cost(1)
+    
+    def get_upgrade_cost(self, levels, from_level=None):
+        """Total cost to raise this building by `levels` levels (from its current level by default)
         
-        # Cost increases with level
-        multiplier = 1 + (self.level * 0.3)
-        return {resource: int(cost * multiplier) for resource, cost in base_cost.items()}
+        Going from level L to L+1 costs int(base * (1 + 0.3 L)), computed
+        exactly as base * (10 + 3 L) // 10. The sum over consecutive levels
+        is a floored arithmetic series, evaluated in O(log) with floor_sum
+        rather than level by level.
+        """
+        base_cost = BUILDINGS.get(self.building_type, {}).get('base_cost', {})
+        level = self.level if from_level is None else from_level
+        return {
+            resource: floor_sum(levels, 10, 3 * cost, cost * (10 + 3 * level))
+            for resource, cost in base_cost.items()
+        }
+    
+    def get_max_affordable_levels(self, amounts, limit=MAX_UPGRADE_LEVELS, from_level=None):
+        """Most levels (up to `limit`) whose total cost fits in `amounts`
+        
+        The total cost grows with the number of levels, so binary search
+        over it; each probe is one closed-form get_upgrade_cost.
+        """
+        base_cost = BUILDINGS.get(self.building_type, {}).get('base_cost', {})
+        # Every level costs at least the base cost, which bounds the search
+        hi = limit
+        for resource, cost in base_cost.items():
+            if cost > 0:
+                hi = min(hi, int((amounts.get(resource) or 0) // cost))
+        
+        lo = 0
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            cost = self.get_upgrade_cost(mid, from_level)
+            if all((amounts.get(r) or 0) >= c for r, c in cost.items()):
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
     
     def to_dict(self):
         building_def = BUILDINGS.get(self.building_type, {})
@@ -519,6 +667,33 @@ class Building(db.Model):
         }
 
 
+class ConstructionJob(db.Model):
+    """A building being built (from_level 0) or upgraded in the game's construction queue"""
+    __tablename__ = 'construction_queue'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
+    building_type = db.Column(db.String(50), nullable=False)
+    from_level = db.Column(db.Integer, nullable=False)
+    target_level = db.Column(db.Integer, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    completes_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (db.Index('ix_construction_game_end', 'game_id', 'completes_at'),)
+    
+    def to_dict(self):
+        building_def = BUILDINGS.get(self.building_type, {})
+        return {
+            'id': self.id,
+            'type': self.building_type,
+            'name': building_def.get('name', self.building_type),
+            'from_level': self.from_level,
+            'target_level': self.target_level,
+            'started_at': self.started_at.isoformat(),
+            'completes_at': self.completes_at.isoformat(),
+        }
+
+
 class Unit(db.Model):
     """Army units in town"""
     __tablename__ = 'units'
@@ -543,6 +718,7 @@ class Unit(db.Model):
     
     def to_dict(self):
         unit_def = self.get_unit_stats()
+        cost = unit_def.get('cost', {})
         return {
             'id': self.id,
             'type': self.unit_type,
@@ -553,12 +729,68 @@ class Unit(db.Model):
             'defense': unit_def.get('defense', 0),
             'hp': unit_def.get('hp', 0),
             'description': unit_def.get('description', ''),
-            'cost_per_unit': self.get_hire_cost(),
-            'total_cost': {k: v * self.count for k, v in self.get_hire_cost().items()},
+            'cost_per_unit': cost,
+            'total_cost': {k: v * self.count for k, v in cost.items()},
             'hired_at': self.hired_at.isoformat(),
         }
 
 
+class TrainingBatch(db.Model):
+    """Units being trained in a building's queue
+
+    Units finish in waves of `wave_size` every `seconds_per_wave` from
+    `started_at`. The batch never changes after it is queued, so how many
+    units are done at any time follows from the clock alone.
+    """
+    __tablename__ = 'training_queue'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
+    building_type = db.Column(db.String(50), nullable=False)  # Queue the batch trains in
+    unit_type = db.Column(db.String(50), nullable=False)
+    race = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    trained = db.Column(db.Integer, default=0)  # Units already moved into the army
+    wave_size = db.Column(db.Integer, nullable=False)
+    seconds_per_wave = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False)
+    completes_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_training_game_start', 'game_id', 'started_at'),
+        db.Index('ix_training_queue_end', 'game_id', 'building_type', 'completes_at'),
+    )
+    
+    def trained_by(self, now):
+        """Units of this batch finished at `now`"""
+        elapsed = (now - self.started_at).total_seconds()
+        if elapsed <= 0:
+            return 0
+        return min(self.count, int(elapsed // self.seconds_per_wave) * self.wave_size)
+    
+    def next_wave_at(self):
+        """When the first wave not yet moved into the army finishes"""
+        waves_done = (self.trained or 0) // self.wave_size
+        return self.started_at + timedelta(seconds=(waves_done + 1) * self.seconds_per_wave)
+    
+    def to_dict(self, now=None):
+        unit_def = UNITS.get(self.race, {}).get(self.unit_type, {})
+        now = now or datetime.utcnow()
+        return {
+            'id': self.id,
+            'building': self.building_type,
+            'type': self.unit_type,
+            'race': self.race,
+            'name': unit_def.get('name', self.unit_type),
+            'count': self.count,
+            'trained': max(self.trained or 0, self.trained_by(now)),
+            'wave_size': self.wave_size,
+            'seconds_per_wave': self.seconds_per_wave,
+            'started_at': self.started_at.isoformat(),
+            'completes_at': self.completes_at.isoformat(),
+        }
+
+
 class MapTile(db.Model):
     """World map hexagonal tiles"""
     __tablename__ = 'map_tiles'
@@ -614,6 +846,55 @@ class MapTile(db.Model):
         }
 
 
+class MapConfig(db.Model):
+    """Generation settings for a chunked world map (tiles generated lazily)"""
+    __tablename__ = 'map_configs'
+    
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), primary_key=True)
+    radius = db.Column(db.Integer, nullable=False)
+    seed = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'radius': self.radius,
+            'chunk_size': self.chunk_size,
+            'chunked': True,
+        }
+
+
+class MapChunk(db.Model):
+    """A chunk of a chunked world map whose tiles exist in map_tiles"""
+    __tablename__ = 'map_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
+    cq = db.Column(db.Integer, nullable=False)  # Chunk coordinate (q // chunk_size)
+    cr = db.Column(db.Integer, nullable=False)  # Chunk coordinate (r // chunk_size)
+    generated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('game_id', 'cq', 'cr', name='uq_game_chunk_coords'),)
+
+
+class CommandResult(db.Model):
+    """Outcome of a town command, replayed when its idempotency key is reused"""
+    __tablename__ = 'command_results'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
+    idempotency_key = db.Column(db.String(100), nullable=False)
+    command_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.Integer, nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON response body
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (db.UniqueConstraint('game_id', 'idempotency_key', name='uq_game_command_key'),)
+    
+    def get_result(self):
+        return json.loads(self.result)
+
+
 # ==================== TALENT SYSTEM ====================
 
 TALENT_TREE = {
@@ -755,6 +1036,51 @@ class Talent(db.Model):
         }
 
 
+class TalentSummary(db.Model):
+    """Talent accounting for a game, kept in one row
+
+    Mirrors the game's Talent rows (id and level per talent), the points
+    they cost and whether the Academy is built, so the academy endpoints
+    read a single row. Invest and refund update it in the same
+    transaction as the Talent row. `version` is checked on every UPDATE
+    (optimistic locking): of two concurrent invests, the second one to
+    commit fails with StaleDataError instead of overspending points.
+    """
+    __tablename__ = 'talent_summaries'
+    
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), primary_key=True)
+    points_used = db.Column(db.Integer, nullable=False, default=0)
+    talents = db.Column(db.Text, nullable=False, default='{}')  # JSON {talent_id: {"id", "level"}}
+    has_academy = db.Column(db.Boolean, nullable=False, default=False)
+    version = db.Column(db.Integer, nullable=False)
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    def get_talents(self):
+        return json.loads(self.talents or '{}')
+    
+    def get_level(self, talent_id):
+        return self.get_talents().get(talent_id, {}).get('level', 0)
+    
+    def set_talent(self, talent):
+        """Record a Talent row's new level (0 once it is deleted)"""
+        talents = self.get_talents()
+        previous = talents.get(talent.talent_id, {}).get('level', 0)
+        if talent.level > 0:
+            talents[talent.talent_id] = {'id': talent.id, 'level': talent.level}
+        else:
+            talents.pop(talent.talent_id, None)
+        self.talents = json.dumps(talents, sort_keys=True)
+        self.points_used += (talent.level - previous) * talent.get_talent_info().get('cost_per_level', 1)
+    
+    def talent_dicts(self):
+        """The Talent.to_dict() of every invested talent, without loading the rows"""
+        return [
+            Talent(id=entry['id'], game_id=self.game_id, talent_id=talent_id, level=entry['level']).to_dict()
+            for talent_id, entry in sorted(self.get_talents().items(), key=lambda item: item[1]['id'])
+        ]
+
+
 # ==================== ITEM SYSTEM ====================
 
 ITEM_TYPES = {
@@ -767,11 +1093,11 @@ ITEM_TYPES = {
 }
 
 ITEM_RARITIES = {
-    'common': {'name': 'Common', 'color': '#9e9e9e', 'stat_multiplier': 1.0},
-    'uncommon': {'name': 'Uncommon', 'color': '#4caf50', 'stat_multiplier': 1.5},
-    'rare': {'name': 'Rare', 'color': '#2196f3', 'stat_multiplier': 2.0},
-    'epic': {'name': 'Epic', 'color': '#9c27b0', 'stat_multiplier': 2.5},
-    'legendary': {'name': 'Legendary', 'color': '#ff9800', 'stat_multiplier': 3.0},
+    'common': {'name': 'Common', 'color': '#9e9e9e', 'stat_multiplier': 1.0, 'salvage_gold': 5},
+    'uncommon': {'name': 'Uncommon', 'color': '#4caf50', 'stat_multiplier': 1.5, 'salvage_gold': 15},
+    'rare': {'name': 'Rare', 'color': '#2196f3', 'stat_multiplier': 2.0, 'salvage_gold': 40},
+    'epic': {'name': 'Epic', 'color': '#9c27b0', 'stat_multiplier': 2.5, 'salvage_gold': 100},
+    'legendary': {'name': 'Legendary', 'color': '#ff9800', 'stat_multiplier': 3.0, 'salvage_gold': 250},
 }
 
 ITEM_TEMPLATES = {
@@ -871,18 +1197,25 @@ ITEM_TEMPLATES = {
 class Item(db.Model):
     """Hero inventory items"""
     __tablename__ = 'items'
+    __table_args__ = (db.Index('ix_items_game_id', 'game_id', 'id'),)
     
     id = db.Column(db.Integer, primary_key=True)
     game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
     item_template = db.Column(db.String(50), nullable=False)  # Key from ITEM_TEMPLATES
     rarity = db.Column(db.String(20), default='common')  # common, uncommon, rare, epic, legendary
-    equipped = db.Column(db.Boolean, default=False)
+    # Unequipped items of one (template, rarity) share a row; equipped items have quantity 1
+    quantity = db.Column(db.Integer, nullable=False, default=1)
     acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # equipped: True if the item fills an EquipmentSlot (column_property below)
     
     def get_template(self):
         """Get item template"""
         return ITEM_TEMPLATES.get(self.item_template, {})
     
+    def get_slot(self):
+        """Equipment slot this item goes in: its type (a key of ITEM_TYPES)"""
+        return self.get_template().get('type')
+    
     def get_stats(self):
         """Get item stats with rarity multiplier applied"""
         template = self.get_template()
@@ -906,6 +1239,30 @@ class Item(db.Model):
             'rarity_color': rarity_info.get('color', '#9e9e9e'),
             'stats': self.get_stats(),
             'description': template.get('description', ''),
-            'equipped': self.equipped,
+            'quantity': self.quantity or 1,
+            'equipped': bool(self.equipped),
             'acquired_at': self.acquired_at.isoformat(),
+            'template_data': {
+                'name': template.get('name', self.item_template),
+                'type': template.get('type', 'unknown'),
+                'slot': template.get('type', 'unknown'),
+                'description': template.get('description', ''),
+            },
         }
+
+
+class EquipmentSlot(db.Model):
+    """The item a hero wears in each slot"""
+    __tablename__ = 'equipment_slots'
+    __table_args__ = (db.UniqueConstraint('game_id', 'slot', name='uq_game_equipment_slot'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('saved_games.id'), nullable=False)
+    slot = db.Column(db.String(20), nullable=False)  # Key from ITEM_TYPES
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'), nullable=False, unique=True)
+    equipped_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+Item.equipped = db.column_property(
+    db.exists().where(EquipmentSlot.item_id == Item.id).correlate_except(EquipmentSlot)
+)
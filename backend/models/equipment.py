@@ -0,0 +1,43 @@
+"""Equipped items
+
+Each (game, slot) pair holds at most one item in equipment_slots, and
+Item.equipped is derived from that table. Equipping is one keyed upsert
+and unequipping one keyed delete, so neither reads the inventory, and
+the unique constraint keeps concurrent equips from leaving two items in
+one slot: the last one wins.
+"""
+
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .db import db, EquipmentSlot, Item
+
+UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def equip(game_id: int, slot: str, item_id: int) -> None:
+    """Put an item in its slot, replacing whatever was there; the caller commits"""
+    insert = UPSERT_DIALECTS[db.engine.dialect.name]
+    now = datetime.utcnow()
+    statement = insert(EquipmentSlot).values(game_id=game_id, slot=slot, item_id=item_id, equipped_at=now)
+    statement = statement.on_conflict_do_update(
+        index_elements=['game_id', 'slot'],
+        set_={'item_id': statement.excluded.item_id, 'equipped_at': statement.excluded.equipped_at},
+    )
+    db.session.execute(statement)
+
+
+def unequip(game_id: int, item_id: int) -> bool:
+    """Empty the slot holding an item; the caller commits. False if it was not equipped"""
+    result = db.session.execute(
+        db.delete(EquipmentSlot).where(EquipmentSlot.game_id == game_id, EquipmentSlot.item_id == item_id)
+    )
+    return result.rowcount > 0
+
+
+def equipped_items(game_id: int):
+    """Query for the game's equipped items"""
+    return Item.query.join(EquipmentSlot, EquipmentSlot.item_id == Item.id).filter(
+        EquipmentSlot.game_id == game_id
+    )
@@ -0,0 +1,206 @@
+"""Per-game publish/subscribe for live town updates
+
+Write routes publish small delta events after they commit; the town SSE
+stream subscribes to its game's channel and forwards them to the client.
+
+EVENT_BACKEND names the backend as a "module:Class" path. On Postgres
+it defaults to PostgresNotifyBackend, which fans events out to every
+worker process; otherwise to InProcessBackend, which only reaches
+subscribers in the publishing process, so a server with several workers
+needs a cross-process backend (serve.py refuses to start without one).
+
+A subscriber that falls SUBSCRIBER_QUEUE_SIZE events behind, or whose
+events may have been lost while the backend reconnected, is marked as
+overflowed. The stream then tells the client to resync and closes, and
+the client reconnects to a fresh snapshot.
+
+Publishing happens after the write has committed, so it never raises: a
+failure is logged and the subscribers catch up on their next resync.
+"""
+
+import importlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional, Set
+
+# Events buffered per subscriber before new ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    """A subscriber's queue of pending events for one game"""
+
+    def __init__(self, backend: 'EventBackend', game_id: int):
+        self.backend = backend
+        self.game_id = game_id
+        self.queue: queue.Queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when events were dropped; the stream must resync the client
+        self.overflowed = False
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Wait for the next event; returns None on timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.backend.unsubscribe(self)
+
+
+class EventBackend:
+    """Delivers events published for a game to that game's subscribers"""
+
+    # True if events published in one process reach subscribers in others
+    cross_process = False
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, game_id: int) -> Subscription:
+        subscription = Subscription(self, game_id)
+        with self._lock:
+            self._subscribers.setdefault(game_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.game_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.game_id]
+
+    def publish(self, game_id: int, event: Dict) -> None:
+        self.deliver(game_id, event)
+
+    def deliver(self, game_id: int, event: Dict) -> None:
+        """Hand an event to every local subscriber of the game"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(game_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # A stalled client must not block publishers; its stream
+                # closes and the client reconnects to a fresh snapshot
+                subscription.overflowed = True
+
+    def mark_all_overflowed(self) -> None:
+        """Resync every subscriber, e.g. after events may have been lost"""
+        with self._lock:
+            subscribers = [s for subs in self._subscribers.values() for s in subs]
+        for subscription in subscribers:
+            subscription.overflowed = True
+
+
+class InProcessBackend(EventBackend):
+    """Delivers events to subscribers in the same process only"""
+
+
+class PostgresNotifyBackend(EventBackend):
+    """Fans events out to every worker through Postgres LISTEN/NOTIFY"""
+
+    cross_process = True
+    CHANNEL = 'carondor_events'
+    # Backoff between attempts to reconnect the listener
+    RECONNECT_MIN_SECONDS = 1
+    RECONNECT_MAX_SECONDS = 30
+
+    def __init__(self, dsn: Optional[str] = None):
+        super().__init__()
+        import psycopg
+
+        self._dsn = (dsn or database_url()).replace('postgresql+psycopg://', 'postgresql://')
+        self._publish_conn = psycopg.connect(self._dsn, autocommit=True)
+        self._publish_lock = threading.Lock()
+        threading.Thread(target=self._listen, name='event-listener', daemon=True).start()
+
+    def publish(self, game_id: int, event: Dict) -> None:
+        import psycopg
+
+        payload = json.dumps({'game_id': game_id, 'event': event})
+        with self._publish_lock:
+            try:
+                self._publish_conn.execute('SELECT pg_notify(%s, %s)', (self.CHANNEL, payload))
+            except psycopg.OperationalError:
+                # The connection dropped; retry once on a new one
+                self._publish_conn = psycopg.connect(self._dsn, autocommit=True)
+                self._publish_conn.execute('SELECT pg_notify(%s, %s)', (self.CHANNEL, payload))
+
+    def _listen(self) -> None:
+        import psycopg
+
+        delay = self.RECONNECT_MIN_SECONDS
+        while True:
+            conn = None
+            try:
+                conn = psycopg.connect(self._dsn, autocommit=True)
+                conn.execute(f'LISTEN {self.CHANNEL}')
+                delay = self.RECONNECT_MIN_SECONDS
+                for notify in conn.notifies():
+                    message = json.loads(notify.payload)
+                    self.deliver(message['game_id'], message['event'])
+            except Exception as e:
+                print(f"Event listener disconnected: {e}; reconnecting in {delay:.0f}s")
+            finally:
+                if conn is not None:
+                    conn.close()
+            # Events sent while not listening are lost
+            self.mark_all_overflowed()
+            time.sleep(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+
+
+def database_url() -> str:
+    return os.getenv('DATABASE_URL') or os.getenv('POSTGRES_URL') or ''
+
+
+def backend_path() -> str:
+    """EVENT_BACKEND, or the default for the configured database"""
+    path = os.getenv('EVENT_BACKEND')
+    if path:
+        return path
+    if database_url().startswith('postgres'):
+        return 'models.events:PostgresNotifyBackend'
+    return 'models.events:InProcessBackend'
+
+
+def backend_class() -> type:
+    module_name, class_name = backend_path().split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def load_backend() -> EventBackend:
+    """Instantiate the configured backend"""
+    return backend_class()()
+
+
+_backend: Optional[EventBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> EventBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = load_backend()
+    return _backend
+
+
+def publish_game_event(game_id: int, event_type: str, **data) -> None:
+    """Publish an event to everyone watching the game; failures are logged, not raised"""
+    try:
+        get_backend().publish(game_id, {'type': event_type, **data})
+    except Exception as e:
+        # The change is committed; a failed notification must not fail the request
+        print(f"Publishing {event_type} for game {game_id} failed: {e}")
+
+
+def subscribe_game_events(game_id: int) -> Subscription:
+    return get_backend().subscribe(game_id)
@@ -0,0 +1,63 @@
+"""Per-game caches for derived state
+
+Derived state (pathfinding grids, summaries, ...) is built lazily from the
+database on first use and then kept in process memory until invalidated.
+Each worker process keeps its own cache, so every write path that changes
+the underlying rows must call the matching update or invalidate hook.
+
+Every invalidation bumps the game's generation. A load that started before
+an invalidation and finishes after it is returned to its caller but not
+cached, since it may have read the rows from before the change.
+"""
+
+import threading
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class GameCache(Generic[T]):
+    """Thread-safe game_id -> value cache with a loader for misses"""
+
+    def __init__(self, loader: Callable[[int], T]):
+        self._loader = loader
+        self._entries: Dict[int, T] = {}
+        self._generations: Dict[int, int] = {}
+        self._epoch = 0  # Bumped by clear()
+        self._lock = threading.Lock()
+
+    def _generation(self, game_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(game_id, 0)
+
+    def get(self, game_id: int) -> T:
+        """Return the cached value, loading it on a miss"""
+        with self._lock:
+            value = self._entries.get(game_id)
+            generation = self._generation(game_id)
+        if value is not None:
+            return value
+
+        # Load outside the lock; if two threads race, the first one wins
+        value = self._loader(game_id)
+        with self._lock:
+            if self._generation(game_id) != generation:
+                # Invalidated while loading: the value may predate the change
+                return value
+            return self._entries.setdefault(game_id, value)
+
+    def peek(self, game_id: int) -> Optional[T]:
+        """Return the cached value without loading it"""
+        with self._lock:
+            return self._entries.get(game_id)
+
+    def invalidate(self, game_id: int) -> None:
+        """Drop the cached value so the next get() reloads it"""
+        with self._lock:
+            self._entries.pop(game_id, None)
+            self._generations[game_id] = self._generations.get(game_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
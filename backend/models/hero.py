@@ -1,10 +1,42 @@
 """Hero (player character) model"""
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
+from functools import cached_property
 from .classes import GameClass
 from .races import Race
 
+# Class and race stats grow by this fraction of their base per level above 1
+HERO_STAT_GROWTH_PER_LEVEL = 0.05
+
+
+@dataclass(frozen=True)
+class HeroStats:
+    """An immutable block of the five hero stats"""
+    health_point: int
+    physical_attack: int
+    physical_defense: int
+    magical_attack: int
+    magical_defense: int
+
+    @classmethod
+    def base(cls, game_class: GameClass, race: Race) -> 'HeroStats':
+        """Class stats plus race bonuses"""
+        return cls(
+            health_point=game_class.health_point + race.health_bonus,
+            physical_attack=game_class.physical_attack + race.physical_bonus,
+            physical_defense=game_class.physical_defense + race.physical_bonus,
+            magical_attack=game_class.magical_attack + race.magical_bonus,
+            magical_defense=game_class.magical_defense + race.magical_bonus,
+        )
+
+    def at_level(self, level: int) -> 'HeroStats':
+        growth = 1 + HERO_STAT_GROWTH_PER_LEVEL * max(0, level - 1)
+        return HeroStats(**{stat: int(value * growth) for stat, value in asdict(self).items()})
+
+    def to_dict(self):
+        return asdict(self)
+
 
 @dataclass
 class Hero:
@@ -16,25 +48,33 @@ class Hero:
     experience: int = 0
     created_at: str = field(default_factory=lambda: datetime.now().isoformat())
 
+    @cached_property
+    def base_stats(self) -> HeroStats:
+        return HeroStats.base(self.game_class, self.race)
+
+    @property
+    def stats(self) -> HeroStats:
+        return self.base_stats.at_level(self.level)
+
     @property
     def health_point(self) -> int:
-        return self.game_class.health_point + self.race.health_bonus
+        return self.stats.health_point
 
     @property
     def physical_attack(self) -> int:
-        return self.game_class.physical_attack + self.race.physical_bonus
+        return self.stats.physical_attack
 
     @property
     def physical_defense(self) -> int:
-        return self.game_class.physical_defense + self.race.physical_bonus
+        return self.stats.physical_defense
 
     @property
     def magical_attack(self) -> int:
-        return self.game_class.magical_attack + self.race.magical_bonus
+        return self.stats.magical_attack
 
     @property
     def magical_defense(self) -> int:
-        return self.game_class.magical_defense + self.race.magical_bonus
+        return self.stats.magical_defense
 
     def to_dict(self):
         return {
@@ -43,12 +83,6 @@ class Hero:
             "race": self.race.name,
             "level": self.level,
             "experience": self.experience,
-            "stats": {
-                "health_point": self.health_point,
-                "physical_attack": self.physical_attack,
-                "physical_defense": self.physical_defense,
-                "magical_attack": self.magical_attack,
-                "magical_defense": self.magical_defense,
-            },
+            "stats": self.stats.to_dict(),
             "created_at": self.created_at
         }
@@ -0,0 +1,100 @@
+"""Hero stat service
+
+A hero's stats combine class and race, level growth, the stats of
+equipped items and the Legendary Hero talent (the last two through the
+game's compiled modifiers). The result is an immutable HeroStatBlock,
+cached per game and keyed by class, race, level and
+SavedGame.stats_version.
+
+Every equip, unequip and talent change, and every special building
+built or removed, bumps stats_version in the same transaction
+(`bump_stats_version`). A worker whose cached block has an older version
+rebuilds it; the game's modifiers check the same version (see
+modifiers).
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .classes import CLASSES
+from .db import db, SavedGame
+from .game_cache import GameCache
+from .hero import HeroStats
+from .modifiers import get_modifiers
+from .races import RACES
+
+CLASSES_BY_NAME = {game_class.name: game_class for game_class in CLASSES.values()}
+RACES_BY_NAME = {race.name: race for race in RACES.values()}
+
+StatsKey = Tuple[str, str, int, int]  # (class, race, level, stats_version)
+
+
+@dataclass(frozen=True)
+class HeroStatBlock:
+    """A hero's stats before and after equipment and talents"""
+    key: StatsKey
+    base: HeroStats
+    total: HeroStats
+    equipment: Tuple[Tuple[str, float], ...]  # (stat, points) from equipped items
+    multiplier: float
+
+    def to_dict(self) -> Dict:
+        return {
+            'base': self.base.to_dict(),
+            'equipment': dict(self.equipment),
+            'multiplier': round(self.multiplier, 4),
+            'total': self.total.to_dict(),
+            'version': self.key[3],
+        }
+
+
+def stats_key(game: SavedGame) -> StatsKey:
+    return (game.hero_class, game.hero_race, game.level or 1, game.stats_version or 0)
+
+
+def build_hero_stats(game: SavedGame) -> Optional[HeroStatBlock]:
+    """Compute the game's stat block, or None if its class or race is unknown"""
+    game_class = CLASSES_BY_NAME.get(game.hero_class)
+    race = RACES_BY_NAME.get(game.hero_race)
+    if game_class is None or race is None:
+        return None
+
+    modifiers = get_modifiers(game.id)
+    base = HeroStats.base(game_class, race).at_level(game.level or 1)
+    return HeroStatBlock(
+        key=stats_key(game),
+        base=base,
+        total=HeroStats(**modifiers.apply_hero_stats(base.to_dict())),
+        equipment=tuple(sorted(modifiers.hero_flat.items())),
+        multiplier=1 + modifiers.hero_stats,
+    )
+
+
+def _load(game_id: int) -> Optional[HeroStatBlock]:
+    game = db.session.get(SavedGame, game_id)
+    return build_hero_stats(game) if game else None
+
+
+_hero_stats: GameCache[HeroStatBlock] = GameCache(_load)
+
+
+def get_hero_stats(game: SavedGame) -> Optional[HeroStatBlock]:
+    """The game's cached stat block, rebuilt if the game changed since"""
+    block = _hero_stats.peek(game.id)
+    if block is not None and block.key == stats_key(game):
+        return block
+
+    _hero_stats.invalidate(game.id)
+    return _hero_stats.get(game.id)
+
+
+def bump_stats_version(game_id: int) -> None:
+    """Mark equipment, talents or special buildings changed; the caller commits"""
+    db.session.query(SavedGame).filter(SavedGame.id == game_id).update(
+        {
+            SavedGame.stats_version: db.func.coalesce(SavedGame.stats_version, 0) + 1,
+            # updated_at marks the last production accrual; keep it
+            SavedGame.updated_at: SavedGame.updated_at,
+        },
+        synchronize_session=False,
+    )
@@ -0,0 +1,231 @@
+"""Hexagonal grid geometry (axial / cube coordinates)
+
+All map code uses axial coordinates (q, r). The implicit third cube
+coordinate is s = -q - r. A map of radius R contains every hex whose
+distance from (0, 0) is at most R, i.e. 3R(R+1) + 1 hexes.
+
+Dense indices number the hexes of a radius-R map 0..N-1 column by column
+(q ascending, then r ascending), which is the same order
+WorldMap.generate_map walks them in.
+"""
+
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; distances() falls back to plain Python
+    np = None
+
+Hex = Tuple[int, int]
+
+# Axial neighbor offsets, counter-clockwise starting east
+DIRECTIONS: Tuple[Hex, ...] = (
+    (1, 0), (1, -1), (0, -1),
+    (-1, 0), (-1, 1), (0, 1),
+)
+
+
+# ==================== COORDINATE CONVERSION ====================
+
+def axial_to_cube(q: int, r: int) -> Tuple[int, int, int]:
+    """Convert axial (q, r) to cube (x, y, z) with x + y + z == 0"""
+    return q, r, -q - r
+
+
+def cube_to_axial(x: int, y: int, z: int) -> Hex:
+    """Convert cube (x, y, z) to axial (q, r)"""
+    return x, y
+
+
+def cube_round(x: float, y: float, z: float) -> Tuple[int, int, int]:
+    """Round fractional cube coordinates to the nearest hex"""
+    rx, ry, rz = round(x), round(y), round(z)
+    dx, dy, dz = abs(rx - x), abs(ry - y), abs(rz - z)
+
+    if dx > dy and dx > dz:
+        rx = -ry - rz
+    elif dy > dz:
+        ry = -rx - rz
+    else:
+        rz = -rx - ry
+    return rx, ry, rz
+
+
+def hex_count(radius: int) -> int:
+    """Number of hexes in a map of the given radius"""
+    return 3 * radius * (radius + 1) + 1
+
+
+@lru_cache(maxsize=32)
+def _column_offsets(radius: int) -> Tuple[int, ...]:
+    """Dense index of the first hex in each column q = -radius..radius"""
+    offsets = []
+    total = 0
+    for q in range(-radius, radius + 1):
+        offsets.append(total)
+        total += 2 * radius + 1 - abs(q)
+    return tuple(offsets)
+
+
+def axial_to_index(q: int, r: int, radius: int) -> int:
+    """Dense index of (q, r) in a map of the given radius"""
+    if not in_bounds(q, r, radius):
+        raise ValueError(f'Hex ({q}, {r}) is outside a radius {radius} map')
+    r_min = max(-radius, -q - radius)
+    return _column_offsets(radius)[q + radius] + (r - r_min)
+
+
+def index_to_axial(index: int, radius: int) -> Hex:
+    """Inverse of axial_to_index"""
+    if not 0 <= index < hex_count(radius):
+        raise ValueError(f'Index {index} is outside a radius {radius} map')
+    offsets = _column_offsets(radius)
+    column = bisect_right(offsets, index) - 1
+    q = column - radius
+    r_min = max(-radius, -q - radius)
+    return q, r_min + (index - offsets[column])
+
+
+# ==================== DISTANCE & BOUNDS ====================
+
+def distance(q1: int, r1: int, q2: int = 0, r2: int = 0) -> int:
+    """Hex distance between two hexes (defaults to distance from origin)"""
+    dq = q1 - q2
+    dr = r1 - r2
+    return max(abs(dq), abs(dr), abs(dq + dr))
+
+
+def in_bounds(q: int, r: int, radius: Optional[int]) -> bool:
+    """True if (q, r) lies on a map of the given radius (None = unbounded)"""
+    return radius is None or distance(q, r) <= radius
+
+
+def distances(qs: Sequence[int], rs: Sequence[int], q0: int = 0, r0: int = 0):
+    """Vectorized hex distance from (q0, r0) to every (qs[i], rs[i])
+
+    Returns a numpy array when numpy is installed, otherwise a list.
+    """
+    if np is not None:
+        dq = np.asarray(qs) - q0
+        dr = np.asarray(rs) - r0
+        return np.maximum(np.maximum(np.abs(dq), np.abs(dr)), np.abs(dq + dr))
+    return [distance(q, r, q0, r0) for q, r in zip(qs, rs)]
+
+
+# ==================== NEIGHBORHOODS ====================
+
+def neighbors(q: int, r: int, radius: Optional[int] = None) -> Iterator[Hex]:
+    """Yield the (up to six) neighbors of (q, r) that lie on the map"""
+    for dq, dr in DIRECTIONS:
+        nq, nr = q + dq, r + dr
+        if in_bounds(nq, nr, radius):
+            yield nq, nr
+
+
+def ring(q: int, r: int, n: int, radius: Optional[int] = None) -> Iterator[Hex]:
+    """Yield the hexes exactly n steps from (q, r), clipped to the map"""
+    if n == 0:
+        if in_bounds(q, r, radius):
+            yield q, r
+        return
+
+    # Start n steps in direction 4 and walk each of the six sides
+    hq, hr = q + DIRECTIONS[4][0] * n, r + DIRECTIONS[4][1] * n
+    for dq, dr in DIRECTIONS:
+        for _ in range(n):
+            if in_bounds(hq, hr, radius):
+                yield hq, hr
+            hq, hr = hq + dq, hr + dr
+
+
+def spiral(q: int, r: int, n: int, radius: Optional[int] = None) -> Iterator[Hex]:
+    """Yield hexes within n steps of (q, r), ordered ring by ring outward"""
+    for k in range(n + 1):
+        yield from ring(q, r, k, radius)
+
+
+def hexes_in_range(q: int, r: int, n: int, radius: Optional[int] = None) -> Iterator[Hex]:
+    """Yield hexes within n steps of (q, r) in dense-index order
+
+    Only valid hexes are visited: the per-column r bounds are the
+    intersection of the range hexagon and the map hexagon.
+    """
+    q_min, q_max = q - n, q + n
+    if radius is not None:
+        q_min, q_max = max(q_min, -radius), min(q_max, radius)
+
+    for hq in range(q_min, q_max + 1):
+        r_min = max(r - n, -(hq - q) + r - n)
+        r_max = min(r + n, -(hq - q) + r + n)
+        if radius is not None:
+            r_min = max(r_min, -radius, -hq - radius)
+            r_max = min(r_max, radius, -hq + radius)
+        for hr in range(r_min, r_max + 1):
+            yield hq, hr
+
+
+def map_hexes(radius: int) -> Iterator[Hex]:
+    """Yield every hex of a radius-R map in dense-index order"""
+    return hexes_in_range(0, 0, radius, radius)
+
+
+# ==================== CHUNKS ====================
+# Chunks are size x size parallelograms in axial space, keyed by
+# (q // size, r // size). They tile the plane with no gaps or overlaps.
+
+def chunk_of(q: int, r: int, size: int) -> Hex:
+    """Chunk key containing (q, r)"""
+    return q // size, r // size
+
+
+def chunk_hexes(cq: int, cr: int, size: int, radius: Optional[int] = None) -> Iterator[Hex]:
+    """Yield the hexes of a chunk that lie on the map"""
+    for q in range(cq * size, (cq + 1) * size):
+        for r in range(cr * size, (cr + 1) * size):
+            if in_bounds(q, r, radius):
+                yield q, r
+
+
+def chunks_in_bbox(q_min: int, r_min: int, q_max: int, r_max: int, size: int) -> Iterator[Hex]:
+    """Yield the keys of every chunk overlapping an axial bounding box"""
+    for cq in range(q_min // size, q_max // size + 1):
+        for cr in range(r_min // size, r_max // size + 1):
+            yield cq, cr
+
+
+def chunks_in_range(q: int, r: int, n: int, size: int) -> Iterator[Hex]:
+    """Yield chunk keys covering every hex within n steps of (q, r)"""
+    return chunks_in_bbox(q - n, r - n, q + n, r + n, size)
+
+
+def chunk_on_map(cq: int, cr: int, size: int, radius: int) -> bool:
+    """True if any hex of the chunk lies on the map"""
+    return next(chunk_hexes(cq, cr, size, radius), None) is not None
+
+
+# ==================== LINES & LINE OF SIGHT ====================
+
+def line(q1: int, r1: int, q2: int, r2: int) -> List[Hex]:
+    """Hexes on the straight line from (q1, r1) to (q2, r2), both inclusive"""
+    n = distance(q1, r1, q2, r2)
+    if n == 0:
+        return [(q1, r1)]
+
+    # Nudge the endpoints so lines along hex edges round consistently
+    x1, y1, z1 = q1 + 1e-6, r1 + 1e-6, -q1 - r1 - 2e-6
+    x2, y2, z2 = q2 + 1e-6, r2 + 1e-6, -q2 - r2 - 2e-6
+
+    hexes = []
+    for i in range(n + 1):
+        t = i / n
+        x, y, _ = cube_round(x1 + (x2 - x1) * t, y1 + (y2 - y1) * t, z1 + (z2 - z1) * t)
+        hexes.append((x, y))
+    return hexes
+
+
+def line_of_sight(q1: int, r1: int, q2: int, r2: int,
+                  blocks_sight: Callable[[int, int], bool]) -> bool:
+    """True if no hex strictly between the endpoints blocks sight"""
+    return not any(blocks_sight(q, r) for q, r in line(q1, r1, q2, r2)[1:-1])
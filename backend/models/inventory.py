@@ -0,0 +1,164 @@
+"""Inventory queries
+
+Item type is not a column: it comes from the item's template. Filters by
+type are turned into an IN over that type's template keys, and the
+per-type counts are folded from a GROUP BY over (template, rarity,
+equipped), which has at most templates x rarities x 2 rows however many
+items the hero has collected.
+
+Unequipped items are stacked: one row per (template, rarity) with a
+quantity. Drops add to the stack, equipping takes one item off it into
+a row of its own, and unequipping puts it back. Salvaging deletes whole
+stacks and credits their gold in the same transaction.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, literal
+
+from .db import db, EquipmentSlot, Item, Resource, ITEM_RARITIES, ITEM_TEMPLATES, ITEM_TYPES
+
+# Template keys of each item type
+TEMPLATES_BY_TYPE: Dict[str, List[str]] = {
+    item_type: [key for key, template in ITEM_TEMPLATES.items() if template.get('type') == item_type]
+    for item_type in ITEM_TYPES
+}
+
+
+def item_filters(game_id: int, item_type: Optional[str] = None, rarity: Optional[str] = None,
+                 equipped: Optional[bool] = None) -> List:
+    """WHERE clauses selecting a game's items"""
+    filters = [Item.game_id == game_id]
+    if item_type is not None:
+        filters.append(Item.item_template.in_(TEMPLATES_BY_TYPE.get(item_type, [])))
+    if rarity is not None:
+        filters.append(Item.rarity == rarity)
+    if equipped is not None:
+        filters.append(Item.equipped if equipped else ~Item.equipped)
+    return filters
+
+
+def item_page(game_id: int, limit: int, cursor: Optional[int] = None, **filters) -> List[Item]:
+    """Up to `limit` items, newest first, with ids below `cursor` (keyset pagination)"""
+    query = Item.query.filter(*item_filters(game_id, **filters))
+    if cursor is not None:
+        query = query.filter(Item.id < cursor)
+    return query.order_by(Item.id.desc()).limit(limit).all()
+
+
+def inventory_counts(game_id: int) -> Dict:
+    """Item counts per rarity and type, and equipped/unequipped totals"""
+    equipped = EquipmentSlot.id.isnot(None)
+    rows = db.session.query(
+        Item.item_template, Item.rarity, equipped, func.sum(Item.quantity)
+    ).outerjoin(EquipmentSlot, EquipmentSlot.item_id == Item.id).filter(
+        Item.game_id == game_id
+    ).group_by(Item.item_template, Item.rarity, equipped)
+
+    counts = {
+        'total': 0,
+        'equipped': 0,
+        'by_rarity': {rarity: 0 for rarity in ITEM_RARITIES},
+        'by_type': {item_type: 0 for item_type in ITEM_TYPES},
+    }
+    for template, rarity, is_equipped, count in rows:
+        counts['total'] += count
+        if is_equipped:
+            counts['equipped'] += count
+        counts['by_rarity'][rarity] = counts['by_rarity'].get(rarity, 0) + count
+        item_type = ITEM_TEMPLATES.get(template, {}).get('type', 'unknown')
+        counts['by_type'][item_type] = counts['by_type'].get(item_type, 0) + count
+    counts['unequipped'] = counts['total'] - counts['equipped']
+    return counts
+
+
+# ==================== STACKS ====================
+
+def find_stack(game_id: int, item_template: str, rarity: str, exclude: Optional[int] = None) -> Optional[int]:
+    """Id of the unequipped stack of (template, rarity), if there is one"""
+    query = db.session.query(func.min(Item.id)).filter(
+        Item.game_id == game_id,
+        Item.item_template == item_template,
+        Item.rarity == rarity,
+        ~Item.equipped,
+    )
+    if exclude is not None:
+        query = query.filter(Item.id != exclude)
+    return query.scalar()
+
+
+def _grow_stack(stack_id: int, quantity: int) -> bool:
+    result = db.session.execute(
+        db.update(Item).where(Item.id == stack_id, ~Item.equipped).values(quantity=Item.quantity + quantity),
+        execution_options={'synchronize_session': False},
+    )
+    return result.rowcount > 0
+
+
+def add_items(game_id: int, item_template: str, rarity: str, quantity: int = 1) -> Item:
+    """Add items to the game's stack of (template, rarity); the caller commits"""
+    stack_id = find_stack(game_id, item_template, rarity)
+    # The stack may have been equipped since; then start a new one
+    if stack_id is not None and _grow_stack(stack_id, quantity):
+        return db.session.get(Item, stack_id, populate_existing=True)
+
+    item = Item(game_id=game_id, item_template=item_template, rarity=rarity, quantity=quantity)
+    db.session.add(item)
+    db.session.flush()
+    return item
+
+
+def take_one(item: Item) -> Item:
+    """A single item from a stack, in a row of its own; the caller commits"""
+    if (item.quantity or 1) <= 1:
+        return item
+    item.quantity = Item.quantity - 1
+    single = Item(game_id=item.game_id, item_template=item.item_template, rarity=item.rarity, quantity=1)
+    db.session.add(single)
+    db.session.flush()
+    db.session.refresh(item)
+    return single
+
+
+def restack(item: Item) -> Item:
+    """Merge an unequipped item into its stack, returning the stack; the caller commits"""
+    stack_id = find_stack(item.game_id, item.item_template, item.rarity, exclude=item.id)
+    if stack_id is None or not _grow_stack(stack_id, item.quantity or 1):
+        return item
+    db.session.delete(item)
+    db.session.flush()
+    return db.session.get(Item, stack_id, populate_existing=True)
+
+
+def salvage_items(game_id: int, item_ids: Optional[Iterable[int]] = None, **filters) -> Tuple[int, int, int]:
+    """Salvage unequipped stacks for gold; the caller commits
+
+    Deletes the stacks selected by `item_ids` and/or the type and rarity
+    filters in one DELETE, then credits their gold in one UPDATE, or
+    creates the gold resource if the game has none.
+    Returns (stacks, items, gold).
+    """
+    selected = item_filters(game_id, equipped=False, **filters)
+    if item_ids is not None:
+        selected.append(Item.id.in_(list(item_ids)))
+    deleted = db.session.execute(
+        db.delete(Item).where(*selected).returning(Item.rarity, Item.quantity),
+        execution_options={'synchronize_session': False},
+    ).all()
+
+    items = sum(quantity or 1 for _, quantity in deleted)
+    gold = sum(ITEM_RARITIES.get(rarity, {}).get('salvage_gold', 0) * (quantity or 1) for rarity, quantity in deleted)
+    if gold:
+        # Querying the row first writes out buffered resource changes, so a
+        # gold row the buffer was about to insert exists by now
+        gold_row = db.session.query(Resource.id).filter(
+            Resource.game_id == game_id, Resource.resource_type == 'gold'
+        ).first()
+        if gold_row is None:
+            db.session.add(Resource(game_id=game_id, resource_type='gold', amount=gold))
+        else:
+            db.session.query(Resource).filter(Resource.id == gold_row.id).update(
+                {Resource.amount: Resource.amount + literal(gold, Resource.amount.type)},
+                synchronize_session=False,
+            )
+    return len(deleted), items, gold
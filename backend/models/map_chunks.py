@@ -0,0 +1,113 @@
+"""Lazily generated, chunked world maps
+
+Maps larger than EAGER_MAP_RADIUS are not generated up front. Instead a
+MapConfig row stores the radius and a seed, and each chunk is generated
+the first time something needs it. The generated tiles are written to
+map_tiles like any other tile, so the rest of the map code does not need
+to know whether a map is chunked. Because every chunk is rolled from its
+own seeded RNG, generation order does not affect the result.
+
+Requests that need the same chunk at the same time both try to insert
+its map_chunks row; the insert skips rows that already exist, and only
+the request whose row went in generates the tiles.
+"""
+
+import random
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, tuple_
+
+from . import hex_grid
+from .db import db, MapChunk, MapConfig, MapTile
+from .equipment import UPSERT_DIALECTS
+from .world_map import CHUNK_SIZE, random_terrain, roll_tile_contents
+
+ChunkKey = Tuple[int, int]
+
+# Chunks generated around the player's town when a chunked map is created
+INITIAL_CHUNK_RANGE = 2
+
+
+def get_map_config(game_id: int) -> Optional[MapConfig]:
+    return MapConfig.query.get(game_id)
+
+
+def create_chunked_map(game_id: int, radius: int, seed: Optional[int] = None) -> MapConfig:
+    """Register a chunked map and generate the chunks around the town
+
+    Existing tiles must already have been removed by the caller.
+    """
+    MapChunk.query.filter_by(game_id=game_id).delete()
+    MapConfig.query.filter_by(game_id=game_id).delete()
+
+    config = MapConfig(
+        game_id=game_id,
+        radius=radius,
+        seed=seed if seed is not None else random.getrandbits(62),
+        chunk_size=CHUNK_SIZE,
+    )
+    db.session.add(config)
+    ensure_chunks(config, hex_grid.chunks_in_range(0, 0, INITIAL_CHUNK_RANGE, CHUNK_SIZE))
+    return config
+
+
+def generate_chunk_tiles(config: MapConfig, cq: int, cr: int) -> List[Dict]:
+    """Deterministically roll every tile of one chunk from the map seed"""
+    rng = random.Random(f'{config.seed}:{cq}:{cr}')
+    rows = []
+    for q, r in hex_grid.chunk_hexes(cq, cr, config.chunk_size, config.radius):
+        rows.append({
+            'game_id': config.game_id,
+            'q': q,
+            'r': r,
+            'terrain_type': random_terrain(rng),
+            **roll_tile_contents(q, r, rng),
+        })
+    return rows
+
+
+def ensure_chunks(config: MapConfig, chunk_keys: Iterable[ChunkKey]) -> int:
+    """Generate any of the given chunks that do not exist yet
+
+    Adds the tiles to the current session without committing and returns
+    the number of chunks generated.
+    """
+    wanted: Set[ChunkKey] = {
+        key for key in chunk_keys
+        if hex_grid.chunk_on_map(key[0], key[1], config.chunk_size, config.radius)
+    }
+    if not wanted:
+        return 0
+
+    existing = {
+        (cq, cr) for cq, cr in db.session.query(MapChunk.cq, MapChunk.cr).filter(
+            MapChunk.game_id == config.game_id,
+            tuple_(MapChunk.cq, MapChunk.cr).in_(list(wanted))
+        )
+    }
+    missing = sorted(wanted - existing)
+    if not missing:
+        return 0
+
+    # Claim the chunks; those another request claimed first are skipped
+    insert_chunks = UPSERT_DIALECTS[db.engine.dialect.name](MapChunk).values([
+        {'game_id': config.game_id, 'cq': cq, 'cr': cr} for cq, cr in missing
+    ]).on_conflict_do_nothing(index_elements=['game_id', 'cq', 'cr'])
+    claimed = sorted(db.session.execute(insert_chunks.returning(MapChunk.cq, MapChunk.cr)).all())
+    if not claimed:
+        return 0
+
+    rows = []
+    for cq, cr in claimed:
+        rows.extend(generate_chunk_tiles(config, cq, cr))
+    db.session.execute(insert(MapTile), rows)
+    return len(claimed)
+
+
+def ensure_chunks_around(game_id: int, q: int, r: int) -> int:
+    """Make sure every neighbor of (q, r) has been generated"""
+    config = get_map_config(game_id)
+    if config is None:
+        return 0
+    keys = {hex_grid.chunk_of(nq, nr, config.chunk_size) for nq, nr in hex_grid.neighbors(q, r)}
+    return ensure_chunks(config, keys)
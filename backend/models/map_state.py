@@ -0,0 +1,210 @@
+"""Cached in-memory view of a game's world map
+
+MapState holds what the pathfinding and attack queries need (movement
+costs, adjacency, tile ownership, enemies and the attackable frontier)
+so they never touch the database after the first load. The cache is
+per process and keyed by SavedGame.map_version, which every change to
+the map bumps in its own transaction (`bump_map_version`); a worker that
+finds a newer version reloads the state. Routes that change tile
+ownership also call `update_tile_owner` after committing, which updates
+this worker's state in place; routes that replace the map call
+`invalidate_map_state`.
+"""
+
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import hex_grid, pathfinding
+from .db import db, MapTile, SavedGame
+from .game_cache import GameCache
+from .world_map import TERRAIN_TRAITS, get_enemy_power
+
+Hex = Tuple[int, int]
+
+
+class MapState:
+    """Movement costs, adjacency, ownership, frontier and a lazy distance field"""
+
+    def __init__(self, game_id: int, tiles: List[Tuple[int, int, str, Optional[str], Optional[str], int]],
+                 version: int = 0):
+        """tiles: (q, r, terrain_type, occupied_by, enemy_type, enemy_strength) rows"""
+        self.game_id = game_id
+        self.version = version  # SavedGame.map_version the tiles were read at
+        self.costs: Dict[Hex, int] = {}
+        self.terrain: Dict[Hex, str] = {}
+        self.owners: Dict[Hex, Optional[str]] = {}
+        self.enemies: Dict[Hex, Tuple[str, int, int]] = {}  # (type, strength, power)
+        self.player_tiles: Set[Hex] = set()
+        self.frontier: Set[Hex] = set()
+        self.lock = threading.RLock()
+        self._distance_field: Optional[Dict[Hex, int]] = None
+
+        for q, r, terrain_type, occupied_by, enemy_type, enemy_strength in tiles:
+            self.costs[(q, r)] = TERRAIN_TRAITS.get(terrain_type, {}).get('movement_cost', 1)
+            self.terrain[(q, r)] = terrain_type
+            self.owners[(q, r)] = occupied_by
+            if enemy_type:
+                power = get_enemy_power(enemy_type, enemy_strength)
+                self.enemies[(q, r)] = (enemy_type, enemy_strength or 0, power)
+            if occupied_by == 'player':
+                self.player_tiles.add((q, r))
+
+        self.adjacency: Dict[Hex, Tuple[Hex, ...]] = {
+            coords: tuple(n for n in hex_grid.neighbors(*coords) if n in self.costs)
+            for coords in self.costs
+        }
+
+        for coords in self.player_tiles:
+            for neighbor in self.adjacency[coords]:
+                if self.owners[neighbor] == 'neutral':
+                    self.frontier.add(neighbor)
+
+    @classmethod
+    def load(cls, game_id: int) -> 'MapState':
+        version = map_version(game_id)
+        rows = db.session.query(
+            MapTile.q, MapTile.r, MapTile.terrain_type, MapTile.occupied_by,
+            MapTile.enemy_type, MapTile.enemy_strength
+        ).filter(MapTile.game_id == game_id).all()
+        return cls(game_id, rows, version)
+
+    def set_owner(self, q: int, r: int, owner: Optional[str]) -> None:
+        """Record an ownership change, updating frontier and distance field incrementally"""
+        coords = (q, r)
+        with self.lock:
+            if coords not in self.costs:
+                return
+            previous = self.owners.get(coords)
+            self.owners[coords] = owner
+            if owner == 'player':
+                self.enemies.pop(coords, None)
+
+            if owner == 'player' and previous != 'player':
+                self.player_tiles.add(coords)
+                if self._distance_field is not None:
+                    pathfinding.add_source(self._distance_field, self.costs, self.adjacency, coords)
+            elif previous == 'player' and owner != 'player':
+                # Losing a source can raise distances anywhere; rebuild lazily
+                self.player_tiles.discard(coords)
+                self._distance_field = None
+
+            # Only the changed tile and its neighbors can enter or leave the frontier
+            for tile in (coords,) + self.adjacency[coords]:
+                self._refresh_frontier(tile)
+
+    def _refresh_frontier(self, coords: Hex) -> None:
+        is_frontier = self.owners[coords] == 'neutral' and any(
+            self.owners[n] == 'player' for n in self.adjacency[coords]
+        )
+        if is_frontier:
+            self.frontier.add(coords)
+        else:
+            self.frontier.discard(coords)
+
+    def is_attackable(self, q: int, r: int) -> bool:
+        """True if (q, r) is a neutral tile bordering player territory"""
+        return (q, r) in self.frontier
+
+    def frontier_tiles(self) -> List[Dict]:
+        """Attackable tiles with terrain and precomputed enemy power"""
+        with self.lock:
+            tiles = []
+            for q, r in sorted(self.frontier):
+                terrain_type = self.terrain[(q, r)]
+                enemy = self.enemies.get((q, r))
+                tiles.append({
+                    'q': q,
+                    'r': r,
+                    'terrain_type': terrain_type,
+                    'defense_bonus': TERRAIN_TRAITS.get(terrain_type, {}).get('defense_bonus', 0),
+                    'movement_cost': self.costs[(q, r)],
+                    'enemy': {
+                        'type': enemy[0],
+                        'strength': enemy[1],
+                        'power': enemy[2],
+                    } if enemy else None,
+                })
+            return tiles
+
+    def distance_field(self) -> Dict[Hex, int]:
+        """Cheapest movement cost from player territory to every tile"""
+        with self.lock:
+            if self._distance_field is None:
+                self._distance_field = pathfinding.distance_field(
+                    self.costs, self.adjacency, self.player_tiles
+                )
+            return self._distance_field
+
+    def find_path(self, start: Hex, goal: Hex) -> Optional[Tuple[List[Hex], int]]:
+        """Cheapest path between two tiles"""
+        return pathfinding.find_path(self.costs, self.adjacency, start, goal)
+
+    def path_from_territory(self, goal: Hex) -> Optional[Tuple[List[Hex], int]]:
+        """Cheapest path from the nearest player-owned tile to goal"""
+        with self.lock:
+            field = self.distance_field()
+            path = pathfinding.trace_path(field, self.costs, self.adjacency, goal)
+            return (path, field[goal]) if path else None
+
+    def reachable(self, movement: int) -> List[Tuple[Hex, int]]:
+        """Tiles outside player territory reachable within `movement` points"""
+        with self.lock:
+            field = self.distance_field()
+            return [
+                (coords, cost) for coords, cost in field.items()
+                if 0 < cost <= movement and self.owners.get(coords) != 'player'
+            ]
+
+
+def map_version(game_id: int) -> int:
+    version = db.session.query(SavedGame.map_version).filter(SavedGame.id == game_id).scalar()
+    return version or 0
+
+
+def bump_map_version(game_id: int) -> int:
+    """Mark the game's map changed; the caller commits. Returns the new version"""
+    version = db.session.execute(
+        db.update(SavedGame)
+        .where(SavedGame.id == game_id)
+        .values({
+            SavedGame.map_version: db.func.coalesce(SavedGame.map_version, 0) + 1,
+            # updated_at marks the last production accrual; keep it
+            SavedGame.updated_at: SavedGame.updated_at,
+        })
+        .returning(SavedGame.map_version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    return version or 0
+
+
+_map_states: GameCache[MapState] = GameCache(MapState.load)
+
+
+def get_map_state(game_id: int) -> MapState:
+    """The game's cached map state, reloaded if the map changed since"""
+    state = _map_states.peek(game_id)
+    if state is not None and state.version == map_version(game_id):
+        return state
+    _map_states.invalidate(game_id)
+    return _map_states.get(game_id)
+
+
+def update_tile_owner(game_id: int, q: int, r: int, owner: Optional[str], version: int) -> None:
+    """Apply a committed ownership change that bumped the map to `version`
+
+    The cached state is updated in place if it was current just before
+    the change; otherwise it is dropped and reloaded on next use.
+    """
+    state = _map_states.peek(game_id)
+    if state is None:
+        return
+    with state.lock:
+        if state.version == version - 1:
+            state.set_owner(q, r, owner)
+            state.version = version
+            return
+    _map_states.invalidate(game_id)
+
+
+def invalidate_map_state(game_id: int) -> None:
+    _map_states.invalidate(game_id)
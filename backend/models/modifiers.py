@@ -0,0 +1,227 @@
+"""Per-game modifier engine
+
+Talents, race special buildings and equipped items all change numbers
+elsewhere in the game, but each source writes its bonuses its own way:
+
+- TALENT_TREE bonuses are fractions per level (0.05 = +5% per level);
+- special building bonuses are production factors (1.2 = +20%) and unit
+  percentages (15 = +15%), except unit_hp which is flat hit points;
+- item stats are flat hero stat points, already scaled by rarity.
+
+MODIFIER_KEYS resolves every source key once, at import, to the typed
+targets it feeds and the scale to apply. `compile_modifiers` folds a
+game's sources into a flat Modifiers vector with these stacking rules:
+
+- percentage targets are summed and applied once as (1 + total), so two
+  +10% bonuses give +20%, not +21%;
+- flat targets are summed and added before percentages;
+- the unit cost reduction is capped at MAX_COST_REDUCTION.
+
+The vector is cached per game (see game_cache) and tagged with the
+SavedGame.stats_version it was compiled at. Every write that changes
+talents, buildings with a bonus or equipped items bumps that version in
+its own transaction (hero_stats.bump_stats_version), so a worker holding
+an older vector recompiles it; after committing, the writing worker
+calls army.bonuses_changed to recompile its own right away.
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+from .db import db, Building, SavedGame, Talent, BUILDINGS, RESOURCES, TALENT_TREE
+from .equipment import equipped_items
+from .game_cache import GameCache
+
+# Recruitment discounts never make units free
+MAX_COST_REDUCTION = 0.9
+
+# Hero stats, and the item stats that raise them
+HERO_STATS = ('health_point', 'physical_attack', 'physical_defense', 'magical_attack', 'magical_defense')
+ITEM_STAT_TARGETS = {
+    'hp': ('health_point',),
+    'attack': ('physical_attack', 'magical_attack'),
+    'defense': ('physical_defense', 'magical_defense'),
+    'physical_attack': ('physical_attack',),
+    'physical_defense': ('physical_defense',),
+    'magical_attack': ('magical_attack',),
+    'magical_defense': ('magical_defense',),
+}
+
+UNIT_ATTACK = ('unit_physical_attack', 'unit_magical_attack')
+UNIT_ALL_STATS = UNIT_ATTACK + ('unit_defense', 'unit_hp')
+UNIT_BONUS_FIELDS = UNIT_ALL_STATS + ('unit_hp_flat', 'unit_cost_reduction')
+
+# (target, scale) pairs; a source value v contributes v * scale to each target
+Targets = Tuple[Tuple[str, float], ...]
+
+
+def _production_keys() -> Dict[str, Targets]:
+    return {f'{resource}_multiplier': ((f'production.{resource}', 1),) for resource in RESOURCES}
+
+
+def _hero_keys() -> Dict[str, Targets]:
+    return {stat: tuple((f'hero.{target}', 1) for target in targets)
+            for stat, targets in ITEM_STAT_TARGETS.items()}
+
+
+MODIFIER_KEYS: Dict[str, Dict[str, Targets]] = {
+    'talent': {
+        **_production_keys(),
+        'resource_multiplier': tuple((f'production.{resource}', 1) for resource in RESOURCES),
+        'unit_attack_multiplier': tuple((target, 1) for target in UNIT_ATTACK),
+        'unit_defense_multiplier': (('unit_defense', 1),),
+        'unit_hp_bonus': (('unit_hp_flat', 1),),
+        'unit_cost_reduction': (('unit_cost_reduction', 1),),
+        'recruitment_speed': (('recruitment_speed', 1),),
+        'magical_power': (('magical_power', 1),),
+        'hero_stats_multiplier': (('hero_stats', 1),),
+    },
+    'building': {
+        # Production factors: 1.2 is +20%, see FACTOR_KEYS
+        **_production_keys(),
+        'unit_physical_attack': (('unit_physical_attack', 0.01),),
+        'unit_magical_attack': (('unit_magical_attack', 0.01),),
+        'unit_defense': (('unit_defense', 0.01),),
+        'unit_hp': (('unit_hp_flat', 1),),
+        'unit_all_stats': tuple((target, 0.01) for target in UNIT_ALL_STATS),
+        'unit_cost_reduction': (('unit_cost_reduction', 1),),
+    },
+    'item': _hero_keys(),
+}
+
+# Building bonus keys given as factors rather than increments
+FACTOR_KEYS = {f'{resource}_multiplier' for resource in RESOURCES}
+
+
+@dataclass(frozen=True)
+class Modifiers:
+    """A game's compiled bonuses; percentages are fractions (0.2 = +20%)"""
+    production: Mapping[str, float] = field(default_factory=dict)  # resource -> percentage
+    unit_physical_attack: float = 0.0
+    unit_magical_attack: float = 0.0
+    unit_defense: float = 0.0
+    unit_hp: float = 0.0
+    unit_hp_flat: float = 0.0
+    unit_cost_reduction: float = 0.0
+    recruitment_speed: float = 0.0
+    magical_power: float = 0.0
+    hero_stats: float = 0.0
+    hero_flat: Mapping[str, float] = field(default_factory=dict)  # hero stat -> points
+    # (source kind, source id, target, contribution) for every applied bonus
+    sources: Tuple[Tuple[str, str, str, float], ...] = ()
+    version: int = 0  # SavedGame.stats_version the sources were read at
+
+    def production_multiplier(self, resource_type: str) -> float:
+        return 1 + self.production.get(resource_type, 0)
+
+    def unit_cost_multiplier(self) -> float:
+        return 1 - min(MAX_COST_REDUCTION, self.unit_cost_reduction)
+
+    def apply_hero_stats(self, base: Mapping[str, float]) -> Dict[str, int]:
+        """Hero stats after flat item bonuses, then the percentage bonus"""
+        return {stat: int((value + self.hero_flat.get(stat, 0)) * (1 + self.hero_stats))
+                for stat, value in base.items()}
+
+    def with_building(self, building_type: str) -> 'Modifiers':
+        """These modifiers plus one newly built building's bonus"""
+        return _fold(self.sources + _building_sources(building_type))
+
+
+def _talent_sources(talent_levels: Mapping[str, int]) -> Tuple:
+    sources = []
+    for talent_id, level in sorted(talent_levels.items()):
+        for key, value in TALENT_TREE.get(talent_id, {}).get('bonus', {}).items():
+            for target, scale in MODIFIER_KEYS['talent'].get(key, ()):
+                sources.append(('talent', talent_id, target, value * scale * level))
+    return tuple(sources)
+
+
+def _building_sources(building_type: str) -> Tuple:
+    sources = []
+    for key, value in BUILDINGS.get(building_type, {}).get('bonus', {}).items():
+        if key in FACTOR_KEYS:
+            value -= 1
+        for target, scale in MODIFIER_KEYS['building'].get(key, ()):
+            sources.append(('building', building_type, target, value * scale))
+    return tuple(sources)
+
+
+def _item_sources(items: Iterable[Tuple[str, Mapping[str, float]]]) -> Tuple:
+    sources = []
+    for template, stats in items:
+        for key, value in stats.items():
+            for target, scale in MODIFIER_KEYS['item'].get(key, ()):
+                sources.append(('item', template, target, value * scale))
+    return tuple(sources)
+
+
+def _fold(sources: Tuple) -> Modifiers:
+    totals: Dict[str, float] = {}
+    for _, _, target, value in sources:
+        totals[target] = totals.get(target, 0) + value
+
+    production = {}
+    hero_flat = {}
+    scalars = {}
+    for target, value in totals.items():
+        group, _, name = target.partition('.')
+        if group == 'production':
+            production[name] = value
+        elif group == 'hero':
+            hero_flat[name] = value
+        else:
+            scalars[target] = value
+    return Modifiers(production=production, hero_flat=hero_flat, sources=sources, **scalars)
+
+
+def compile_modifiers(talent_levels: Mapping[str, int], building_types: Iterable[str],
+                      items: Iterable[Tuple[str, Mapping[str, float]]] = ()) -> Modifiers:
+    """Fold talent levels, built building types and equipped (template, stats) into one vector"""
+    sources = _talent_sources(talent_levels)
+    for building_type in sorted(set(building_types)):
+        sources += _building_sources(building_type)
+    return _fold(sources + _item_sources(items))
+
+
+def modifiers_version(game_id: int) -> int:
+    version = db.session.query(SavedGame.stats_version).filter(SavedGame.id == game_id).scalar()
+    return version or 0
+
+
+def load_modifiers(game_id: int) -> Modifiers:
+    # Read before the sources, so a change made in between is seen as newer
+    version = modifiers_version(game_id)
+    talent_levels = dict(
+        db.session.query(Talent.talent_id, Talent.level).filter(Talent.game_id == game_id)
+    )
+    building_types = [row[0] for row in db.session.query(Building.building_type).filter(
+        Building.game_id == game_id
+    )]
+    items = [(item.item_template, item.get_stats()) for item in equipped_items(game_id)]
+    return replace(compile_modifiers(talent_levels, building_types, items), version=version)
+
+
+def has_bonus(building_type: str) -> bool:
+    """True if building this type changes any modifier"""
+    return bool(BUILDINGS.get(building_type, {}).get('bonus'))
+
+
+_modifiers: GameCache[Modifiers] = GameCache(load_modifiers)
+
+
+def get_modifiers(game_id: int) -> Modifiers:
+    """The game's cached modifiers, recompiled if its sources changed since"""
+    modifiers = _modifiers.peek(game_id)
+    if modifiers is not None and modifiers.version == modifiers_version(game_id):
+        return modifiers
+    _modifiers.invalidate(game_id)
+    return _modifiers.get(game_id)
+
+
+def cached_modifiers(game_id: int) -> Optional[Modifiers]:
+    """The cached modifiers without a version check; compare `version` to the game's"""
+    return _modifiers.peek(game_id)
+
+
+def invalidate_modifiers(game_id: int) -> None:
+    _modifiers.invalidate(game_id)
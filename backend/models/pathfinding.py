@@ -0,0 +1,110 @@
+"""Movement-cost pathfinding over a hex grid
+
+Entering a tile costs its terrain's movement_cost (TERRAIN_TRAITS).
+The functions here work on plain dicts so they can be used with any
+grid: `costs` maps (q, r) -> cost and `adjacency` maps (q, r) to the
+tuple of neighboring coordinates that exist on the map.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import hex_grid
+
+Hex = Tuple[int, int]
+
+
+def find_path(costs: Dict[Hex, int], adjacency: Dict[Hex, Tuple[Hex, ...]],
+              start: Hex, goal: Hex) -> Optional[Tuple[List[Hex], int]]:
+    """A* search from start to goal
+
+    Returns (path, total_cost) with both endpoints included, or None if
+    either endpoint is off the map. The heuristic is hex distance times
+    the cheapest movement cost, which never overestimates.
+    """
+    if start not in costs or goal not in costs:
+        return None
+
+    min_cost = min(costs.values())
+    gq, gr = goal
+
+    best = {start: 0}
+    came_from: Dict[Hex, Hex] = {}
+    frontier = [(hex_grid.distance(start[0], start[1], gq, gr) * min_cost, 0, start)]
+
+    while frontier:
+        _, cost, current = heapq.heappop(frontier)
+        if current == goal:
+            path = [current]
+            while current in came_from:
+                current = came_from[current]
+                path.append(current)
+            path.reverse()
+            return path, cost
+        if cost > best[current]:
+            continue
+
+        for neighbor in adjacency[current]:
+            new_cost = cost + costs[neighbor]
+            if new_cost < best.get(neighbor, new_cost + 1):
+                best[neighbor] = new_cost
+                came_from[neighbor] = current
+                estimate = new_cost + hex_grid.distance(neighbor[0], neighbor[1], gq, gr) * min_cost
+                heapq.heappush(frontier, (estimate, new_cost, neighbor))
+
+    return None
+
+
+def distance_field(costs: Dict[Hex, int], adjacency: Dict[Hex, Tuple[Hex, ...]],
+                   sources: Iterable[Hex]) -> Dict[Hex, int]:
+    """Multi-source Dijkstra: cheapest cost from any source to every tile"""
+    field: Dict[Hex, int] = {}
+    for source in sources:
+        if source in costs:
+            field[source] = 0
+    _relax(field, costs, adjacency, [(0, source) for source in field])
+    return field
+
+
+def add_source(field: Dict[Hex, int], costs: Dict[Hex, int],
+               adjacency: Dict[Hex, Tuple[Hex, ...]], source: Hex) -> None:
+    """Incrementally update a distance field after a new source is added
+
+    Adding a source can only lower distances, so only the region that
+    becomes closer to the new source is re-relaxed.
+    """
+    if source not in costs or field.get(source) == 0:
+        return
+    field[source] = 0
+    _relax(field, costs, adjacency, [(0, source)])
+
+
+def trace_path(field: Dict[Hex, int], costs: Dict[Hex, int],
+               adjacency: Dict[Hex, Tuple[Hex, ...]], goal: Hex) -> Optional[List[Hex]]:
+    """Walk a distance field downhill from goal back to the nearest source"""
+    if goal not in field:
+        return None
+
+    path = [goal]
+    current = goal
+    while field[current] > 0:
+        target = field[current] - costs[current]
+        current = next(n for n in adjacency[current] if field.get(n) == target)
+        path.append(current)
+    path.reverse()
+    return path
+
+
+def _relax(field: Dict[Hex, int], costs: Dict[Hex, int],
+           adjacency: Dict[Hex, Tuple[Hex, ...]], heap: List[Tuple[int, Hex]]) -> None:
+    """Run Dijkstra from the given heap entries, lowering field values in place"""
+    heapq.heapify(heap)
+    while heap:
+        cost, current = heapq.heappop(heap)
+        if cost > field[current]:
+            continue
+        for neighbor in adjacency[current]:
+            new_cost = cost + costs[neighbor]
+            if new_cost < field.get(neighbor, new_cost + 1):
+                field[neighbor] = new_cost
+                heapq.heappush(heap, (new_cost, neighbor))
@@ -0,0 +1,308 @@
+"""Write-behind buffer for resource deltas
+
+A burst of resource clicks used to turn into a burst of commits, one per
+POST /api/game/resource. The buffer instead collects the deltas per game
+for a short window (RESOURCE_WRITE_WINDOW_MS, default 75) and then writes
+all of a game's changes as a single UPDATE in one transaction.
+
+Each game's pending changes are written out:
+- when its window expires (background flusher thread),
+- before any ORM query that loads Resource rows, so a read that needs
+  consistency (production accrual, spending, saving) sees every
+  acknowledged change. A transaction that has already written holds the
+  write lock, so the changes are written over its own connection; if it
+  rolls back they are buffered again,
+- at interpreter exit and when a gunicorn worker stops.
+
+A flush that fails buffers its changes again; the flusher retries them
+with exponential backoff (RESOURCE_FLUSH_RETRY_MS, doubling up to
+RESOURCE_FLUSH_RETRY_MAX_MS). An acknowledged change can therefore be lost
+only if the process dies without running its exit handlers, and at most one
+window's worth plus whatever is still waiting to be retried.
+RESOURCE_WRITE_WINDOW_MS=0 writes every change through immediately.
+
+Amounts returned by `add` are the stored amount plus buffered deltas;
+production accrued since the game's last read is credited by the next
+read (see routes/game.apply_production), not by `add`.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import case, event, func, literal, select
+
+from .db import db, Resource
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+resources_table = Resource.__table__
+
+RETRY_SECONDS = int(os.getenv('RESOURCE_FLUSH_RETRY_MS', '500')) / 1000
+MAX_RETRY_SECONDS = int(os.getenv('RESOURCE_FLUSH_RETRY_MAX_MS', '30000')) / 1000
+
+# Session.info key of changes flushed inside the session's transaction
+FLUSHED_KEY = 'flushed_resources'
+
+Pending = Dict[int, Dict[str, 'PendingResource']]
+
+
+class PendingResource:
+    """Buffered change to one resource: the amount last read plus a net delta"""
+
+    __slots__ = ('base', 'delta', 'exists')
+
+    def __init__(self, base: float, exists: bool):
+        self.base = base
+        self.delta = 0.0
+        self.exists = exists
+
+    @property
+    def amount(self) -> float:
+        return self.base + self.delta
+
+
+class ResourceWriteBuffer:
+    """Coalesces resource deltas per game and flushes them in one statement"""
+
+    def __init__(self, window_seconds: float):
+        self.window = window_seconds
+        self._pending: Dict[int, Dict[str, PendingResource]] = {}
+        self._deadlines: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Held while a flush is being written, so a consistency flush waits
+        # for one already in flight
+        self._flush_lock = threading.Lock()
+        # game id -> consecutive failed flushes, for the retry backoff
+        self._failures: Dict[int, int] = {}
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self.changes = 0
+        self.flushes = 0
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def add(self, game_id: int, resource_type: str, amount: float) -> Tuple[float, float]:
+        """Buffer `amount` (clamped so the resource stays >= 0)
+
+        Returns (new amount, delta actually applied). Must be called with
+        an application context.
+        """
+        self._app = current_app._get_current_object()
+
+        with self._lock:
+            fresh = self._pending.get(game_id, {}).get(resource_type)
+        if fresh is None:
+            # Read outside the lock; a concurrent first add may do the same
+            # and the loser's read is discarded by setdefault below
+            row = db.session.execute(
+                select(resources_table.c.amount).where(
+                    resources_table.c.game_id == game_id,
+                    resources_table.c.resource_type == resource_type,
+                )
+            ).first()
+            fresh = PendingResource((row[0] or 0) if row else 0, row is not None)
+
+        with self._lock:
+            game = self._pending.setdefault(game_id, {})
+            entry = game.setdefault(resource_type, fresh)
+            previous = entry.amount
+            entry.delta = max(0, previous + amount) - entry.base
+            applied = entry.amount - previous
+            self.changes += 1
+
+            if game_id not in self._deadlines:
+                self._deadlines[game_id] = time.monotonic() + self.window
+                self._wakeup.notify()
+            new_amount = entry.amount
+
+        if self.window <= 0:
+            try:
+                self.flush(game_id)
+            except Exception:
+                # Buffered again; the flusher retries it like a windowed write
+                logger.exception("Resource flush for game %s failed", game_id)
+        else:
+            self._ensure_flusher()
+        return new_amount, applied
+
+    def flush(self, game_id: int) -> None:
+        """Write one game's pending changes now
+
+        If the write fails the changes are buffered again for a retry and
+        the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                changes = self._pending.pop(game_id, None)
+                self._deadlines.pop(game_id, None)
+            if changes:
+                self._write_or_requeue(game_id, changes)
+
+    def flush_all(self) -> None:
+        """Write every game's pending changes now
+
+        Games whose write fails are buffered again; the first error is
+        raised once the other games have been written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._deadlines.clear()
+            error = None
+            for game_id, changes in pending.items():
+                try:
+                    self._write_or_requeue(game_id, changes)
+                except Exception as e:
+                    error = error or e
+            if error is not None:
+                raise error
+
+    def flush_into(self, conn) -> Pending:
+        """Write every game's pending changes on `conn`, in its transaction
+
+        Used by a transaction that already holds the write lock. Flushes in
+        flight on other connections are not waited for, since they wait
+        for that lock. Returns the changes written, for `requeue`.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._deadlines.clear()
+        for game_id, changes in pending.items():
+            self._execute(conn, game_id, changes)
+        return pending
+
+    def requeue(self, pending: Pending, delay: Optional[float] = None) -> None:
+        """Buffer changes again whose write failed or rolled back
+
+        They are flushed after `delay` seconds (default: one window), or
+        with changes buffered since if those are due earlier.
+        """
+        if delay is None:
+            delay = self.window
+        with self._lock:
+            for game_id, changes in pending.items():
+                game = self._pending.setdefault(game_id, {})
+                for resource_type, change in changes.items():
+                    entry = game.get(resource_type)
+                    if entry is None:
+                        game[resource_type] = change
+                    else:
+                        entry.delta += change.delta
+                self._deadlines.setdefault(game_id, time.monotonic() + delay)
+            self._wakeup.notify()
+        self._ensure_flusher()
+
+    def _write_or_requeue(self, game_id: int, changes: Dict[str, PendingResource]) -> None:
+        try:
+            self._write(game_id, changes)
+        except Exception:
+            with self._lock:
+                failures = self._failures[game_id] = self._failures.get(game_id, 0) + 1
+            self.requeue({game_id: changes}, min(RETRY_SECONDS * 2 ** (failures - 1), MAX_RETRY_SECONDS))
+            raise
+        if self._failures:
+            with self._lock:
+                self._failures.pop(game_id, None)
+
+    def _write(self, game_id: int, changes: Dict[str, PendingResource]) -> None:
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                self._execute(conn, game_id, changes)
+
+    def _execute(self, conn, game_id: int, changes: Dict[str, PendingResource]) -> None:
+        updates = {k: v.delta for k, v in changes.items() if v.exists and v.delta}
+        inserts = [
+            {'game_id': game_id, 'resource_type': k, 'amount': max(0, v.delta)}
+            for k, v in changes.items() if not v.exists
+        ]
+        if not updates and not inserts:
+            return
+
+        if updates:
+            # Deltas, not absolute values, so production credited
+            # by other requests in the meantime is kept
+            # Typed literals so the deltas are scaled like the column
+            delta = case(
+                {k: literal(v, resources_table.c.amount.type) for k, v in updates.items()},
+                value=resources_table.c.resource_type,
+            )
+            # SQLite's two-argument max() is Postgres' greatest()
+            clamp = func.max if conn.dialect.name == 'sqlite' else func.greatest
+            conn.execute(
+                resources_table.update()
+                .where(resources_table.c.game_id == game_id,
+                       resources_table.c.resource_type.in_(list(updates)))
+                .values(amount=clamp(0, resources_table.c.amount + delta))
+            )
+        if inserts:
+            conn.execute(resources_table.insert(), inserts)
+        self.flushes += 1
+
+    # ==================== BACKGROUND FLUSHER ====================
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive fork, so check liveness rather than a flag
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='resource-flusher', daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._deadlines:
+                    self._wakeup.wait()
+                game_id, deadline = min(self._deadlines.items(), key=lambda item: item[1])
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+            try:
+                self.flush(game_id)
+            except Exception:
+                # The changes are buffered again and retried after a backoff
+                logger.exception("Resource flush for game %s failed (attempt %s)",
+                                 game_id, self._failures.get(game_id))
+
+
+resource_writes = ResourceWriteBuffer(int(os.getenv('RESOURCE_WRITE_WINDOW_MS', '75')) / 1000)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _flush_before_resource_reads(orm_execute_state):
+    """Make buffered changes visible before Resource rows are loaded"""
+    if not resource_writes.has_pending() or not orm_execute_state.is_select:
+        return
+    if Resource.__mapper__ not in orm_execute_state.all_mappers:
+        return
+    session = orm_execute_state.session
+    if session.info.get('writing'):
+        # This transaction holds the write lock, so a flush on another
+        # connection would wait for it; write the changes in it instead
+        conn = session.connection(bind_arguments={'mapper': Resource.__mapper__})
+        session.info.setdefault(FLUSHED_KEY, []).append(resource_writes.flush_into(conn))
+        return
+    resource_writes.flush_all()
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_flushed(session):
+    session.info.pop(FLUSHED_KEY, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _requeue_flushed(session):
+    for pending in session.info.pop(FLUSHED_KEY, []):
+        resource_writes.requeue(pending)
+
+
+atexit.register(resource_writes.flush_all)
@@ -0,0 +1,110 @@
+"""Saving the client's game state
+
+A save is a full snapshot of the hero, resources, buildings and units.
+Rather than replacing the rows, the save is diffed against the stored
+game and only rows whose values differ are inserted, updated or deleted,
+so saving an unchanged game writes nothing.
+"""
+
+from typing import Dict
+
+from .army import bump_units_version
+from .db import SavedGame, Resource, Building, Unit, ConstructionJob, TalentSummary, TrainingBatch, RESOURCES
+from .hero_stats import bump_stats_version
+from .modifiers import has_bonus
+
+HERO_FIELDS = ('hero_name', 'hero_class', 'hero_race', 'level', 'experience')
+
+
+def sync_game(game: SavedGame, data: Dict) -> Dict[str, int]:
+    """Make a game match a save; the caller commits
+
+    Resources missing from the save are kept; buildings and units missing
+    from it are deleted, together with the construction jobs and training
+    batches queued in those buildings. Returns the number of rows written
+    per part.
+    """
+    changes = {'hero': 0, 'resources': 0, 'buildings': 0, 'units': 0}
+
+    for field in HERO_FIELDS:
+        if field in data and getattr(game, field) != data[field]:
+            setattr(game, field, data[field])
+            changes['hero'] = 1
+
+    # Resources by type
+    resources = {r.resource_type: r for r in game.resources}
+    for resource_type, amount in data['resources'].items():
+        if resource_type not in RESOURCES:
+            continue
+        resource = resources.get(resource_type)
+        if resource is None:
+            game.resources.append(Resource(resource_type=resource_type, amount=amount))
+            changes['resources'] += 1
+        elif resource.amount != amount:
+            resource.amount = amount
+            changes['resources'] += 1
+
+    # Buildings by type (one per type)
+    buildings = {b.building_type: b for b in game.buildings}
+    saved_types = set()
+    for building_data in data['buildings']:
+        building_type = building_data['type']
+        level = building_data.get('level', 1)
+        saved_types.add(building_type)
+        building = buildings.get(building_type)
+        if building is None:
+            game.buildings.append(Building(building_type=building_type, level=level))
+            changes['buildings'] += 1
+        elif building.level != level:
+            building.level = level
+            changes['buildings'] += 1
+    removed_types = [t for t in buildings if t not in saved_types]
+    for building_type in removed_types:
+        game.buildings.remove(buildings[building_type])
+        changes['buildings'] += 1
+    if game.id is not None and removed_types:
+        # A finishing job would rebuild a removed building, and a batch would train in it
+        ConstructionJob.query.filter(
+            ConstructionJob.game_id == game.id, ConstructionJob.building_type.in_(removed_types),
+        ).delete(synchronize_session=False)
+        TrainingBatch.query.filter(
+            TrainingBatch.game_id == game.id, TrainingBatch.building_type.in_(removed_types),
+        ).delete(synchronize_session=False)
+
+    # Units by (type, race); older games may hold several rows per pair
+    units = {}
+    for unit in sorted(game.units, key=lambda u: u.id or 0):
+        units.setdefault((unit.unit_type, unit.race), []).append(unit)
+    saved_units = {}
+    for unit_data in data['units']:
+        key = (unit_data['type'], unit_data['race'])
+        saved_units[key] = saved_units.get(key, 0) + unit_data.get('count', 0)
+    for key, count in saved_units.items():
+        rows = units.pop(key, [])
+        if not rows:
+            game.units.append(Unit(unit_type=key[0], race=key[1], count=count))
+            changes['units'] += 1
+            continue
+        if rows[0].count != count:
+            rows[0].count = count
+            changes['units'] += 1
+        for extra in rows[1:]:
+            game.units.remove(extra)
+            changes['units'] += 1
+    for rows in units.values():
+        for unit in rows:
+            game.units.remove(unit)
+            changes['units'] += 1
+
+    if game.id is not None and changes['units']:
+        bump_units_version(game.id)
+    
+    # The talent summary caches whether the Academy stands; rebuild it on next use
+    if game.id is not None and ('academy' in buildings) != ('academy' in saved_types):
+        TalentSummary.query.filter_by(game_id=game.id).delete()
+    
+    # Special buildings built or removed change the game's modifiers
+    if game.id is not None and any(has_bonus(t) for t in set(buildings) ^ saved_types):
+        bump_stats_version(game.id)
+
+    return changes
@@ -0,0 +1,45 @@
+"""Session that splits SQLite reads from writes
+
+In SQLite high-concurrency mode (see config.py) the default engine holds a
+single read-write connection, so every write transaction in the process
+queues for it and they never contend for the database lock. A second
+engine under the READ_BIND key opens read-only connections; with WAL
+journaling those read the last committed state without waiting for the
+writer.
+
+A transaction sends SELECTs to the read-only engine until it writes
+anything (a flush or a DML statement). From then on it stays on the
+writer, so it reads its own uncommitted changes. When no read engine is
+configured (Postgres, in-memory SQLite) this behaves exactly like the
+stock Flask-SQLAlchemy session.
+"""
+
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import event
+
+# Bind key of the read-only SQLite engine
+READ_BIND = 'sqlite_read'
+
+
+class Session(BaseSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+
+        # Tracked on every database so callers can tell whether this
+        # transaction may hold write locks (see resource_buffer)
+        if self._flushing or clause is None or not getattr(clause, 'is_select', False):
+            self.info['writing'] = True
+
+        engines = self._db.engines
+        reader = engines.get(READ_BIND)
+        if reader is None or engine is not engines.get(None) or self.info.get('writing'):
+            return engine
+        return reader
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _end_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('writing', None)
@@ -0,0 +1,326 @@
+"""Whole-game snapshots in a compact binary format
+
+export_game packs a game - hero, town, queues, talents, items and world
+map - into one blob, and import_game creates a new game from one, so
+exporting and importing again clones a game.
+
+Layout (little endian):
+
+    b'CRDN' | format version (1 byte) | zlib(body)
+    body = header length (uint32) | header (JSON) | map columns
+
+The header holds everything but the map tiles. Tiles are stored as
+columns with one entry per tile, in an order given by the map mode:
+
+- 'seed': a chunked map. The tiles are the hexes of its generated
+  chunks, chunk by chunk, and their terrain is rolled again from the map
+  seed on import.
+- 'hex': every hex of a radius-R map, in dense-index order.
+- 'coords': any other set of tiles; their coordinates are stored.
+
+Columns: coordinates (int16 q, r pairs; 'coords' only), terrain (uint8;
+not in 'seed'), owner (uint8), enemy (uint8), enemy strength (uint16),
+then the explored flags as a bitset. Terrain, owner and enemy are
+indices into value tables in the header.
+"""
+
+import json
+import struct
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from . import hex_grid
+from .db import (
+    db, SavedGame, Resource, Building, Unit, Talent, Item, EquipmentSlot, ConstructionJob, TrainingBatch,
+    MapTile, MapChunk, MapConfig,
+)
+from .map_chunks import generate_chunk_tiles
+
+MAGIC = b'CRDN'
+FORMAT_VERSION = 1
+
+# Largest decompressed body accepted on import, so a small upload cannot
+# inflate into gigabytes
+MAX_SNAPSHOT_BYTES = 64 * 1024 * 1024
+
+# Tiles per INSERT when importing a map
+TILE_BATCH_SIZE = 5000
+
+TILE_COLUMNS = (MapTile.q, MapTile.r, MapTile.terrain_type, MapTile.occupied_by,
+                MapTile.enemy_type, MapTile.enemy_strength, MapTile.explored)
+
+
+class SnapshotError(ValueError):
+    """The blob is not a game snapshot this version can read"""
+
+
+def _time(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _pack(values: List[int], code: str) -> bytes:
+    return struct.pack(f'<{len(values)}{code}', *values)
+
+
+def _pack_bits(flags: Iterable[bool]) -> bytes:
+    flags = list(flags)
+    bits = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bits[i >> 3] |= 1 << (i & 7)
+    return bytes(bits)
+
+
+def _indexed(values: List) -> Tuple[List, List[int]]:
+    """A value table and each value's index in it"""
+    table = sorted(set(values), key=lambda v: (v is not None, v or ''))
+    index = {value: i for i, value in enumerate(table)}
+    return table, [index[value] for value in values]
+
+
+# ==================== EXPORT ====================
+
+def export_game(game_id: int) -> bytes:
+    """Pack a game into a snapshot blob"""
+    game = db.session.get(SavedGame, game_id)
+    slots = dict(db.session.query(EquipmentSlot.item_id, EquipmentSlot.slot).filter_by(game_id=game_id))
+
+    def rows(model):
+        return model.query.filter_by(game_id=game_id).order_by(model.id)
+
+    header = {
+        'game': {
+            'hero_name': game.hero_name,
+            'hero_class': game.hero_class,
+            'hero_race': game.hero_race,
+            'level': game.level,
+            'experience': game.experience,
+            'updated_at': _time(game.updated_at),
+        },
+        'resources': {r.resource_type: r.amount for r in rows(Resource)},
+        'buildings': [[b.building_type, b.level, _time(b.built_at)] for b in rows(Building)],
+        'units': [[u.unit_type, u.race, u.count, _time(u.hired_at)] for u in rows(Unit)],
+        'talents': {t.talent_id: t.level for t in rows(Talent)},
+        'items': [
+            [i.item_template, i.rarity, i.quantity, slots.get(i.id), _time(i.acquired_at)]
+            for i in rows(Item)
+        ],
+        'construction': [
+            [j.building_type, j.from_level, j.target_level, _time(j.started_at), _time(j.completes_at)]
+            for j in rows(ConstructionJob)
+        ],
+        'training': [
+            [b.building_type, b.unit_type, b.race, b.count, b.trained, b.wave_size, b.seconds_per_wave,
+             _time(b.started_at), _time(b.completes_at)]
+            for b in rows(TrainingBatch)
+        ],
+    }
+    header['map'], columns = _pack_map(game_id)
+
+    head = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    body = struct.pack('<I', len(head)) + head + columns
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(body)
+
+
+def _pack_map(game_id: int) -> Tuple[Dict, bytes]:
+    tiles = {
+        (row[0], row[1]): row
+        for row in db.session.query(*TILE_COLUMNS).filter(MapTile.game_id == game_id)
+    }
+    config = db.session.get(MapConfig, game_id)
+    info: Dict = {'config': None, 'chunks': [], 'mode': 'coords'}
+
+    order: List[hex_grid.Hex] = []
+    if config is not None:
+        chunks = sorted(db.session.query(MapChunk.cq, MapChunk.cr).filter_by(game_id=game_id))
+        info['config'] = {'radius': config.radius, 'seed': config.seed, 'chunk_size': config.chunk_size}
+        info['chunks'] = [list(chunk) for chunk in chunks]
+        info['mode'] = 'seed'
+        order = [h for cq, cr in chunks for h in hex_grid.chunk_hexes(cq, cr, config.chunk_size, config.radius)]
+    elif tiles:
+        info['mode'] = 'hex'
+        info['radius'] = max(hex_grid.distance(q, r) for q, r in tiles)
+        order = list(hex_grid.map_hexes(info['radius']))
+
+    if len(order) != len(tiles) or any(h not in tiles for h in order):
+        info['mode'] = 'coords'
+        order = sorted(tiles)
+
+    rows = [tiles[h] for h in order]
+    info['tiles'] = len(rows)
+    info['terrains'], terrains = _indexed([row[2] for row in rows])
+    info['owners'], owners = _indexed([row[3] for row in rows])
+    info['enemies'], enemies = _indexed([row[4] for row in rows])
+
+    columns = []
+    if info['mode'] == 'coords':
+        columns.append(_pack([c for h in order for c in h], 'h'))
+    if info['mode'] != 'seed':
+        columns.append(_pack(terrains, 'B'))
+    columns.append(_pack(owners, 'B'))
+    columns.append(_pack(enemies, 'B'))
+    columns.append(_pack([row[5] or 0 for row in rows], 'H'))
+    columns.append(_pack_bits(row[6] for row in rows))
+    return info, b''.join(columns)
+
+
+# ==================== IMPORT ====================
+
+def decode_snapshot(blob: bytes) -> Tuple[Dict, List[Dict]]:
+    """The header and map tiles (without game_id) of a snapshot blob"""
+    if blob[:len(MAGIC)] != MAGIC:
+        raise SnapshotError('Not a game snapshot')
+    if blob[len(MAGIC):len(MAGIC) + 1] != bytes([FORMAT_VERSION]):
+        raise SnapshotError('Unsupported snapshot version')
+    try:
+        body = _decompress(blob[len(MAGIC) + 1:])
+        (head_length,) = struct.unpack_from('<I', body)
+        header = json.loads(body[4:4 + head_length].decode('utf-8'))
+        tiles = _unpack_map(header['map'], memoryview(body)[4 + head_length:])
+    except (zlib.error, struct.error, UnicodeDecodeError, ValueError, KeyError, IndexError, TypeError) as e:
+        raise SnapshotError(f'Corrupt snapshot: {e}') from e
+    return header, tiles
+
+
+def _decompress(data: bytes) -> bytes:
+    decompressor = zlib.decompressobj()
+    body = decompressor.decompress(data, MAX_SNAPSHOT_BYTES)
+    if decompressor.unconsumed_tail:
+        raise SnapshotError(f'Snapshot is larger than {MAX_SNAPSHOT_BYTES} bytes uncompressed')
+    if not decompressor.eof:
+        raise zlib.error('incomplete or truncated stream')
+    return body
+
+
+def _unpack_map(info: Dict, data: memoryview) -> List[Dict]:
+    count = info['tiles']
+    offset = 0
+
+    def take(code: str, n: int) -> Tuple:
+        nonlocal offset
+        values = struct.unpack_from(f'<{n}{code}', data, offset)
+        offset += struct.calcsize(f'<{n}{code}')
+        return values
+
+    mode = info['mode']
+    if mode == 'seed':
+        config = MapConfig(game_id=None, **info['config'])
+        tiles = [tile for cq, cr in info['chunks'] for tile in generate_chunk_tiles(config, cq, cr)]
+    else:
+        if mode == 'coords':
+            coords = take('h', 2 * count)
+            order = list(zip(coords[0::2], coords[1::2]))
+        elif mode == 'hex':
+            order = list(hex_grid.map_hexes(info['radius']))
+        else:
+            raise ValueError(f'unknown map mode {mode!r}')
+        terrains = take('B', count)
+        tiles = [{'q': q, 'r': r, 'terrain_type': info['terrains'][t]} for (q, r), t in zip(order, terrains)]
+    if len(tiles) != count:
+        raise ValueError('tile count does not match the map')
+
+    owners = take('B', count)
+    enemies = take('B', count)
+    strengths = take('H', count)
+    bits = bytes(data[offset:offset + (count + 7) // 8])
+    if len(bits) != (count + 7) // 8:
+        raise ValueError('explored bitset is truncated')
+
+    for i, tile in enumerate(tiles):
+        tile.pop('game_id', None)
+        tile['occupied_by'] = info['owners'][owners[i]]
+        tile['enemy_type'] = info['enemies'][enemies[i]]
+        tile['enemy_strength'] = strengths[i]
+        tile['explored'] = bool(bits[i >> 3] >> (i & 7) & 1)
+    return tiles
+
+
+def import_game(blob: bytes) -> SavedGame:
+    """Create a new game from a snapshot blob; the caller commits
+
+    Raises SnapshotError if the blob cannot be read.
+    """
+    header, tiles = decode_snapshot(blob)
+    try:
+        return _create_game(header, tiles)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise SnapshotError(f'Corrupt snapshot: {e}') from e
+
+
+def _create_game(header: Dict, tiles: List[Dict]) -> SavedGame:
+    hero = header['game']
+    game = SavedGame(
+        hero_name=hero['hero_name'],
+        hero_class=hero['hero_class'],
+        hero_race=hero['hero_race'],
+        level=hero['level'],
+        experience=hero['experience'],
+        # updated_at marks the last production accrual
+        updated_at=_parse_time(hero['updated_at']) or datetime.utcnow(),
+    )
+    db.session.add(game)
+    db.session.flush()
+    game_id = game.id
+
+    def bulk(model, rows: List[Dict]) -> None:
+        if rows:
+            db.session.execute(insert(model), [{'game_id': game_id, **row} for row in rows])
+
+    bulk(Resource, [
+        {'resource_type': resource_type, 'amount': amount}
+        for resource_type, amount in header['resources'].items()
+    ])
+    bulk(Building, [
+        {'building_type': t, 'level': level, 'built_at': _parse_time(built_at)}
+        for t, level, built_at in header['buildings']
+    ])
+    bulk(Unit, [
+        {'unit_type': t, 'race': race, 'count': count, 'hired_at': _parse_time(hired_at)}
+        for t, race, count, hired_at in header['units']
+    ])
+    bulk(Talent, [{'talent_id': talent_id, 'level': level} for talent_id, level in header['talents'].items()])
+    bulk(ConstructionJob, [
+        {'building_type': t, 'from_level': from_level, 'target_level': target_level,
+         'started_at': _parse_time(started_at), 'completes_at': _parse_time(completes_at)}
+        for t, from_level, target_level, started_at, completes_at in header['construction']
+    ])
+    bulk(TrainingBatch, [
+        {'building_type': building_type, 'unit_type': unit_type, 'race': race, 'count': count,
+         'trained': trained, 'wave_size': wave_size, 'seconds_per_wave': seconds_per_wave,
+         'started_at': _parse_time(started_at), 'completes_at': _parse_time(completes_at)}
+        for (building_type, unit_type, race, count, trained, wave_size, seconds_per_wave,
+             started_at, completes_at) in header['training']
+    ])
+
+    # One INSERT, returning the ids the equipped items' slots point at
+    items = header['items']
+    if items:
+        ids = db.session.execute(
+            insert(Item).returning(Item.id, sort_by_parameter_order=True),
+            [
+                {'game_id': game_id, 'item_template': template, 'rarity': rarity, 'quantity': quantity,
+                 'acquired_at': _parse_time(acquired_at)}
+                for template, rarity, quantity, _, acquired_at in items
+            ],
+        ).scalars().all()
+        bulk(EquipmentSlot, [
+            {'slot': slot, 'item_id': item_id}
+            for item_id, (_, _, _, slot, _) in zip(ids, items) if slot is not None
+        ])
+
+    info = header['map']
+    if info.get('config'):
+        db.session.add(MapConfig(game_id=game_id, **info['config']))
+        bulk(MapChunk, [{'cq': cq, 'cr': cr} for cq, cr in info['chunks']])
+    for start in range(0, len(tiles), TILE_BATCH_SIZE):
+        bulk(MapTile, tiles[start:start + TILE_BATCH_SIZE])
+
+    db.session.flush()
+    return game
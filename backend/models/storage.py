@@ -0,0 +1,55 @@
+"""Resource storage limits
+
+Every resource can be stored up to BASE_STORAGE_CAPACITY plus the
+storage_per_level of each warehouse level. Production stops at that
+limit, but amounts from other sources (loot, manual changes) may go
+over it.
+
+Between two building changes a resource grows linearly, so the moment
+it fills up is closed-form: (capacity - amount) / rate. The production
+sweep in routes/game.py uses `produce` for every interval, which is
+exact however long the interval is.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from .db import BUILDINGS, BASE_STORAGE_CAPACITY, RESOURCES
+from .modifiers import Modifiers
+
+
+def storage_capacity(buildings: Iterable) -> float:
+    """Storage limit shared by every resource, given the town's buildings"""
+    return BASE_STORAGE_CAPACITY + sum(b.get_storage_capacity() for b in buildings)
+
+
+def storage_caps(buildings: Iterable) -> Dict[str, float]:
+    capacity = storage_capacity(buildings)
+    return {resource_type: capacity for resource_type in RESOURCES}
+
+
+def production_rates(buildings: Iterable, modifiers: Optional[Modifiers] = None) -> Dict[str, float]:
+    """Total production per second for each resource, with the game's production bonuses"""
+    rates: Dict[str, float] = {}
+    for building in buildings:
+        resource = BUILDINGS.get(building.building_type, {}).get('resource')
+        if resource:
+            rates[resource] = rates.get(resource, 0) + building.get_production_rate()
+    if modifiers is not None:
+        rates = {resource: rate * modifiers.production_multiplier(resource) for resource, rate in rates.items()}
+    return rates
+
+
+def seconds_until_full(amount: float, rate: float, capacity: float) -> Optional[float]:
+    """Seconds until production fills storage: 0 if already full, None if it never will"""
+    if amount >= capacity:
+        return 0.0
+    if rate <= 0:
+        return None
+    return (capacity - amount) / rate
+
+
+def produce(amount: float, rate: float, seconds: float, capacity: float) -> float:
+    """Amount after `seconds` of production at `rate`, stopping at `capacity`"""
+    if seconds <= 0 or rate <= 0 or amount >= capacity:
+        return amount
+    return min(capacity, amount + rate * seconds)
@@ -0,0 +1,47 @@
+"""Per-game talent summary rows
+
+Games created before talent_summaries existed have no row; the first read
+builds it from the Talent rows and the Academy building.
+"""
+
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+from .db import db, Building, Talent, TalentSummary
+
+
+def build_talent_summary(game_id: int) -> TalentSummary:
+    talents = Talent.query.filter_by(game_id=game_id).all()
+    has_academy = db.session.query(Building.id).filter_by(
+        game_id=game_id, building_type='academy'
+    ).first() is not None
+    return TalentSummary(
+        game_id=game_id,
+        points_used=sum(t.level * t.get_talent_info().get('cost_per_level', 1) for t in talents),
+        talents=json.dumps({t.talent_id: {'id': t.id, 'level': t.level} for t in talents if t.level > 0},
+                           sort_keys=True),
+        has_academy=has_academy,
+    )
+
+
+def load_talent_summary(game_id: int) -> TalentSummary:
+    """The game's summary row, created and committed on first use"""
+    summary = db.session.get(TalentSummary, game_id)
+    if summary is not None:
+        return summary
+
+    db.session.add(build_talent_summary(game_id))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request created it first
+        db.session.rollback()
+    return db.session.get(TalentSummary, game_id)
+
+
+def mark_academy_built(game_id: int) -> None:
+    """Record a newly finished Academy; the caller commits"""
+    summary = db.session.get(TalentSummary, game_id)
+    if summary is not None:
+        summary.has_academy = True
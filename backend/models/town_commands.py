@@ -0,0 +1,276 @@
+"""Batched town commands
+
+POST /api/game/<id>/commands applies an ordered list of town actions in
+one request. The game's resources, buildings and talents are
+loaded once into a TownState. Each command is checked and applied
+against that in-memory state, and everything is committed in a single
+transaction.
+
+Every handler checks all of its preconditions before it changes
+anything. A failed command therefore leaves the state as it found it,
+and the commands after it still run. Validation mirrors the single-action
+routes in routes/game.py and routes/academy.py, and so do the response
+bodies.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .construction import queue_construction
+from .db import (
+    db, Building, ConstructionJob, Resource, Talent, BUILDINGS, MAX_UPGRADE_LEVELS, RESOURCES, TALENT_TREE, UNITS,
+)
+from .hero_stats import bump_stats_version
+from .modifiers import get_modifiers
+from .talent_summary import load_talent_summary
+from .training import queue_training, recruitment_wave_size
+
+# Most commands accepted in one batch
+MAX_COMMANDS = 100
+
+
+class CommandError(Exception):
+    """A command that cannot be applied; leaves the town unchanged"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class TownState:
+    """A game's town loaded once for a batch of commands"""
+
+    def __init__(self, game):
+        self.game = game
+        self.resources: Dict[str, Resource] = {r.resource_type: r for r in game.resources}
+        self.buildings: Dict[str, Building] = {b.building_type: b for b in game.buildings}
+        self.talents: Dict[str, Talent] = {t.talent_id: t for t in game.talents}
+        self.talent_summary = load_talent_summary(game.id)
+        # Building type -> level once its queued construction finishes
+        self.queued_levels: Dict[str, int] = {}
+        for job in ConstructionJob.query.filter_by(game_id=game.id):
+            self.queued_levels[job.building_type] = max(self.queued_levels.get(job.building_type, 0), job.target_level)
+        # (event type, payload) to publish once the batch has committed
+        self.events: List[Tuple[str, Dict]] = []
+        # Whether talents changed, for the army summary
+        self.bonuses_changed = False
+        self.now = datetime.utcnow()
+
+    def building_by_id(self, building_id: int) -> Optional[Building]:
+        return next((b for b in self.buildings.values() if b.id == building_id), None)
+
+    def amount(self, resource_type: str) -> float:
+        resource = self.resources.get(resource_type)
+        return (resource.amount or 0) if resource else 0
+
+    def require(self, cost: Dict[str, float]) -> None:
+        for resource_type, required_amount in cost.items():
+            if self.amount(resource_type) < required_amount:
+                raise CommandError(f'Not enough {resource_type}')
+
+    def spend(self, cost: Dict[str, float]) -> None:
+        for resource_type, required_amount in cost.items():
+            self.resources[resource_type].amount -= required_amount
+
+    def talent_points_used(self) -> int:
+        return self.talent_summary.points_used
+
+
+# ==================== COMMAND HANDLERS ====================
+# Each handler takes (state, params) and returns (status, response body)
+
+def create_building(state: TownState, params: Dict) -> Tuple[int, Dict]:
+    building_type = params.get('building_type')
+    if not building_type or building_type not in BUILDINGS:
+        raise CommandError('Invalid building type')
+    if building_type in state.buildings or building_type in state.queued_levels:
+        raise CommandError(f'Town already has a {BUILDINGS[building_type]["name"]}')
+
+    cost = BUILDINGS[building_type].get('base_cost', {})
+    state.require(cost)
+    state.spend(cost)
+
+    job = queue_construction(state.game.id, building_type, 0, 1, state.now)
+    db.session.flush()  # assigns job.id for the response
+    state.queued_levels[building_type] = job.target_level
+
+    state.events.append(('resources_changed', {
+        'resources': {k: -v for k, v in cost.items()},
+    }))
+    return 201, {'message': 'Construction queued', 'construction': job.to_dict()}
+
+
+def parse_upgrade_levels(value) -> Optional[int]:
+    """Levels requested for an upgrade: 1 by default, None for 'max'"""
+    if value is None:
+        return 1
+    if isinstance(value, str) and value.lower() == 'max':
+        return None
+    try:
+        levels = int(value)
+    except (TypeError, ValueError):
+        raise CommandError("levels must be a number or 'max'")
+    if levels < 1 or levels > MAX_UPGRADE_LEVELS:
+        raise CommandError(f'levels must be between 1 and {MAX_UPGRADE_LEVELS}')
+    return levels
+
+
+def upgrade_building(state: TownState, params: Dict) -> Tuple[int, Dict]:
+    building = state.building_by_id(params.get('building_id'))
+    if not building:
+        raise CommandError('Building not found', 404)
+
+    levels = parse_upgrade_levels(params.get('levels'))
+    from_level = state.queued_levels.get(building.building_type, building.level)
+    if levels is None:
+        amounts = {k: state.amount(k) for k in building.get_build_cost()}
+        levels = building.get_max_affordable_levels(amounts, from_level=from_level) or 1
+
+    cost = building.get_upgrade_cost(levels, from_level)
+    state.require(cost)
+    state.spend(cost)
+    job = queue_construction(state.game.id, building.building_type, from_level, levels, state.now)
+    db.session.flush()
+    state.queued_levels[building.building_type] = job.target_level
+
+    state.events.append(('resources_changed', {
+        'resources': {k: -v for k, v in cost.items()},
+    }))
+    return 200, {
+        'message': 'Upgrade queued',
+        'building': building.to_dict(),
+        'construction': job.to_dict(),
+        'levels_gained': levels,
+        'cost': cost,
+    }
+
+
+def recruit_unit(state: TownState, params: Dict) -> Tuple[int, Dict]:
+    unit_type = params.get('unit_type')
+    race = params.get('race')
+    count = params.get('count', 1)
+
+    if not isinstance(count, int) or count <= 0:
+        raise CommandError('Invalid unit count')
+    if race not in UNITS or unit_type not in UNITS.get(race, {}):
+        raise CommandError('Invalid unit or race')
+    if 'barracks' not in state.buildings:
+        raise CommandError('No barracks in town')
+
+    unit_def = UNITS[race][unit_type]
+    cost = {k: v * count for k, v in unit_def.get('cost', {}).items()}
+    state.require(cost)
+    state.spend(cost)
+
+    batch = queue_training(state.game.id, race, unit_type, count,
+                           recruitment_wave_size(get_modifiers(state.game.id)), state.now)
+    db.session.flush()  # assigns batch.id for the response
+
+    state.events.append(('resources_changed', {
+        'resources': {k: -v for k, v in cost.items()},
+    }))
+    return 201, {'message': f'Queued {count} {unit_def.get("name")} for training', 'batch': batch.to_dict(state.now)}
+
+
+def update_resource(state: TownState, params: Dict) -> Tuple[int, Dict]:
+    resource_type = params.get('resource_type')
+    amount = params.get('amount')
+    if resource_type not in RESOURCES:
+        raise CommandError('Invalid resource type')
+    if not isinstance(amount, (int, float)):
+        raise CommandError('Missing amount field')
+
+    resource = state.resources.get(resource_type)
+    if not resource:
+        resource = Resource(game_id=state.game.id, resource_type=resource_type, amount=0)
+        db.session.add(resource)
+        state.resources[resource_type] = resource
+
+    previous_amount = resource.amount or 0
+    resource.amount = max(0, previous_amount + amount)
+
+    state.events.append(('resources_changed', {
+        'resources': {resource_type: resource.amount - previous_amount},
+    }))
+    return 200, resource.to_dict()
+
+
+def invest_talent(state: TownState, params: Dict) -> Tuple[int, Dict]:
+    talent_id = params.get('talent_id')
+    if 'academy' not in state.buildings:
+        raise CommandError('Academy not built. Build an Academy first!', 403)
+    if talent_id not in TALENT_TREE:
+        raise CommandError('Invalid talent')
+
+    talent_info = TALENT_TREE[talent_id]
+    talent = state.talents.get(talent_id)
+    if talent and talent.level >= talent_info['max_level']:
+        raise CommandError('Talent already at max level')
+
+    points_used = state.talent_points_used()
+    points_available = state.game.level * 2
+    cost = talent_info['cost_per_level']
+    if points_used + cost > points_available:
+        raise CommandError(f'Not enough talent points. Need {cost}, have {points_available - points_used}')
+
+    if not talent:
+        talent = Talent(game_id=state.game.id, talent_id=talent_id, level=0)
+        db.session.add(talent)
+        state.talents[talent_id] = talent
+    talent.level += 1
+    db.session.flush()
+    state.talent_summary.set_talent(talent)
+    bump_stats_version(state.game.id)
+    state.bonuses_changed = True
+
+    return 200, {
+        'message': f'Invested in {talent_info["name"]}',
+        'talent': talent.to_dict(),
+        'talent_points_remaining': points_available - points_used - cost,
+    }
+
+
+def refund_talent(state: TownState, params: Dict) -> Tuple[int, Dict]:
+    talent = state.talents.get(params.get('talent_id'))
+    if not talent or talent.level == 0:
+        raise CommandError('Talent not invested')
+
+    refund_cost = talent.get_talent_info().get('cost_per_level', 1) * 100
+    if state.amount('gold') < refund_cost:
+        raise CommandError(f'Not enough gold. Need {refund_cost} gold to refund')
+
+    state.spend({'gold': refund_cost})
+    talent.level -= 1
+    if talent.level == 0:
+        db.session.delete(talent)
+        del state.talents[talent.talent_id]
+    state.talent_summary.set_talent(talent)
+    bump_stats_version(state.game.id)
+    state.bonuses_changed = True
+
+    state.events.append(('resources_changed', {'resources': {'gold': -refund_cost}}))
+    return 200, {
+        'message': f'Refunded talent point for {refund_cost} gold',
+        'talent': talent.to_dict() if talent.level > 0 else None,
+    }
+
+
+COMMANDS: Dict[str, Callable[[TownState, Dict], Tuple[int, Dict]]] = {
+    'create_building': create_building,
+    'upgrade_building': upgrade_building,
+    'recruit_unit': recruit_unit,
+    'update_resource': update_resource,
+    'invest_talent': invest_talent,
+    'refund_talent': refund_talent,
+}
+
+
+def run_command(state: TownState, command: Dict) -> Tuple[int, Dict]:
+    """Apply one command, returning (status, body); errors become error bodies"""
+    handler = COMMANDS.get(command.get('type'))
+    if handler is None:
+        return 400, {'error': f'Unknown command type: {command.get("type")}'}
+    try:
+        return handler(state, command.get('params') or {})
+    except CommandError as e:
+        return e.status, {'error': str(e)}
@@ -0,0 +1,135 @@
+"""Recruitment queue with lazily completed training
+
+Recruiting pays the cost up front and queues a TrainingBatch in the
+building's queue (the barracks for every unit today). Batches in one
+queue train one after another, and each batch finishes its units in
+waves. The wave size is 1 plus the Rapid Recruitment talent's
+recruitment_speed bonus.
+
+Nothing runs on a timer. Like production, the number of finished units
+is a closed-form function of the elapsed time. Reads of the game call
+`complete_training`, which moves finished units into the army. Only
+batches that have started are loaded, so a long queue costs nothing
+until its batches come up.
+"""
+
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, func, literal_column, type_coerce
+
+from .army import bump_units_version, units_changed
+from .db import db, TrainingBatch, Unit, UNITS
+from .events import publish_game_event
+from .modifiers import Modifiers
+
+# Building whose queue trains units
+TRAINING_BUILDING = 'barracks'
+
+# Resource value of one unit trained per second
+TRAINING_COST_PER_SECOND = 10
+
+
+def training_seconds(race: str, unit_type: str) -> float:
+    """Seconds to train one wave of a unit type; dearer units take longer"""
+    cost = UNITS.get(race, {}).get(unit_type, {}).get('cost', {})
+    return max(1.0, sum(cost.values()) / TRAINING_COST_PER_SECOND)
+
+
+def recruitment_wave_size(modifiers: Modifiers) -> int:
+    """Units finished per wave: 1 plus the recruitment_speed bonus"""
+    return 1 + int(modifiers.recruitment_speed)
+
+
+def queue_training(game_id: int, race: str, unit_type: str, count: int, wave_size: int,
+                   now: datetime, building_type: str = TRAINING_BUILDING) -> TrainingBatch:
+    """Add a batch at the end of the building's queue; the caller commits"""
+    queue_end = db.session.query(func.max(TrainingBatch.completes_at)).filter(
+        TrainingBatch.game_id == game_id,
+        TrainingBatch.building_type == building_type,
+    ).scalar()
+    started_at = max(now, queue_end) if queue_end else now
+    seconds_per_wave = training_seconds(race, unit_type)
+    duration = math.ceil(count / wave_size) * seconds_per_wave
+
+    batch = TrainingBatch(
+        game_id=game_id, building_type=building_type, race=race, unit_type=unit_type,
+        count=count, trained=0, wave_size=wave_size, seconds_per_wave=seconds_per_wave,
+        started_at=started_at, completes_at=started_at + timedelta(seconds=duration),
+    )
+    db.session.add(batch)
+    return batch
+
+
+def collect_trained_units(game_id: int, now: datetime) -> List[Tuple[Unit, int]]:
+    """Move units finished by `now` into the army; the caller commits
+
+    Returns (unit stack, units added) pairs.
+    """
+    batches = TrainingBatch.query.filter(
+        TrainingBatch.game_id == game_id,
+        TrainingBatch.started_at <= now,
+    ).order_by(TrainingBatch.started_at).all()
+    if not batches:
+        return []
+
+    units = {(u.race, u.unit_type): u for u in Unit.query.filter_by(game_id=game_id)}
+    added: Dict[Tuple[str, str], int] = {}
+    for batch in batches:
+        done = batch.trained_by(now)
+        delta = done - (batch.trained or 0)
+        if delta <= 0:
+            continue
+
+        key = (batch.race, batch.unit_type)
+        unit = units.get(key)
+        if unit:
+            unit.count += delta
+        else:
+            unit = Unit(game_id=game_id, unit_type=batch.unit_type, race=batch.race, count=delta)
+            db.session.add(unit)
+            units[key] = unit
+        added[key] = added.get(key, 0) + delta
+
+        if done >= batch.count:
+            db.session.delete(batch)
+        else:
+            batch.trained = done
+
+    return [(units[key], delta) for key, delta in added.items()]
+
+
+def next_training_wave(game_id: int) -> Optional[datetime]:
+    """When the game's next wave of units finishes, or None if nothing is queued
+
+    Computed in SQL (see TrainingBatch.next_wave_at), so the town stream
+    does not load the queue on every pass.
+    """
+    waves_done = func.coalesce(TrainingBatch.trained, 0) // TrainingBatch.wave_size
+    seconds = (waves_done + 1) * TrainingBatch.seconds_per_wave
+    return db.session.query(func.min(_plus_seconds(TrainingBatch.started_at, seconds))).filter(
+        TrainingBatch.game_id == game_id,
+    ).scalar()
+
+
+def _plus_seconds(timestamp, seconds):
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite stores timestamps as text with microseconds; strftime's %f
+        # has milliseconds, padded back so the result parses the same way
+        shifted = func.strftime('%Y-%m-%d %H:%M:%f', timestamp, func.printf('%+.3f seconds', seconds))
+        return type_coerce(shifted.op('||')('000'), DateTime)
+    return timestamp + seconds * literal_column("interval '1 second'")
+
+
+def complete_training(game_id: int, now: Optional[datetime] = None) -> None:
+    """Resolve finished training for a game that is being read"""
+    changes = collect_trained_units(game_id, now or datetime.utcnow())
+    if not changes:
+        return
+
+    version = bump_units_version(game_id)
+    db.session.commit()
+    units_changed(game_id, [(unit.race, unit.unit_type, delta) for unit, delta in changes], version)
+    for unit, delta in changes:
+        publish_game_event(game_id, 'units_recruited', unit=unit.to_dict())
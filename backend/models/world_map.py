@@ -3,6 +3,8 @@
 import random
 from typing import List, Dict, Tuple
 
+from . import hex_grid
+
 # ==================== TERRAIN TRAITS ====================
 
 TERRAIN_TRAITS = {
@@ -332,6 +334,72 @@ ENEMY_TYPES = {
     },
 }
 
+# ==================== MAP SIZE LIMITS ====================
+
+# Largest radius a client may request (~270k tiles)
+MAX_MAP_RADIUS = 300
+
+# Maps up to this radius are generated in full; larger maps are split
+# into chunks that are generated on first access
+EAGER_MAP_RADIUS = 20
+
+# Chunk edge length in hexes (chunks are CHUNK_SIZE x CHUNK_SIZE)
+CHUNK_SIZE = 16
+
+
+def roll_tile_contents(q: int, r: int, rng=random) -> Dict:
+    """Roll ownership, visibility and enemy for a freshly generated tile
+
+    rng can be the random module or a seeded random.Random instance.
+    """
+    # Center tile is player's town
+    if q == 0 and r == 0:
+        return {
+            'occupied_by': 'player',
+            'explored': True,
+            'enemy_type': None,
+            'enemy_strength': 0,
+        }
+    
+    # All other tiles are neutral with enemies
+    # Adjacent tiles to center are initially explored (visible)
+    distance = hex_grid.distance(q, r)
+    
+    # Progressive difficulty: enemies get stronger with distance
+    # Distance 1-2: Strength 1-2 (easy)
+    # Distance 3-4: Strength 2-3 (medium)
+    # Distance 5-6: Strength 3-4 (hard)
+    # Distance 7+: Strength 4-5+ (very hard)
+    base_strength = max(1, distance // 2)
+    enemy_strength = base_strength + rng.randint(0, min(2, distance // 3))
+    enemy_strength = min(enemy_strength, 10)  # Cap at 10
+    
+    # Select enemy type based on strength
+    if enemy_strength >= 8:
+        enemy_type = rng.choice(['dragon', 'demon_lord', 'ancient_lich'])
+    elif enemy_strength >= 6:
+        enemy_type = rng.choice(['vampire', 'giant', 'demon_lord', 'dragon'])
+    elif enemy_strength >= 4:
+        enemy_type = rng.choice(['troll', 'orc_warlord', 'vampire', 'giant'])
+    elif enemy_strength >= 2:
+        enemy_type = rng.choice(['wolf_pack', 'bandit', 'troll', 'orc_warlord'])
+    else:
+        enemy_type = rng.choice(['goblin', 'wolf_pack', 'bandit'])
+    
+    return {
+        'occupied_by': 'neutral',
+        'explored': distance == 1,  # Only adjacent tiles are visible at start
+        'enemy_type': enemy_type,
+        'enemy_strength': enemy_strength,
+    }
+
+
+def get_enemy_power(enemy_type: str, enemy_strength: int) -> int:
+    """Combat power of an enemy of the given type and strength"""
+    enemy_info = ENEMY_TYPES.get(enemy_type, {})
+    return enemy_info.get('base_power', 0) + (enemy_strength or 0) * enemy_info.get('power_per_level', 0)
+
+
 # Trait distribution weights (higher = more common)
 TERRAIN_WEIGHTS = {
     'plains': 20,
@@ -367,6 +435,13 @@ TERRAIN_WEIGHTS = {
 }
 
 
+def random_terrain(rng=random) -> str:
+    """Select random terrain type based on weights"""
+    terrain_types = list(TERRAIN_WEIGHTS.keys())
+    weights = list(TERRAIN_WEIGHTS.values())
+    return rng.choices(terrain_types, weights=weights, k=1)[0]
+
+
 class HexTile:
     """Represents a single hexagon tile on the world map"""
     
@@ -433,24 +508,18 @@ class WorldMap:
         tiles_generated = 0
         
         # Generate hexagonal grid using axial coordinates
-        for q in range(-self.radius, self.radius + 1):
-            r1 = max(-self.radius, -q - self.radius)
-            r2 = min(self.radius, -q + self.radius)
-            
-            for r in range(r1, r2 + 1):
-                # Randomly select terrain based on weights
-                terrain_type = self._random_terrain()
-                tile = HexTile(q, r, terrain_type)
-                self.tiles[(q, r)] = tile
-                tiles_generated += 1
+        for q, r in hex_grid.map_hexes(self.radius):
+            # Randomly select terrain based on weights
+            terrain_type = self._random_terrain()
+            tile = HexTile(q, r, terrain_type)
+            self.tiles[(q, r)] = tile
+            tiles_generated += 1
         
         print(f"Generated {tiles_generated} hex tiles")
         
     def _random_terrain(self) -> str:
         """Select random terrain type based on weights"""
-        terrain_types = list(TERRAIN_WEIGHTS.keys())
-        weights = list(TERRAIN_WEIGHTS.values())
-        return random.choices(terrain_types, weights=weights, k=1)[0]
+        return random_terrain()
     
     def get_tile(self, q: int, r: int) -> HexTile:
         """Get tile at coordinates"""
@@ -458,19 +527,7 @@ class WorldMap:
     
     def get_neighbors(self, q: int, r: int) -> List[HexTile]:
         """Get all neighboring tiles"""
-        # Axial coordinate neighbors
-        directions = [
-            (1, 0), (1, -1), (0, -1),
-            (-1, 0), (-1, 1), (0, 1)
-        ]
-        
-        neighbors = []
-        for dq, dr in directions:
-            neighbor = self.get_tile(q + dq, r + dr)
-            if neighbor:
-                neighbors.append(neighbor)
-                
-        return neighbors
+        return [self.tiles[coords] for coords in hex_grid.neighbors(q, r, self.radius)]
     
     def to_dict(self) -> Dict:
         """Convert entire map to dictionary for API"""
@@ -484,14 +541,7 @@ class WorldMap:
     
     def get_tiles_in_range(self, center_q: int, center_r: int, range_radius: int) -> List[HexTile]:
         """Get all tiles within a certain range of a center tile"""
-        tiles_in_range = []
-        
-        for q in range(center_q - range_radius, center_q + range_radius + 1):
-            for r in range(center_r - range_radius, center_r + range_radius + 1):
-                # Check if within hexagonal distance
-                if abs(q - center_q) + abs(r - center_r) + abs((-q - r) - (-center_q - center_r)) <= range_radius * 2:
-                    tile = self.get_tile(q, r)
-                    if tile:
-                        tiles_in_range.append(tile)
-                        
-        return tiles_in_range
+        return [
+            self.tiles[coords]
+            for coords in hex_grid.hexes_in_range(center_q, center_r, range_radius, self.radius)
+        ]
@@ -1,37 +1,66 @@
 """Academy and talent system endpoints"""
 
+from datetime import datetime
+
 from flask import Blueprint, request, jsonify
-from models.db import db, SavedGame, Talent, Building, Resource, TALENT_TREE
+from sqlalchemy.orm.exc import StaleDataError
+from models.db import db, ConstructionJob, SavedGame, Talent, TalentSummary, Resource, BUILDINGS, ITEM_TEMPLATES, TALENT_TREE
+from models.army import bonuses_changed
+from models.hero_stats import bump_stats_version
+from models.modifiers import UNIT_BONUS_FIELDS, get_modifiers
+from models.talent_summary import load_talent_summary
+from routes.game import apply_production, publish_rates_changed
 
 academy_routes = Blueprint('academy', __name__)
 
 
+def get_summary_and_level(game_id):
+    """(TalentSummary, hero level) in one query, or (None, None) if the game does not exist
+
+    An Academy whose construction is due but not yet applied is resolved
+    first, so it counts as built.
+    """
+    row = db.session.query(TalentSummary, SavedGame.level).join(
+        SavedGame, SavedGame.id == TalentSummary.game_id
+    ).filter(TalentSummary.game_id == game_id).first()
+    if row is not None and (row[0].has_academy or not academy_due(game_id)):
+        return row
+    
+    game = SavedGame.query.get(game_id)
+    if not game:
+        return None, None
+    if academy_due(game_id):
+        apply_production(game)
+    return load_talent_summary(game_id), game.level
+
+
+def academy_due(game_id):
+    return db.session.query(ConstructionJob.id).filter(
+        ConstructionJob.game_id == game_id,
+        ConstructionJob.building_type == 'academy',
+        ConstructionJob.from_level == 0,
+        ConstructionJob.completes_at <= datetime.utcnow(),
+    ).first() is not None
+
+
 @academy_routes.route('/<int:game_id>/talents', methods=['GET'])
 def get_talents(game_id):
     """Get all talents for a game"""
     try:
-        game = SavedGame.query.get(game_id)
-        if not game:
+        summary, hero_level = get_summary_and_level(game_id)
+        if summary is None:
             return jsonify({'error': 'Game not found'}), 404
         
         # Check if Academy is built
-        academy = Building.query.filter_by(
-            game_id=game_id,
-            building_type='academy'
-        ).first()
-        
-        if not academy:
+        if not summary.has_academy:
             return jsonify({'error': 'Academy not built'}), 403
         
-        # Get all invested talents
-        talents = Talent.query.filter_by(game_id=game_id).all()
-        
         # Calculate available talent points
-        talent_points_used = sum(t.level * t.get_talent_info().get('cost_per_level', 1) for t in talents)
-        talent_points_available = game.level * 2  # 2 points per level
+        talent_points_used = summary.points_used
+        talent_points_available = hero_level * 2  # 2 points per level
         
         return jsonify({
-            'talents': [t.to_dict() for t in talents],
+            'talents': summary.talent_dicts(),
             'available_talents': [
                 {
                     'talent_id': tid,
@@ -57,17 +86,12 @@ def get_talents(game_id):
 def invest_talent(game_id, talent_id):
     """Invest a talent point"""
     try:
-        game = SavedGame.query.get(game_id)
-        if not game:
+        summary, hero_level = get_summary_and_level(game_id)
+        if summary is None:
             return jsonify({'error': 'Game not found'}), 404
         
         # Check if Academy is built
-        academy = Building.query.filter_by(
-            game_id=game_id,
-            building_type='academy'
-        ).first()
-        
-        if not academy:
+        if not summary.has_academy:
             return jsonify({'error': 'Academy not built. Build an Academy first!'}), 403
         
         # Validate talent exists
@@ -76,23 +100,13 @@ def invest_talent(game_id, talent_id):
         
         talent_info = TALENT_TREE[talent_id]
         
-        # Get or create talent
-        talent = Talent.query.filter_by(game_id=game_id, talent_id=talent_id).first()
-        if not talent:
-            talent = Talent(game_id=game_id, talent_id=talent_id, level=0)
-            db.session.add(talent)
-        
         # Check if can level up
-        if talent.level >= talent_info['max_level']:
+        if summary.get_level(talent_id) >= talent_info['max_level']:
             return jsonify({'error': 'Talent already at max level'}), 400
         
         # Calculate talent points
-        all_talents = Talent.query.filter_by(game_id=game_id).all()
-        talent_points_used = sum(
-            t.level * t.get_talent_info().get('cost_per_level', 1) 
-            for t in all_talents
-        )
-        talent_points_available = game.level * 2
+        talent_points_used = summary.points_used
+        talent_points_available = hero_level * 2
         cost = talent_info['cost_per_level']
         
         if talent_points_used + cost > talent_points_available:
@@ -100,9 +114,21 @@ def invest_talent(game_id, talent_id):
                 'error': f'Not enough talent points. Need {cost}, have {talent_points_available - talent_points_used}'
             }), 400
         
-        # Invest talent point
+        # Get or create talent
+        talent = Talent.query.filter_by(game_id=game_id, talent_id=talent_id).first()
+        if not talent:
+            talent = Talent(game_id=game_id, talent_id=talent_id, level=0)
+            db.session.add(talent)
+        
+        # Invest talent point; the summary's version check rejects a
+        # concurrent invest that read the same points
         talent.level += 1
+        db.session.flush()
+        summary.set_talent(talent)
+        bump_stats_version(game_id)
         db.session.commit()
+        bonuses_changed(game_id)
+        publish_rates_changed(game_id)
         
         return jsonify({
             'message': f'Invested in {talent_info["name"]}',
@@ -110,6 +136,9 @@ def invest_talent(game_id, talent_id):
             'talent_points_remaining': talent_points_available - talent_points_used - cost,
         }), 200
         
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'Talents changed by another request, try again'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -123,6 +152,7 @@ def refund_talent(game_id, talent_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
+        summary = load_talent_summary(game_id)
         talent = Talent.query.filter_by(game_id=game_id, talent_id=talent_id).first()
         if not talent or talent.level == 0:
             return jsonify({'error': 'Talent not invested'}), 400
@@ -143,14 +173,21 @@ def refund_talent(game_id, talent_id):
         
         if talent.level == 0:
             db.session.delete(talent)
+        summary.set_talent(talent)
+        bump_stats_version(game_id)
         
         db.session.commit()
+        bonuses_changed(game_id)
+        publish_rates_changed(game_id, resources={'gold': -refund_cost})
         
         return jsonify({
             'message': f'Refunded talent point for {refund_cost} gold',
             'talent': talent.to_dict() if talent.level > 0 else None,
         }), 200
         
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'Talents changed by another request, try again'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -158,55 +195,42 @@ def refund_talent(game_id, talent_id):
 
 @academy_routes.route('/<int:game_id>/bonuses', methods=['GET'])
 def get_active_bonuses(game_id):
-    """Get all active bonuses from talents and special buildings"""
+    """Get all active bonuses from talents, special buildings and equipped items"""
     try:
         game = SavedGame.query.get(game_id)
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        bonuses = {
-            'resource_multipliers': {},
-            'unit_bonuses': {},
-            'special_effects': []
+        modifiers = get_modifiers(game_id)
+        unit_bonuses = {
+            key: getattr(modifiers, key) for key in UNIT_BONUS_FIELDS if getattr(modifiers, key)
         }
         
-        # Get talent bonuses
-        talents = Talent.query.filter_by(game_id=game_id).all()
-        for talent in talents:
-            current_bonus = talent.get_current_bonus()
-            for key, value in current_bonus.items():
-                if key.endswith('_multiplier'):
-                    resource = key.replace('_multiplier', '')
-                    bonuses['resource_multipliers'][resource] = bonuses['resource_multipliers'].get(resource, 0) + value
-                elif key.startswith('unit_'):
-                    bonuses['unit_bonuses'][key] = bonuses['unit_bonuses'].get(key, 0) + value
-                else:
-                    bonuses['special_effects'].append({
-                        'source': talent.get_talent_info()['name'],
-                        'effect': key,
-                        'value': value
-                    })
-        
-        # Get special building bonuses
-        from models.db import BUILDINGS
-        buildings = Building.query.filter_by(game_id=game_id).all()
-        for building in buildings:
-            building_info = BUILDINGS.get(building.building_type, {})
-            if 'bonus' in building_info:
-                for key, value in building_info['bonus'].items():
-                    if key.endswith('_multiplier'):
-                        resource = key.replace('_multiplier', '')
-                        bonuses['resource_multipliers'][resource] = bonuses['resource_multipliers'].get(resource, 0) + (value - 1)
-                    elif key.startswith('unit_'):
-                        bonuses['unit_bonuses'][key] = bonuses['unit_bonuses'].get(key, 0) + value
-                    else:
-                        bonuses['special_effects'].append({
-                            'source': building_info['name'],
-                            'effect': key,
-                            'value': value
-                        })
-        
-        return jsonify(bonuses), 200
+        # Everything that is not a production or unit bonus, by source
+        special_effects = []
+        for kind, source_id, target, value in modifiers.sources:
+            if target.startswith('production.') or target in UNIT_BONUS_FIELDS:
+                continue
+            special_effects.append({
+                'source': source_name(kind, source_id),
+                'effect': target,
+                'value': value
+            })
+        
+        return jsonify({
+            'resource_multipliers': {k: v for k, v in modifiers.production.items() if v},
+            'unit_bonuses': unit_bonuses,
+            'special_effects': special_effects
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def source_name(kind, source_id):
+    """Display name of a modifier source"""
+    if kind == 'talent':
+        return TALENT_TREE.get(source_id, {}).get('name', source_id)
+    if kind == 'building':
+        return BUILDINGS.get(source_id, {}).get('name', source_id)
+    return ITEM_TEMPLATES.get(source_id, {}).get('name', source_id)
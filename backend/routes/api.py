@@ -1,6 +1,9 @@
 """API routes for the game"""
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import text
+from models.db import db
+from config import pool_report
 from models.classes import CLASSES, ClassType
 from models.races import RACES, RaceType
 from models.hero import Hero
@@ -93,5 +96,22 @@ def create_hero():
 
 @api.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({"status": "ok"})
+    """Readiness check: the database answers and the worker is not shutting down"""
+    if current_app.config.get('DRAINING'):
+        return jsonify({"status": "draining"}), 503
+
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"status": "unavailable", "database": str(e)}), 503
+
+    return jsonify({"status": "ok", "database": "ok"})
+
+
+@api.route('/health/pool', methods=['GET'])
+def pool_status():
+    """Connection pool occupancy and checkout wait times for this worker"""
+    return jsonify({"engines": {
+        name or "default": pool_report(engine) for name, engine in db.engines.items()
+    }})
@@ -1,18 +1,54 @@
 """Game management endpoints (save, load, town status)"""
 
-from flask import Blueprint, request, jsonify
-from models.db import db, SavedGame, Resource, Building, Unit, MapTile, RESOURCES, BUILDINGS, UNITS
+import json
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from models.db import (
+    db, SavedGame, Resource, Building, Unit, MapTile, CommandResult, ConstructionJob, TrainingBatch, EquipmentSlot,
+    RESOURCES, BUILDINGS, UNITS, ITEM_RARITIES, ITEM_TYPES,
+)
 from models.world_map import WorldMap
 from datetime import datetime, timedelta
+from models.army import bonuses_changed, cached_army_summary, get_army_summary, invalidate_army_summary
+from models.construction import due_construction, queue_construction, queued_building_types, queued_level
+from models.equipment import equip, equipped_items, unequip
+from models.events import publish_game_event, subscribe_game_events
+from models.hero_stats import bump_stats_version, get_hero_stats
+from models.inventory import inventory_counts, item_page, restack, salvage_items, take_one
+from models.modifiers import get_modifiers, has_bonus
+from models.resource_buffer import resource_writes
+from models.saves import sync_game
+from models.snapshot import SnapshotError, export_game, import_game
+from models.talent_summary import mark_academy_built
+from models.storage import produce, production_rates, seconds_until_full, storage_caps
+from models.training import complete_training, next_training_wave, queue_training, recruitment_wave_size
+from models.town_commands import MAX_COMMANDS, CommandError, TownState, parse_upgrade_levels, run_command
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from routes.streaming import stream_json, stream_json_array, stream_query, stream_statement
 
 game_routes = Blueprint('game', __name__)
 
+# Seconds between SSE keep-alive comments on an idle town stream
+STREAM_KEEPALIVE_SECONDS = 15
+
+# Content type of exported game snapshots
+SNAPSHOT_MIMETYPE = 'application/vnd.carondor.snapshot'
+
+# How long idempotency keys of batched commands are remembered
+COMMAND_RESULT_TTL = timedelta(hours=24)
+
 
 # ==================== SAVE/LOAD ====================
 
 @game_routes.route('/save', methods=['POST'])
 def save_game():
-    """Save current game state"""
+    """Save current game state
+
+    With a game_id, the save is diffed against that game and only the
+    rows that changed are written; without one, a new game is created.
+    """
     try:
         data = request.get_json()
         
@@ -20,55 +56,43 @@ def save_game():
         if not all(k in data for k in ['hero_name', 'hero_class', 'hero_race', 'resources', 'buildings', 'units']):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Create or update saved game
-        game = SavedGame(
-            hero_name=data['hero_name'],
-            hero_class=data['hero_class'],
-            hero_race=data['hero_race'],
-            level=data.get('level', 1),
-            experience=data.get('experience', 0),
-        )
-        
-        # Add resources
-        for resource_type, amount in data['resources'].items():
-            if resource_type in RESOURCES:
-                resource = Resource(resource_type=resource_type, amount=amount)
-                game.resources.append(resource)
-        
-        # Add buildings
-        for building_data in data['buildings']:
-            building = Building(
-                building_type=building_data['type'],
-                level=building_data.get('level', 1)
-            )
-            game.buildings.append(building)
-        
-        # Add units
-        for unit_data in data['units']:
-            unit = Unit(
-                unit_type=unit_data['type'],
-                race=unit_data['race'],
-                count=unit_data.get('count', 0)
-            )
-            game.units.append(unit)
+        game_id = data.get('game_id')
+        if game_id is not None:
+            game = SavedGame.query.get(game_id)
+            if not game:
+                return jsonify({'error': 'Game not found'}), 404
+            
+            # Production up to now is credited before the save overwrites it
+            apply_production(game)
+            changes = sync_game(game, data)
+            db.session.commit()
+            if changes['buildings']:
+                bonuses_changed(game_id)
+            if changes['units']:
+                invalidate_army_summary(game_id)
+            # Amounts are overwritten, not changed by a delta, so stream
+            # clients re-anchor to a fresh snapshot
+            publish_game_event(game_id, 'snapshot', **town_snapshot(game))
+            
+            return jsonify({
+                'message': 'Game saved successfully',
+                'game_id': game.id,
+                'saved_at': game.updated_at.isoformat(),
+                'changes': changes,
+            }), 200
         
+        game = SavedGame(level=1, experience=0)
+        sync_game(game, data)
         db.session.add(game)
-        db.session.commit()
+        db.session.flush()
         
-        # Auto-generate world map for new game if it doesn't exist
-        existing_tiles = MapTile.query.filter_by(game_id=game.id).first()
-        if not existing_tiles:
-            world_map = WorldMap(radius=10)
-            for tile in world_map.tiles.values():
-                map_tile = MapTile(
-                    game_id=game.id,
-                    q=tile.q,
-                    r=tile.r,
-                    terrain_type=tile.terrain_type,
-                    explored=False
-                )
-                db.session.add(map_tile)
-            db.session.commit()
+        # Auto-generate world map for the new game
+        world_map = WorldMap(radius=10)
+        db.session.execute(insert(MapTile), [
+            {'game_id': game.id, 'q': tile.q, 'r': tile.r, 'terrain_type': tile.terrain_type, 'explored': False}
+            for tile in world_map.tiles.values()
+        ])
+        db.session.commit()
         
         return jsonify({
             'message': 'Game saved successfully',
@@ -89,9 +113,83 @@ def load_game(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        return jsonify(game.to_dict()), 200
+        complete_training(game_id)
+        apply_production(game)
+        return stream_game(game)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def stream_game(game):
+    """Stream a game in the to_dict() shape, fetching collections in batches"""
+    return stream_json(game.to_summary_dict(), {
+        key: (stream_statement(statement), lambda row: row.to_dict())
+        for key, statement in game.collection_statements().items()
+    })
+
+
+@game_routes.route('/<int:game_id>/export', methods=['GET'])
+def export_game_snapshot(game_id):
+    """Download a whole game as one binary snapshot (see models/snapshot.py)"""
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        complete_training(game_id)
+        apply_production(game)
+        return Response(
+            export_game(game_id),
+            mimetype=SNAPSHOT_MIMETYPE,
+            headers={'Content-Disposition': f'attachment; filename=carondor-game-{game_id}.crdn'},
+        )
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@game_routes.route('/import', methods=['POST'])
+def import_game_snapshot():
+    """Create a new game from a snapshot sent as the raw request body"""
+    try:
+        game = import_game(request.get_data())
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Game imported successfully',
+            'game_id': game.id,
+        }), 201
+    
+    except SnapshotError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@game_routes.route('/<int:game_id>/clone', methods=['POST'])
+def clone_game(game_id):
+    """Copy a game through a snapshot"""
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        complete_training(game_id)
+        apply_production(game)
+        clone = import_game(export_game(game_id))
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Game cloned successfully',
+            'game_id': clone.id,
+            'source_game_id': game_id,
+        }), 201
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
@@ -99,16 +197,8 @@ def load_game(game_id):
 def list_games():
     """List all saved games"""
     try:
-        games = SavedGame.query.order_by(SavedGame.updated_at.desc()).all()
-        return jsonify([{
-            'id': g.id,
-            'hero_name': g.hero_name,
-            'hero_class': g.hero_class,
-            'hero_race': g.hero_race,
-            'level': g.level,
-            'created_at': g.created_at.isoformat(),
-            'updated_at': g.updated_at.isoformat(),
-        } for g in games]), 200
+        games = stream_query(SavedGame.query.order_by(SavedGame.updated_at.desc()))
+        return stream_json_array(games, SavedGame.to_list_dict)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -124,49 +214,243 @@ def get_town_status(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        # Apply production since last update
+        # Apply production and finished training since last update
+        complete_training(game_id)
         apply_production(game)
         
-        return jsonify(game.to_dict()), 200
+        return stream_game(game)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-def apply_production(game: 'SavedGame') -> None:
-    """Apply production from buildings to resources based on elapsed time"""
-    from datetime import datetime
+@game_routes.route('/town/<int:game_id>/stream', methods=['GET'])
+def stream_town_events(game_id):
+    """Server-Sent Events stream of town changes
+
+    Sends one `snapshot` event with resource amounts, per-second
+    production rates, storage caps and the anchor timestamp they are
+    valid at. After that only deltas are pushed (building_created,
+    building_upgraded, units_recruited, resources_changed); clients
+    extrapolate resources locally as anchor amounts + rates * elapsed
+    seconds, stopping at the caps. Events that change the rates or caps
+    (construction, talents, equipment) carry the new ones. A save
+    overwrites the amounts, so it sends a fresh `snapshot` to re-anchor
+    to. A `resync` event means events were lost: the stream then ends and
+    the client should reload the town.
     
-    # Calculate elapsed time in seconds
-    now = datetime.utcnow()
-    elapsed_seconds = (now - game.updated_at).total_seconds()
+    Construction and training complete lazily, when the game is read, so
+    the stream wakes up when the next job or wave of units is due and
+    resolves it; the resulting events reach the client through the
+    subscription like any other.
+    """
+    subscription = None
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        # Subscribe before taking the snapshot so no event falls in between
+        subscription = subscribe_game_events(game_id)
+        apply_production(game)
+        snapshot = town_snapshot(game)
+    except Exception as e:
+        if subscription:
+            subscription.close()
+        return jsonify({'error': str(e)}), 500
+    
+    app = current_app._get_current_object()
+    
+    def generate():
+        # The response body is sent outside the request's app context
+        retry_at = None
+        try:
+            yield format_sse('snapshot', snapshot)
+            while True:
+                if subscription.overflowed:
+                    # Events were dropped; the client reconnects for a new snapshot
+                    yield format_sse('resync', {'type': 'resync'})
+                    return
+                with app.app_context():
+                    due = next_town_change(game_id)
+                now = datetime.utcnow()
+                if retry_at is not None and retry_at > now:
+                    due = max(due, retry_at) if due else None
+                timeout = STREAM_KEEPALIVE_SECONDS
+                if due is not None:
+                    timeout = min(timeout, max(0.0, (due - now).total_seconds()))
+                event = subscription.get(timeout=timeout)
+                if event is not None:
+                    yield format_sse(event['type'], event)
+                    continue
+                if due is not None and due <= datetime.utcnow():
+                    with app.app_context():
+                        try:
+                            resolve_town_changes(game_id)
+                            retry_at = None
+                        except Exception:
+                            # Another reader may have resolved it first; retry later
+                            app.logger.exception('Resolving town changes for the stream failed')
+                            retry_at = datetime.utcnow() + timedelta(seconds=STREAM_KEEPALIVE_SECONDS)
+                    continue
+                yield ': keep-alive\n\n'
+        finally:
+            subscription.close()
     
-    if elapsed_seconds <= 0:
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+    })
+
+
+def next_town_change(game_id):
+    """When the next queued construction job or training wave finishes, or None"""
+    construction = db.session.query(func.min(ConstructionJob.completes_at)).filter(
+        ConstructionJob.game_id == game_id,
+    ).scalar()
+    times = [t for t in (construction, next_training_wave(game_id)) if t is not None]
+    return min(times, default=None)
+
+
+def resolve_town_changes(game_id):
+    """Apply construction and training finished by now, publishing their events"""
+    game = SavedGame.query.get(game_id)
+    if game:
+        complete_training(game_id)
+        apply_production(game)
+
+
+def format_sse(event_type, data):
+    """Encode one Server-Sent Event"""
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+def get_production_rates_for(game: 'SavedGame') -> dict:
+    """Total production per second for each resource"""
+    return production_rates(game.buildings, get_modifiers(game.id))
+
+
+def get_storage_caps_for(game: 'SavedGame') -> dict:
+    """Storage limit of each resource"""
+    return storage_caps(game.buildings)
+
+
+def apply_production(game: 'SavedGame') -> None:
+    """Apply production and finished construction based on elapsed time"""
+    now = datetime.utcnow()
+    jobs = due_construction(game.id, now)
+    resources = {r.resource_type: r for r in game.resources}
+    created = accrue_production(game, game.buildings, resources, now, get_modifiers(game.id), jobs)
+    if created is None:
         return
     
-    # For each building, calculate production and add to resources
-    for building in game.buildings:
-        building_def = BUILDINGS.get(building.building_type, {})
-        resource_type = building_def.get('resource')
-        
-        if not resource_type:
+    for row in created:
+        db.session.add(row)
+    for job in jobs:
+        db.session.delete(job)
+        if job.building_type == 'academy' and job.from_level == 0:
+            mark_academy_built(game.id)
+    if any(has_bonus(job.building_type) for job in jobs if job.from_level == 0):
+        bump_stats_version(game.id)
+    db.session.commit()
+    
+    if jobs:
+        publish_construction_events(game, jobs)
+
+
+def town_snapshot(game):
+    """Resource amounts, rates and caps a town stream client anchors to"""
+    return {
+        'resources': {r.resource_type: r.amount for r in game.resources},
+        'rates': get_production_rates_for(game),
+        'caps': get_storage_caps_for(game),
+        'anchor': game.updated_at.isoformat(),
+    }
+
+
+def publish_rates_changed(game_id, **data):
+    """Send recomputed production rates and storage caps after a modifier changed"""
+    game = db.session.get(SavedGame, game_id)
+    if game is None:
+        return
+    publish_game_event(game_id, 'resources_changed', rates=get_production_rates_for(game),
+                       caps=get_storage_caps_for(game), **data)
+
+
+def publish_construction_events(game, jobs):
+    buildings = {b.building_type: b for b in game.buildings}
+    rates = get_production_rates_for(game)
+    caps = get_storage_caps_for(game)
+    for job in jobs:
+        building = buildings.get(job.building_type)
+        if building is None:
             continue
+        event_type = 'building_created' if job.from_level == 0 else 'building_upgraded'
+        publish_game_event(game.id, event_type, building=building.to_dict(), rates=rates, caps=caps)
+    if any(has_bonus(job.building_type) for job in jobs if job.from_level == 0):
+        bonuses_changed(game.id)
+
+
+def accrue_production(game, buildings, resources, now, modifiers, completions=()):
+    """Credit production since game.updated_at to `resources` (type -> Resource)
+
+    `modifiers` are the game's compiled modifiers for `buildings`; a
+    special building finished during the sweep adds its bonus from its
+    completion time on.
+
+    `completions` are the construction jobs finished by `now`, in
+    completion order. Production is integrated piecewise over the
+    intervals between them and each job's level change is applied at its
+    completion time, so the cost is O(jobs) however long the game was
+    left alone. Within an interval rates and storage limits are constant,
+    so each resource stops exactly where it fills up (see models/storage).
+
+    Does no I/O so the sync routes and the async ASGI handlers can share
+    it. Returns the rows that had to be created (Resource, and Building
+    for finished construction), or None if nothing changed.
+    """
+    start = game.updated_at
+    if (now - start).total_seconds() <= 0 and not completions:
+        return None
+    
+    buildings = {b.building_type: b for b in buildings}
+    created = []
+    
+    def credit(seconds):
+        if seconds <= 0:
+            return
+        caps = storage_caps(buildings.values())
+        for resource_type, rate in production_rates(buildings.values(), modifiers).items():
+            # Find or create resource
+            resource = resources.get(resource_type)
+            if not resource:
+                resource = Resource(game_id=game.id, resource_type=resource_type, amount=0)
+                resources[resource_type] = resource
+                created.append(resource)
+            
+            resource.amount = produce(resource.amount or 0, rate, seconds, caps[resource_type])
+    
+    # Sweep the completions in time order, crediting each interval at the
+    # levels that held during it
+    for job in completions:
+        completed_at = min(max(job.completes_at, start), now)
+        credit((completed_at - start).total_seconds())
+        start = completed_at
         
-        # Calculate production: base_rate * level * elapsed_seconds
-        production_rate = building_def.get('production_per_second', 0)
-        total_production = production_rate * building.level * elapsed_seconds
-        
-        # Find or create resource
-        resource = Resource.query.filter_by(game_id=game.id, resource_type=resource_type).first()
-        if not resource:
-            resource = Resource(game_id=game.id, resource_type=resource_type, amount=0)
-            db.session.add(resource)
-        
-        resource.amount += total_production
+        building = buildings.get(job.building_type)
+        if building is None:
+            building = Building(game_id=game.id, building_type=job.building_type,
+                                level=job.target_level, built_at=job.completes_at)
+            buildings[job.building_type] = building
+            created.append(building)
+            modifiers = modifiers.with_building(job.building_type)
+        else:
+            building.level = max(building.level, job.target_level)
+    credit((now - start).total_seconds())
     
     # Update game timestamp
     game.updated_at = now
-    db.session.commit()
+    return created
 
 
 # ==================== RESOURCE MANAGEMENT ====================
@@ -195,7 +479,13 @@ def get_resource(game_id, resource_type):
 
 @game_routes.route('/resource/<int:game_id>/<resource_type>', methods=['POST'])
 def update_resource(game_id, resource_type):
-    """Add or remove resource"""
+    """Add or remove resource
+
+    The returned amount is the stored amount plus the change; production
+    since the game was last read is not included. Clients that show live
+    amounts add the change to their extrapolated value instead (the town
+    stream sends it as a resources_changed delta).
+    """
     try:
         if resource_type not in RESOURCES:
             return jsonify({'error': 'Invalid resource type'}), 400
@@ -208,15 +498,16 @@ def update_resource(game_id, resource_type):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        resource = Resource.query.filter_by(game_id=game_id, resource_type=resource_type).first()
-        if not resource:
-            resource = Resource(game_id=game_id, resource_type=resource_type)
-            db.session.add(resource)
+        # Buffered and written together with the game's other changes
+        # from the next RESOURCE_WRITE_WINDOW_MS
+        amount, applied = resource_writes.add(game_id, resource_type, data['amount'])
+        publish_game_event(game_id, 'resources_changed', resources={resource_type: applied})
         
-        resource.amount = max(0, resource.amount + data['amount'])
-        db.session.commit()
-        
-        return jsonify(resource.to_dict()), 200
+        return jsonify({
+            'type': resource_type,
+            'amount': amount,
+            'name': RESOURCES[resource_type]
+        }), 200
     
     except Exception as e:
         db.session.rollback()
@@ -231,17 +522,23 @@ def get_production_rates(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        production = {}
-        for building in game.buildings:
-            building_def = BUILDINGS.get(building.building_type, {})
-            resource = building_def.get('resource')
-            if resource:
-                rate = building.get_production_rate()
-                production[resource] = production.get(resource, 0) + rate
+        apply_production(game)
+        rates = get_production_rates_for(game)
+        caps = get_storage_caps_for(game)
+        amounts = {r.resource_type: r.amount or 0 for r in game.resources}
+        
+        # When each produced resource will hit its storage limit
+        full_at = {}
+        for resource_type, rate in rates.items():
+            seconds = seconds_until_full(amounts.get(resource_type, 0), rate, caps[resource_type])
+            if seconds is not None:
+                full_at[resource_type] = (game.updated_at + timedelta(seconds=seconds)).isoformat()
         
         return jsonify({
-            'production_rates': production,  # resources per second
-            'calculated_at': datetime.utcnow().isoformat()
+            'production_rates': rates,  # resources per second
+            'storage_caps': caps,
+            'full_at': full_at,
+            'calculated_at': game.updated_at.isoformat()
         }), 200
     
     except Exception as e:
@@ -258,6 +555,7 @@ def get_buildings(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
+        apply_production(game)
         return jsonify([b.to_dict() for b in game.buildings]), 200
     
     except Exception as e:
@@ -266,7 +564,7 @@ def get_buildings(game_id):
 
 @game_routes.route('/building/<int:game_id>', methods=['POST'])
 def create_building(game_id):
-    """Create new building in town"""
+    """Queue construction of a new building in town"""
     try:
         data = request.get_json()
         building_type = data.get('building_type')
@@ -278,9 +576,12 @@ def create_building(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        # Check if this building type already exists (only one per town)
+        # Finish construction and credit production before checking
+        apply_production(game)
+        
+        # Check if this building type already exists or is being built (only one per town)
         existing = Building.query.filter_by(game_id=game_id, building_type=building_type).first()
-        if existing:
+        if existing or building_type in queued_building_types(game_id):
             return jsonify({'error': f'Town already has a {BUILDINGS[building_type]["name"]}'}), 400
         
         # Check if player has enough resources
@@ -297,14 +598,15 @@ def create_building(game_id):
             resource = Resource.query.filter_by(game_id=game_id, resource_type=resource_type).first()
             resource.amount -= required_amount
         
-        # Create building
-        building = Building(game_id=game_id, building_type=building_type, level=1)
-        db.session.add(building)
+        # Queue construction; the building appears when it completes
+        job = queue_construction(game_id, building_type, 0, 1, datetime.utcnow())
         db.session.commit()
+        publish_game_event(game_id, 'resources_changed',
+                           resources={k: -v for k, v in required_cost.items()})
         
         return jsonify({
-            'message': 'Building created',
-            'building': building.to_dict()
+            'message': 'Construction queued',
+            'construction': job.to_dict()
         }), 201
     
     except Exception as e:
@@ -314,33 +616,56 @@ def create_building(game_id):
 
 @game_routes.route('/building/<int:building_id>/upgrade', methods=['POST'])
 def upgrade_building(building_id):
-    """Upgrade building to next level"""
+    """Queue an upgrade by ?levels=N levels (default 1), or as many as affordable with ?levels=max"""
     try:
         building = Building.query.get(building_id)
         if not building:
             return jsonify({'error': 'Building not found'}), 404
         
+        try:
+            levels = parse_upgrade_levels(request.args.get('levels'))
+        except CommandError as e:
+            return jsonify({'error': str(e)}), e.status
+        
         game = building.game
-        next_level_cost = building.get_build_cost()
+        apply_production(game)
+        
+        # Upgrades already queued for this building come first
+        from_level = queued_level(game.id, building.building_type) or building.level
+        next_level_cost = building.get_upgrade_cost(1, from_level)
+        resources = {
+            r.resource_type: r for r in Resource.query.filter(
+                Resource.game_id == game.id,
+                Resource.resource_type.in_(list(next_level_cost)),
+            )
+        }
+        amounts = {k: r.amount or 0 for k, r in resources.items()}
+        
+        if levels is None:
+            # Binary search over the closed-form total; at least one level,
+            # so a shortfall is reported like a single upgrade
+            levels = building.get_max_affordable_levels(amounts, from_level=from_level) or 1
+        total_cost = building.get_upgrade_cost(levels, from_level)
         
         # Check if player has enough resources
-        for resource_type, required_amount in next_level_cost.items():
-            resource = Resource.query.filter_by(game_id=game.id, resource_type=resource_type).first()
-            if not resource or resource.amount < required_amount:
+        for resource_type, required_amount in total_cost.items():
+            if amounts.get(resource_type, 0) < required_amount:
                 return jsonify({'error': f'Not enough {resource_type}'}), 400
         
-        # Deduct resources
-        for resource_type, required_amount in next_level_cost.items():
-            resource = Resource.query.filter_by(game_id=game.id, resource_type=resource_type).first()
-            resource.amount -= required_amount
-        
-        # Upgrade building
-        building.level += 1
+        # Deduct resources and queue the upgrade in one transaction
+        for resource_type, required_amount in total_cost.items():
+            resources[resource_type].amount -= required_amount
+        job = queue_construction(game.id, building.building_type, from_level, levels, datetime.utcnow())
         db.session.commit()
+        publish_game_event(game.id, 'resources_changed',
+                           resources={k: -v for k, v in total_cost.items()})
         
         return jsonify({
-            'message': 'Building upgraded',
-            'building': building.to_dict()
+            'message': 'Upgrade queued',
+            'building': building.to_dict(),
+            'construction': job.to_dict(),
+            'levels_gained': levels,
+            'cost': total_cost
         }), 200
     
     except Exception as e:
@@ -348,6 +673,22 @@ def upgrade_building(building_id):
         return jsonify({'error': str(e)}), 500
 
 
+@game_routes.route('/building/<int:game_id>/queue', methods=['GET'])
+def get_construction_queue(game_id):
+    """Construction and upgrades still in progress, in completion order"""
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        apply_production(game)
+        jobs = ConstructionJob.query.filter_by(game_id=game_id).order_by(ConstructionJob.completes_at)
+        return stream_json_array(stream_query(jobs), ConstructionJob.to_dict)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== UNIT MANAGEMENT ====================
 
 @game_routes.route('/unit/<int:game_id>', methods=['GET'])
@@ -358,12 +699,30 @@ def get_units(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
+        complete_training(game_id)
         return jsonify([u.to_dict() for u in game.units]), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@game_routes.route('/unit/<int:game_id>/summary', methods=['GET'])
+def get_army_summary_route(game_id):
+    """Army totals after bonuses: power per race and unit type, stat totals and upkeep"""
+    try:
+        if cached_army_summary(game_id) is None:
+            if not db.session.query(SavedGame.id).filter_by(id=game_id).first():
+                return jsonify({'error': 'Game not found'}), 404
+        
+        complete_training(game_id)
+        summary = get_army_summary(game_id)
+        
+        return jsonify(summary.to_dict()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @game_routes.route('/unit/<int:game_id>/recruit', methods=['POST'])
 def recruit_unit(game_id):
     """Recruit new units"""
@@ -383,6 +742,9 @@ def recruit_unit(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
+        # A barracks whose construction is due counts as built
+        apply_production(game)
+        
         # Check if barracks exists
         barracks = Building.query.filter_by(game_id=game_id, building_type='barracks').first()
         if not barracks:
@@ -404,19 +766,17 @@ def recruit_unit(game_id):
             resource = Resource.query.filter_by(game_id=game_id, resource_type=resource_type).first()
             resource.amount -= required_amount
         
-        # Add or update units
-        unit = Unit.query.filter_by(game_id=game_id, unit_type=unit_type, race=race).first()
-        if unit:
-            unit.count += count
-        else:
-            unit = Unit(game_id=game_id, unit_type=unit_type, race=race, count=count)
-            db.session.add(unit)
+        # Queue the units; they join the army as their training finishes
+        batch = queue_training(game_id, race, unit_type, count,
+                               recruitment_wave_size(get_modifiers(game_id)), datetime.utcnow())
         
         db.session.commit()
+        publish_game_event(game_id, 'resources_changed',
+                           resources={k: -v for k, v in total_cost.items()})
         
         return jsonify({
-            'message': f'Recruited {count} {unit_def.get("name")}',
-            'unit': unit.to_dict()
+            'message': f'Queued {count} {unit_def.get("name")} for training',
+            'batch': batch.to_dict()
         }), 201
     
     except Exception as e:
@@ -424,6 +784,124 @@ def recruit_unit(game_id):
         return jsonify({'error': str(e)}), 500
 
 
+@game_routes.route('/unit/<int:game_id>/queue', methods=['GET'])
+def get_training_queue(game_id):
+    """Units still in training, in queue order"""
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        complete_training(game_id)
+        now = datetime.utcnow()
+        batches = stream_query(TrainingBatch.query.filter_by(game_id=game_id).order_by(TrainingBatch.started_at))
+        return stream_json_array(batches, lambda batch: batch.to_dict(now))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ==================== BATCHED COMMANDS ====================
+
+@game_routes.route('/<int:game_id>/commands', methods=['POST'])
+def run_commands(game_id):
+    """Apply an ordered batch of town commands in one transaction
+
+    Body: {"commands": [{"type", "params", "idempotency_key"?}, ...], "atomic"?: bool}
+
+    A command whose idempotency_key was already used for this game is not
+    run again; its stored result is returned with "replayed": true. With
+    "atomic" any failed command rolls back the whole batch.
+    """
+    try:
+        data = request.get_json() or {}
+        commands = data.get('commands')
+        if not isinstance(commands, list) or not commands:
+            return jsonify({'error': 'Missing commands'}), 400
+        if len(commands) > MAX_COMMANDS:
+            return jsonify({'error': f'At most {MAX_COMMANDS} commands per batch'}), 400
+        if not all(isinstance(c, dict) for c in commands):
+            return jsonify({'error': 'Each command must be an object'}), 400
+        
+        keys = [c['idempotency_key'] for c in commands if c.get('idempotency_key')]
+        if len(set(keys)) != len(keys):
+            return jsonify({'error': 'Duplicate idempotency key in batch'}), 400
+        
+        try:
+            return apply_command_batch(game_id, commands, keys, data.get('atomic', False))
+        except (IntegrityError, StaleDataError):
+            # A concurrent request with one of these keys, or one that
+            # changed talents, committed first; running the batch again
+            # replays its results or re-checks the talent points
+            db.session.rollback()
+            return apply_command_batch(game_id, commands, keys, data.get('atomic', False))
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+def apply_command_batch(game_id, commands, keys, atomic):
+    game = SavedGame.query.get(game_id)
+    if not game:
+        return jsonify({'error': 'Game not found'}), 404
+    
+    replays = {}
+    if keys:
+        replays = {
+            r.idempotency_key: r for r in CommandResult.query.filter(
+                CommandResult.game_id == game_id,
+                CommandResult.idempotency_key.in_(keys)
+            )
+        }
+    
+    complete_training(game_id)
+    apply_production(game)
+    state = TownState(game)
+    results = []
+    for index, command in enumerate(commands):
+        key = command.get('idempotency_key')
+        stored = replays.get(key)
+        if stored:
+            results.append({
+                'index': index, 'type': stored.command_type, 'idempotency_key': key,
+                'status': stored.status, 'ok': stored.status < 400,
+                'result': stored.get_result(), 'replayed': True,
+            })
+            continue
+        
+        status, body = run_command(state, command)
+        results.append({
+            'index': index, 'type': command.get('type'), 'idempotency_key': key,
+            'status': status, 'ok': status < 400, 'result': body,
+        })
+        if key:
+            db.session.add(CommandResult(
+                game_id=game_id, idempotency_key=key, command_type=str(command.get('type')),
+                status=status, result=json.dumps(body),
+            ))
+    
+    if atomic and not all(r['ok'] for r in results):
+        db.session.rollback()
+        return jsonify({'committed': False, 'results': results}), 400
+    
+    # Results only need to outlive client retries
+    CommandResult.query.filter(
+        CommandResult.game_id == game_id,
+        CommandResult.created_at < datetime.utcnow() - COMMAND_RESULT_TTL
+    ).delete()
+    db.session.commit()
+    
+    if state.bonuses_changed:
+        bonuses_changed(game_id)
+    for event_type, payload in state.events:
+        publish_game_event(game_id, event_type, **payload)
+    if state.bonuses_changed:
+        publish_rates_changed(game_id)
+    
+    return jsonify({'committed': True, 'results': results}), 200
+
+
 # ==================== BUILDING TEMPLATES ====================
 
 @game_routes.route('/buildings/available', methods=['GET'])
@@ -470,8 +948,132 @@ def get_available_units(race):
         return jsonify({'error': str(e)}), 500
 
 
+# ==================== HERO ====================
+
+@game_routes.route('/<int:game_id>/hero', methods=['GET'])
+def get_hero(game_id):
+    """Hero details with stats after equipment and talents, and the equipped items"""
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        stats = get_hero_stats(game)
+        if stats is None:
+            return jsonify({'error': 'Unknown hero class or race'}), 400
+        
+        return jsonify({
+            'game_id': game.id,
+            'hero_name': game.hero_name,
+            'hero_class': game.hero_class,
+            'hero_race': game.hero_race,
+            'level': game.level,
+            'experience': game.experience,
+            'xp_needed': game.get_xp_needed_for_next_level(),
+            'stats': stats.to_dict(),
+            'equipped': [item.to_dict() for item in equipped_items(game_id)],
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # ==================== ITEM MANAGEMENT ====================
 
+# Items per page of GET /<game_id>/items
+ITEMS_PAGE_SIZE = 50
+MAX_ITEMS_PAGE_SIZE = 200
+
+
+@game_routes.route('/<int:game_id>/items', methods=['GET'])
+def list_items(game_id):
+    """Page through the hero's items, newest first
+
+    Query: type, rarity, equipped (true/false), limit, and cursor (the
+    next_cursor of the previous page). counts covers the whole inventory.
+    """
+    try:
+        if not db.session.query(SavedGame.id).filter_by(id=game_id).first():
+            return jsonify({'error': 'Game not found'}), 404
+        
+        item_type = request.args.get('type')
+        rarity = request.args.get('rarity')
+        if item_type is not None and item_type not in ITEM_TYPES:
+            return jsonify({'error': 'Invalid item type'}), 400
+        if rarity is not None and rarity not in ITEM_RARITIES:
+            return jsonify({'error': 'Invalid rarity'}), 400
+        
+        equipped = request.args.get('equipped')
+        if equipped is not None:
+            if equipped.lower() not in ('true', 'false', '1', '0'):
+                return jsonify({'error': 'equipped must be true or false'}), 400
+            equipped = equipped.lower() in ('true', '1')
+        
+        limit = request.args.get('limit', ITEMS_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor', type=int)
+        if limit <= 0:
+            return jsonify({'error': 'Invalid limit'}), 400
+        limit = min(limit, MAX_ITEMS_PAGE_SIZE)
+        
+        # One extra row tells whether there is another page
+        items = item_page(game_id, limit + 1, cursor, item_type=item_type, rarity=rarity, equipped=equipped)
+        has_more = len(items) > limit
+        items = items[:limit]
+        
+        return jsonify({
+            'items': [item.to_dict() for item in items],
+            'next_cursor': items[-1].id if has_more else None,
+            'counts': inventory_counts(game_id),
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@game_routes.route('/<int:game_id>/items/salvage', methods=['POST'])
+def salvage(game_id):
+    """Salvage unequipped item stacks for gold
+
+    Body: item_ids (stack ids), and/or type and rarity to salvage every
+    matching stack. Equipped items are never salvaged.
+    """
+    try:
+        data = request.get_json() or {}
+        item_ids = data.get('item_ids')
+        item_type = data.get('type')
+        rarity = data.get('rarity')
+        if item_ids is None and item_type is None and rarity is None:
+            return jsonify({'error': 'Select items by item_ids, type or rarity'}), 400
+        if item_ids is not None and (
+            not isinstance(item_ids, list) or not all(isinstance(i, int) for i in item_ids)
+        ):
+            return jsonify({'error': 'item_ids must be a list of item ids'}), 400
+        if item_type is not None and item_type not in ITEM_TYPES:
+            return jsonify({'error': 'Invalid item type'}), 400
+        if rarity is not None and rarity not in ITEM_RARITIES:
+            return jsonify({'error': 'Invalid rarity'}), 400
+        
+        if not db.session.query(SavedGame.id).filter_by(id=game_id).first():
+            return jsonify({'error': 'Game not found'}), 404
+        
+        stacks, items, gold = salvage_items(game_id, item_ids, item_type=item_type, rarity=rarity)
+        db.session.commit()
+        if gold:
+            publish_game_event(game_id, 'resources_changed', resources={'gold': gold})
+        
+        return jsonify({
+            'success': True,
+            'stacks': stacks,
+            'items': items,
+            'gold': gold,
+            'counts': inventory_counts(game_id),
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @game_routes.route('/<int:game_id>/item/<int:item_id>/equip', methods=['POST'])
 def equip_item(game_id, item_id):
     """Equip an item"""
@@ -486,15 +1088,20 @@ def equip_item(game_id, item_id):
         if not item:
             return jsonify({'error': 'Item not found'}), 404
         
-        # Unequip any item in the same slot
-        item_slot = item.get_template()['slot']
-        for other_item in game.items:
-            if other_item.equipped and other_item.get_template()['slot'] == item_slot:
-                other_item.equipped = False
+        item_slot = item.get_slot()
+        if item_slot not in ITEM_TYPES:
+            return jsonify({'error': 'This item cannot be equipped'}), 400
         
-        # Equip the item
-        item.equipped = True
+        # Replaces any item in the same slot, which goes back on its stack
+        replaced_id = db.session.query(EquipmentSlot.item_id).filter_by(game_id=game_id, slot=item_slot).scalar()
+        item = take_one(item)
+        equip(game_id, item_slot, item.id)
+        if replaced_id is not None and replaced_id != item.id:
+            restack(Item.query.get(replaced_id))
+        bump_stats_version(game_id)
         db.session.commit()
+        bonuses_changed(game_id)
+        publish_rates_changed(game_id)
         
         return jsonify({
             'success': True,
@@ -521,8 +1128,14 @@ def unequip_item(game_id, item_id):
         if not item:
             return jsonify({'error': 'Item not found'}), 404
         
-        item.equipped = False
+        unequipped = unequip(game_id, item.id)
+        if unequipped:
+            bump_stats_version(game_id)
+            item = restack(item)
         db.session.commit()
+        bonuses_changed(game_id)
+        if unequipped:
+            publish_rates_changed(game_id)
         
         return jsonify({
             'success': True,
@@ -1,12 +1,45 @@
 """World map API endpoints"""
 
 from flask import Blueprint, request, jsonify
-from models.db import db, SavedGame, MapTile, Item, ITEM_TEMPLATES, ITEM_RARITIES
-from models.world_map import WorldMap, TERRAIN_TRAITS, ENEMY_TYPES
+from sqlalchemy import tuple_
+from models.db import db, SavedGame, MapTile, MapChunk, MapConfig, Unit, ITEM_TEMPLATES, ITEM_RARITIES
+from models.inventory import add_items
+from models.army import get_army_summary
+from models.world_map import (
+    WorldMap, TERRAIN_TRAITS, ENEMY_TYPES, MAX_MAP_RADIUS, EAGER_MAP_RADIUS, CHUNK_SIZE,
+    get_enemy_power, roll_tile_contents,
+)
+from models import hex_grid
+from models.map_state import get_map_state, update_tile_owner, invalidate_map_state, bump_map_version
+from models.map_chunks import get_map_config, create_chunked_map, ensure_chunks, ensure_chunks_around
+from routes.streaming import stream_json, stream_query
 import random
 
 map_routes = Blueprint('map', __name__)
 
+# Largest viewport (in chunks) a single chunk request may cover
+MAX_VIEWPORT_CHUNKS = 64
+
+# Map seeds are stored in a signed 64-bit column
+MAX_MAP_SEED = 2 ** 63 - 1
+
+
+def get_neighbor_tiles(game_id, q, r):
+    """Load all existing neighbors of (q, r) in a single query"""
+    coords = list(hex_grid.neighbors(q, r))
+    return MapTile.query.filter(
+        MapTile.game_id == game_id,
+        tuple_(MapTile.q, MapTile.r).in_(coords)
+    ).all()
+
+
+def parse_coords(value):
+    """Parse a 'q,r' query parameter into a coordinate tuple"""
+    if not value:
+        raise ValueError('Missing coordinates')
+    q, r = value.split(',')
+    return int(q), int(r)
+
 
 @map_routes.route('/generate/<int:game_id>', methods=['POST'])
 def generate_world_map(game_id):
@@ -16,12 +49,35 @@ def generate_world_map(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        # Delete existing map tiles if any
-        MapTile.query.filter_by(game_id=game_id).delete()
-        
         # Generate new map
         data = request.get_json() or {}
         radius = data.get('radius', 10)  # Default radius of 10 = ~300 tiles
+        # bool is an int subclass; a JSON true must not become radius 1
+        if isinstance(radius, bool) or not isinstance(radius, int) or not 1 <= radius <= MAX_MAP_RADIUS:
+            return jsonify({'error': f'Radius must be an integer between 1 and {MAX_MAP_RADIUS}'}), 400
+        seed = data.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed <= MAX_MAP_SEED):
+            return jsonify({'error': f'Seed must be an integer between 0 and {MAX_MAP_SEED}'}), 400
+        
+        # Delete existing map tiles if any
+        MapTile.query.filter_by(game_id=game_id).delete()
+        MapChunk.query.filter_by(game_id=game_id).delete()
+        MapConfig.query.filter_by(game_id=game_id).delete()
+        
+        # Large maps are generated chunk by chunk as they are viewed
+        if radius > EAGER_MAP_RADIUS:
+            create_chunked_map(game_id, radius, seed)
+            bump_map_version(game_id)
+            db.session.commit()
+            invalidate_map_state(game_id)
+            
+            return jsonify({
+                'message': 'World map generated successfully',
+                'tile_count': hex_grid.hex_count(radius),
+                'radius': radius,
+                'chunked': True,
+                'chunk_size': CHUNK_SIZE,
+            }), 201
         
         world_map = WorldMap(radius=radius)
         
@@ -29,49 +85,12 @@ def generate_world_map(game_id):
         # Center tile (0,0) is owned by player (town location)
         tiles_to_add = []
         for tile in world_map.tiles.values():
-            # Center tile is player's town
-            if tile.q == 0 and tile.r == 0:
-                occupied_by = 'player'
-                explored = True
-                enemy_type = None
-                enemy_strength = 0
-            else:
-                # All other tiles are neutral with enemies
-                occupied_by = 'neutral'
-                # Adjacent tiles to center are initially explored (visible)
-                distance = max(abs(tile.q), abs(tile.r), abs(-tile.q - tile.r))
-                explored = (distance == 1)  # Only adjacent tiles are visible at start
-                
-                # Progressive difficulty: enemies get stronger with distance
-                # Distance 1-2: Strength 1-2 (easy)
-                # Distance 3-4: Strength 2-3 (medium)
-                # Distance 5-6: Strength 3-4 (hard)
-                # Distance 7+: Strength 4-5+ (very hard)
-                base_strength = max(1, distance // 2)
-                enemy_strength = base_strength + random.randint(0, min(2, distance // 3))
-                enemy_strength = min(enemy_strength, 10)  # Cap at 10
-                
-                # Select enemy type based on strength
-                if enemy_strength >= 8:
-                    enemy_type = random.choice(['dragon', 'demon_lord', 'ancient_lich'])
-                elif enemy_strength >= 6:
-                    enemy_type = random.choice(['vampire', 'giant', 'demon_lord', 'dragon'])
-                elif enemy_strength >= 4:
-                    enemy_type = random.choice(['troll', 'orc_warlord', 'vampire', 'giant'])
-                elif enemy_strength >= 2:
-                    enemy_type = random.choice(['wolf_pack', 'bandit', 'troll', 'orc_warlord'])
-                else:
-                    enemy_type = random.choice(['goblin', 'wolf_pack', 'bandit'])
-            
             map_tile = MapTile(
                 game_id=game_id,
                 q=tile.q,
                 r=tile.r,
                 terrain_type=tile.terrain_type,
-                explored=explored,
-                occupied_by=occupied_by,
-                enemy_type=enemy_type,
-                enemy_strength=enemy_strength
+                **roll_tile_contents(tile.q, tile.r)
             )
             tiles_to_add.append(map_tile)
         
@@ -79,12 +98,15 @@ def generate_world_map(game_id):
         for map_tile in tiles_to_add:
             db.session.add(map_tile)
         
+        bump_map_version(game_id)
         db.session.commit()
+        invalidate_map_state(game_id)
         
         return jsonify({
             'message': 'World map generated successfully',
             'tile_count': len(world_map.tiles),
-            'radius': radius
+            'radius': radius,
+            'chunked': False,
         }), 201
         
     except Exception as e:
@@ -100,9 +122,9 @@ def get_world_map(game_id):
         if not game:
             return jsonify({'error': 'Game not found'}), 404
         
-        tiles = MapTile.query.filter_by(game_id=game_id).all()
+        has_tiles = db.session.query(MapTile.id).filter_by(game_id=game_id).first() is not None
         
-        if not tiles:
+        if not has_tiles:
             # Auto-generate map if it doesn't exist
             world_map = WorldMap(radius=10)
             for tile in world_map.tiles.values():
@@ -116,7 +138,7 @@ def get_world_map(game_id):
                     # All other tiles are neutral with enemies
                     occupied_by = 'neutral'
                     explored = False
-                    distance = max(abs(tile.q), abs(tile.r), abs(-tile.q - tile.r))
+                    distance = hex_grid.distance(tile.q, tile.r)
                     enemy_type = random.choice(list(ENEMY_TYPES.keys()))
                     enemy_strength = distance // 2 + random.randint(0, 2)
                 
@@ -132,14 +154,105 @@ def get_world_map(game_id):
                 )
                 db.session.add(map_tile)
             
+            bump_map_version(game_id)
+            db.session.commit()
+            invalidate_map_state(game_id)
+        
+        tiles = MapTile.query.filter_by(game_id=game_id).order_by(MapTile.id)
+        
+        return stream_json({
+            'game_id': game_id,
+            'tile_count': tiles.count(),
+            'terrain_types': list(TERRAIN_TRAITS.keys()),
+        }, {
+            'tiles': (stream_query(tiles), MapTile.to_dict),
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@map_routes.route('/<int:game_id>/chunks', methods=['GET'])
+def get_map_chunks(game_id):
+    """Get the tiles of every chunk overlapping a viewport
+
+    Query params: bbox=q_min,r_min,q_max,r_max or center=q,r&radius=n
+    Chunks of lazily generated maps are generated on first access.
+    """
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        config = get_map_config(game_id)
+        chunk_size = config.chunk_size if config else CHUNK_SIZE
+        
+        try:
+            if request.args.get('bbox'):
+                q_min, r_min, q_max, r_max = (int(v) for v in request.args['bbox'].split(','))
+            else:
+                center_q, center_r = parse_coords(request.args.get('center'))
+                view_radius = int(request.args.get('radius', chunk_size))
+                q_min, r_min = center_q - view_radius, center_r - view_radius
+                q_max, r_max = center_q + view_radius, center_r + view_radius
+        except ValueError:
+            return jsonify({'error': 'Provide bbox=q_min,r_min,q_max,r_max or center=q,r&radius=n'}), 400
+        
+        if q_min > q_max or r_min > r_max:
+            return jsonify({'error': 'Empty bounding box'}), 400
+        
+        chunk_keys = list(hex_grid.chunks_in_bbox(q_min, r_min, q_max, r_max, chunk_size))
+        if len(chunk_keys) > MAX_VIEWPORT_CHUNKS:
+            return jsonify({'error': f'Viewport too large (max {MAX_VIEWPORT_CHUNKS} chunks)'}), 400
+        
+        if config and ensure_chunks(config, chunk_keys):
+            bump_map_version(game_id)
             db.session.commit()
-            tiles = MapTile.query.filter_by(game_id=game_id).all()
+            invalidate_map_state(game_id)
+        
+        # Load the tiles of all requested chunks in one range query
+        cq_min, cr_min = hex_grid.chunk_of(q_min, r_min, chunk_size)
+        cq_max, cr_max = hex_grid.chunk_of(q_max, r_max, chunk_size)
+        tiles = MapTile.query.filter(
+            MapTile.game_id == game_id,
+            MapTile.q.between(cq_min * chunk_size, (cq_max + 1) * chunk_size - 1),
+            MapTile.r.between(cr_min * chunk_size, (cr_max + 1) * chunk_size - 1),
+        ).all()
+        
+        chunks = {}
+        for tile in tiles:
+            chunks.setdefault(hex_grid.chunk_of(tile.q, tile.r, chunk_size), []).append(tile.to_dict())
         
         return jsonify({
             'game_id': game_id,
+            'radius': config.radius if config else None,
+            'chunk_size': chunk_size,
             'tile_count': len(tiles),
-            'tiles': [tile.to_dict() for tile in tiles],
-            'terrain_types': list(TERRAIN_TRAITS.keys()),
+            'chunks': [
+                {'cq': cq, 'cr': cr, 'tiles': chunk_tiles}
+                for (cq, cr), chunk_tiles in sorted(chunks.items())
+            ],
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@map_routes.route('/<int:game_id>/frontier', methods=['GET'])
+def get_frontier(game_id):
+    """Get all neutral tiles adjacent to player territory (attack targets)"""
+    try:
+        game = SavedGame.query.get(game_id)
+        if not game:
+            return jsonify({'error': 'Game not found'}), 404
+        
+        tiles = get_map_state(game_id).frontier_tiles()
+        
+        return jsonify({
+            'game_id': game_id,
+            'tile_count': len(tiles),
+            'tiles': tiles,
         }), 200
         
     except Exception as e:
@@ -182,7 +295,9 @@ def occupy_tile(game_id, q, r):
         
         tile.occupied_by = occupied_by
         tile.explored = True
+        map_version = bump_map_version(game_id)
         db.session.commit()
+        update_tile_owner(game_id, q, r, occupied_by, map_version)
         
         return jsonify({
             'message': 'Tile updated successfully',
@@ -224,26 +339,66 @@ def get_neighbors(game_id, q, r):
     r = int(r)
     """Get all neighboring tiles"""
     try:
-        # Axial coordinate neighbors
-        directions = [
-            (1, 0), (1, -1), (0, -1),
-            (-1, 0), (-1, 1), (0, 1)
-        ]
-        
-        neighbors = []
-        for dq, dr in directions:
-            neighbor = MapTile.query.filter_by(
-                game_id=game_id, 
-                q=q + dq, 
-                r=r + dr
-            ).first()
-            
-            if neighbor:
-                neighbors.append(neighbor.to_dict())
+        neighbors = get_neighbor_tiles(game_id, q, r)
         
         return jsonify({
             'tile': {'q': q, 'r': r},
-            'neighbors': neighbors
+            'neighbors': [neighbor.to_dict() for neighbor in neighbors]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@map_routes.route('/path/<int:game_id>', methods=['GET'])
+def get_path(game_id):
+    """Get the cheapest movement path to a tile
+
+    Query params: to=q,r (required), from=q,r (optional; defaults to the
+    nearest player-owned tile)
+    """
+    try:
+        try:
+            goal = parse_coords(request.args.get('to'))
+            start = parse_coords(request.args['from']) if request.args.get('from') else None
+        except ValueError:
+            return jsonify({'error': 'Coordinates must be given as q,r'}), 400
+        
+        state = get_map_state(game_id)
+        if start is None:
+            result = state.path_from_territory(goal)
+        else:
+            result = state.find_path(start, goal)
+        
+        if not result:
+            return jsonify({'error': 'No path found'}), 404
+        
+        path, cost = result
+        return jsonify({
+            'path': [{'q': q, 'r': r} for q, r in path],
+            'movement_cost': cost,
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@map_routes.route('/reachable/<int:game_id>', methods=['GET'])
+def get_reachable_tiles(game_id):
+    """Get tiles outside player territory reachable within N movement points"""
+    try:
+        movement = request.args.get('movement', type=int)
+        if movement is None or movement < 0:
+            return jsonify({'error': 'movement must be a non-negative integer'}), 400
+        
+        reachable = get_map_state(game_id).reachable(movement)
+        
+        return jsonify({
+            'movement': movement,
+            'tiles': [
+                {'q': q, 'r': r, 'movement_cost': cost}
+                for (q, r), cost in reachable
+            ],
         }), 200
         
     except Exception as e:
@@ -258,6 +413,27 @@ def get_terrain_info():
     }), 200
 
 
+def selected_army_power(game_id, selection):
+    """Battle power of the selected units ({unit_id: count}) after the game's modifiers
+
+    Returns None if a unit is not in this game or fewer are available.
+    """
+    try:
+        counts = {int(unit_id): int(count) for unit_id, count in selection.items()}
+    except (AttributeError, TypeError, ValueError):
+        return None
+    counts = {unit_id: count for unit_id, count in counts.items() if count > 0}
+    if not counts:
+        return 0
+    
+    units = Unit.query.filter(Unit.game_id == game_id, Unit.id.in_(counts)).all()
+    if len(units) != len(counts) or any(counts[u.id] > u.count for u in units):
+        return None
+    
+    summary = get_army_summary(game_id)
+    return int(sum(summary.stack_power(u.race, u.unit_type, counts[u.id]) for u in units))
+
+
 @map_routes.route('/attack/<int:game_id>/<q>/<r>', methods=['POST'])
 def attack_tile(game_id, q, r):
     q = int(q)
@@ -265,7 +441,13 @@ def attack_tile(game_id, q, r):
     """Attack and attempt to conquer a neutral tile"""
     try:
         data = request.get_json() or {}
-        player_power = data.get('player_power', 0)
+        if 'units' in data:
+            # Computed here with talent and building bonuses applied
+            player_power = selected_army_power(game_id, data['units'])
+            if player_power is None:
+                return jsonify({'error': 'Invalid unit selection'}), 400
+        else:
+            player_power = data.get('player_power', 0)
         
         # Get the tile to attack
         tile = MapTile.query.filter_by(game_id=game_id, q=q, r=r).first()
@@ -280,29 +462,24 @@ def attack_tile(game_id, q, r):
         if tile.occupied_by != 'neutral':
             return jsonify({'error': 'This tile cannot be attacked'}), 400
         
+        # Chunked maps: generate the tiles this conquest would reveal
+        if ensure_chunks_around(game_id, q, r):
+            bump_map_version(game_id)
+            db.session.commit()
+            invalidate_map_state(game_id)
+        
         # Check if tile is adjacent to any player-owned tile
-        directions = [
-            (1, 0), (1, -1), (0, -1),
-            (-1, 0), (-1, 1), (0, 1)
-        ]
-        
-        adjacent_to_player = False
-        for dq, dr in directions:
-            neighbor = MapTile.query.filter_by(
-                game_id=game_id, 
-                q=q + dq, 
-                r=r + dr
-            ).first()
-            if neighbor and neighbor.occupied_by == 'player':
-                adjacent_to_player = True
-                break
-        
-        if not adjacent_to_player:
-            return jsonify({'error': 'You can only attack tiles adjacent to your territory'}), 400
+        state = get_map_state(game_id)
+        if not state.is_attackable(q, r):
+            # The cache is per process; confirm against the database before refusing
+            adjacent_to_player = any(n.occupied_by == 'player' for n in get_neighbor_tiles(game_id, q, r))
+            if not adjacent_to_player:
+                return jsonify({'error': 'You can only attack tiles adjacent to your territory'}), 400
+            invalidate_map_state(game_id)
         
         # Calculate enemy power
         enemy_info = ENEMY_TYPES.get(tile.enemy_type, {})
-        enemy_power = enemy_info.get('base_power', 0) + (tile.enemy_strength * enemy_info.get('power_per_level', 0))
+        enemy_power = get_enemy_power(tile.enemy_type, tile.enemy_strength)
         
         # Determine battle outcome
         success = player_power >= enemy_power
@@ -325,23 +502,9 @@ def attack_tile(game_id, q, r):
             tile.enemy_strength = 0
             
             # Reveal adjacent tiles (fog of war mechanic)
-            # Hexagonal neighbors offsets
-            neighbor_offsets = [
-                (1, 0), (1, -1), (0, -1), 
-                (-1, 0), (-1, 1), (0, 1)
-            ]
-            
-            for dq, dr in neighbor_offsets:
-                neighbor_q = q + dq
-                neighbor_r = r + dr
-                neighbor_tile = MapTile.query.filter_by(
-                    game_id=game_id, 
-                    q=neighbor_q, 
-                    r=neighbor_r
-                ).first()
-                
+            for neighbor_tile in get_neighbor_tiles(game_id, q, r):
                 # Make adjacent tiles visible (explored but not conquered)
-                if neighbor_tile and not neighbor_tile.explored:
+                if not neighbor_tile.explored:
                     neighbor_tile.explored = True
             
             # Calculate loot/rewards
@@ -383,17 +546,12 @@ def attack_tile(game_id, q, r):
                 # Select random item template
                 template_key = random.choice(list(ITEM_TEMPLATES.keys()))
                 
-                # Create the item
-                new_item = Item(
-                    game_id=game_id,
-                    item_template=template_key,
-                    rarity=rarity,
-                    equipped=False
-                )
-                db.session.add(new_item)
-                dropped_item = new_item.to_dict()
+                # Add it to the stack of identical items
+                dropped_item = add_items(game_id, template_key, rarity).to_dict()
             
+            map_version = bump_map_version(game_id)
             db.session.commit()
+            update_tile_owner(game_id, q, r, 'player', map_version)
             
             return jsonify({
                 'success': True,
@@ -0,0 +1,135 @@
+"""Streaming JSON responses for large collections
+
+jsonify() needs the whole payload in memory before the first byte is
+sent. The helpers here instead emit the JSON text piece by piece while
+rows are fetched from a server-side cursor, so memory use is bounded by
+the batch size and the first byte goes out before the query finishes.
+
+With ?format=ndjson (or Accept: application/x-ndjson) the same data is
+sent as newline-delimited JSON: one line for the scalar fields, then one
+line per collection element.
+
+The status line goes out before the rows are read, so an error part way
+through cannot change it. Instead the body ends with an error chunk the
+client can detect (see stream_error), and the exception is logged.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from flask import Response, current_app, request, stream_with_context
+
+from models.db import db
+
+# Rows fetched per round trip when streaming a query
+STREAM_BATCH_SIZE = 500
+
+# Collections given to stream_json: key -> (rows, serializer)
+Collections = Dict[str, Tuple[Iterable[Any], Callable[[Any], Any]]]
+
+
+def stream_query(query, batch_size: int = STREAM_BATCH_SIZE):
+    """Configure an ORM query to fetch rows through a server-side cursor
+
+    Query.yield_per also sets the stream_results execution option, so
+    drivers that support it (psycopg) use a named server-side cursor.
+    """
+    return query.yield_per(batch_size)
+
+
+def stream_statement(statement, batch_size: int = STREAM_BATCH_SIZE):
+    """Execute a select() and iterate its ORM rows in batches"""
+    return db.session.scalars(statement.execution_options(yield_per=batch_size))
+
+
+def wants_ndjson() -> bool:
+    """True if the client asked for newline-delimited JSON"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return 'application/x-ndjson' in request.headers.get('Accept', '')
+
+
+# Starts the final chunk of a JSON body whose stream failed. '!' cannot
+# occur outside a string in JSON, so no parser accepts the truncated body
+STREAM_ERROR_MARKER = '\n!error '
+
+
+def _dumps(value: Any) -> str:
+    # Same encoder settings as jsonify()
+    return current_app.json.dumps(value)
+
+
+def stream_error(error: Exception, ndjson: bool, dumps: Optional[Callable[[Any], str]] = None) -> str:
+    """Final chunk of a stream that failed after its first chunk
+
+    NDJSON gets a last {"error": ...} line; JSON gets STREAM_ERROR_MARKER
+    and the same object, which makes the body invalid JSON.
+    """
+    message = (dumps or _dumps)({'error': str(error)})
+    return message + '\n' if ndjson else STREAM_ERROR_MARKER + message
+
+
+def _guarded(chunks: Iterator[str], ndjson: bool) -> Iterator[str]:
+    try:
+        yield from chunks
+    except Exception as e:
+        current_app.logger.exception('Streamed response failed')
+        yield stream_error(e, ndjson)
+
+
+def stream_json(fields: Dict[str, Any], collections: Optional[Collections] = None,
+                status: int = 200) -> Response:
+    """Stream a JSON object whose collections are serialized one row at a time"""
+    collections = collections or {}
+
+    if wants_ndjson():
+        def generate_ndjson():
+            yield _dumps(fields) + '\n'
+            for key, (rows, serialize) in collections.items():
+                for row in rows:
+                    yield _dumps({'collection': key, 'item': serialize(row)}) + '\n'
+
+        return Response(stream_with_context(_guarded(generate_ndjson(), True)), status=status,
+                        mimetype='application/x-ndjson')
+
+    def generate():
+        head = _dumps(fields)
+        if not collections:
+            yield head
+            return
+
+        # Reopen the scalar object and append each collection as an array
+        yield head[:-1] + (',' if fields else '')
+        for index, (key, (rows, serialize)) in enumerate(collections.items()):
+            yield ('' if index == 0 else ',') + _dumps(key) + ':['
+            first = True
+            for row in rows:
+                yield ('' if first else ',') + _dumps(serialize(row))
+                first = False
+            yield ']'
+        yield '}'
+
+    return Response(stream_with_context(_guarded(generate(), False)), status=status,
+                    mimetype='application/json')
+
+
+def stream_json_array(rows: Iterable[Any], serialize: Callable[[Any], Any],
+                      status: int = 200) -> Response:
+    """Stream a top-level JSON array (or one NDJSON line per element)"""
+    if wants_ndjson():
+        def generate_ndjson():
+            for row in rows:
+                yield _dumps(serialize(row)) + '\n'
+
+        return Response(stream_with_context(_guarded(generate_ndjson(), True)), status=status,
+                        mimetype='application/x-ndjson')
+
+    def generate():
+        yield '['
+        first = True
+        for row in rows:
+            yield ('' if first else ',') + _dumps(serialize(row))
+            first = False
+        yield ']'
+
+    return Response(stream_with_context(_guarded(generate(), False)), status=status,
+                    mimetype='application/json')
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""Production server runner
+
+run.py starts Flask's development server, which is meant for local use
+only. This launcher serves the same app with gunicorn instead:
+
+    python serve.py
+
+The app is imported once in the master process before the workers are
+forked (preload), so the building, unit, talent and terrain catalogs
+are shared copy-on-write instead of being rebuilt by every worker. Each
+worker runs WEB_THREADS request threads.
+
+Settings (environment variables):
+    HOST / PORT           listen address (default 0.0.0.0:5000)
+    WEB_WORKERS           worker processes (default 2 x CPUs + 1, or 1 with an
+                          in-process EVENT_BACKEND)
+    WEB_THREADS           threads per worker (default 4)
+    WEB_TIMEOUT           seconds before a stuck worker is killed (default 60)
+    WEB_GRACEFUL_TIMEOUT  seconds in-flight requests get to finish on stop/reload (default 30)
+    WEB_MAX_REQUESTS      recycle a worker after this many requests (default 1000, 0 = never)
+    DRAIN_SECONDS         keep serving with /api/health failing for this long after
+                          SIGTERM so load balancers stop routing here first (default 0)
+    DB_MAX_CONNECTIONS    connection budget for the whole server; the per-worker
+                          pool is shrunk to fit it (default: unlimited)
+
+Signals (sent to the master process):
+    HUP    graceful reload: new workers start, old ones finish their requests.
+           Because the app is preloaded, code changes need a full restart
+           or a USR2 binary upgrade
+    USR2   start a new master with fresh code next to the old one;
+           then send TERM to the old master
+    TERM   graceful stop with connection draining
+    INT    immediate stop
+
+Live town updates are published to the town streams through the event
+backend (models/events.py). The default on SQLite only reaches streams
+served by the publishing worker, so several workers need a cross-process
+EVENT_BACKEND; serve.py refuses to start otherwise. On Postgres the
+default, LISTEN/NOTIFY, already is one.
+
+gunicorn needs a POSIX system; on Windows keep using run.py for local
+development. See DEPLOYMENT.md for a throughput comparison with the
+development server.
+"""
+
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from typing import Optional, Tuple
+
+# Change to backend directory
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+
+from gunicorn.app.base import BaseApplication
+
+from models.events import backend_class, backend_path
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Events only reach other workers through a cross-process backend
+SHARED_EVENTS = backend_class().cross_process
+WORKERS = env_int('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1 if SHARED_EVENTS else 1)
+THREADS = env_int('WEB_THREADS', 4)
+DRAIN_SECONDS = env_int('DRAIN_SECONDS', 0)
+
+
+def pool_settings(workers: int, threads: int,
+                  max_connections: Optional[int] = None) -> Tuple[int, int]:
+    """Per-worker (pool_size, max_overflow) for the database engine
+
+    A worker never runs more than `threads` requests at once, so that many
+    pooled connections cover it; a small overflow absorbs streaming
+    responses that still hold a connection while the next request starts.
+    With a connection budget the pool is shrunk so that
+    workers * (pool_size + max_overflow) stays within it.
+    """
+    pool_size = threads
+    max_overflow = max(1, threads // 2)
+    if max_connections:
+        per_worker = max(1, max_connections // workers)
+        pool_size = min(pool_size, per_worker)
+        max_overflow = min(max_overflow, per_worker - pool_size)
+    return pool_size, max_overflow
+
+
+# ==================== GUNICORN HOOKS ====================
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master"""
+    from app import app
+    from models.db import db
+
+    # The master connected while importing the app (db.create_all); a
+    # socket shared between processes corrupts both sides' sessions
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Fail readiness checks as soon as the worker is asked to stop"""
+    stop = worker.handle_exit
+
+    def drain(sig, frame):
+        worker.wsgi.config['DRAINING'] = True
+        if DRAIN_SECONDS:
+            threading.Timer(DRAIN_SECONDS, stop, (sig, frame)).start()
+        else:
+            stop(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def worker_exit(server, worker):
+    """Write buffered resource changes before the worker goes away"""
+    from models.resource_buffer import resource_writes
+    resource_writes.flush_all()
+
+
+class CarondorServer(BaseApplication):
+    """gunicorn application serving the preloaded Flask app"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def server_options() -> dict:
+    graceful_timeout = env_int('WEB_GRACEFUL_TIMEOUT', 30)
+    max_requests = env_int('WEB_MAX_REQUESTS', 1000)
+    return {
+        'bind': f"{os.getenv('HOST', '0.0.0.0')}:{env_int('PORT', 5000)}",
+        'worker_class': 'gthread',
+        'workers': WORKERS,
+        'threads': THREADS,
+        'preload_app': True,
+        'timeout': env_int('WEB_TIMEOUT', 60),
+        'graceful_timeout': graceful_timeout + DRAIN_SECONDS,
+        'keepalive': 5,
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,
+        'accesslog': '-',
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+if __name__ == '__main__':
+    if WORKERS > 1 and not SHARED_EVENTS:
+        sys.exit(
+            f'EVENT_BACKEND {backend_path()} only delivers events within one process, '
+            f'so town streams would miss changes made on the other {WORKERS - 1} workers. '
+            'Set WEB_WORKERS=1 or use a cross-process EVENT_BACKEND '
+            '(models.events:PostgresNotifyBackend on Postgres).'
+        )
+    # Size the engine pools before the app (and its engine) is imported
+    pool_size, max_overflow = pool_settings(
+        WORKERS, THREADS, env_int('DB_MAX_CONNECTIONS', 0) or None
+    )
+    os.environ.setdefault('DB_POOL_SIZE', str(pool_size))
+    os.environ.setdefault('DB_MAX_OVERFLOW', str(max_overflow))
+
+    CarondorServer(server_options()).run()
@@ -0,0 +1,43 @@
+"""Shared fixtures: the Flask app on a shared in-memory SQLite database
+
+Resource changes are written through (no write-behind window) so tests
+see them immediately. Each test creates its own game; the database lives
+for the whole session.
+"""
+
+import os
+import sys
+
+os.environ['SQLITE_MEMORY'] = '1'
+os.environ['RESOURCE_WRITE_WINDOW_MS'] = '0'
+os.environ.pop('DATABASE_URL', None)
+os.environ.pop('POSTGRES_URL', None)
+os.environ.pop('EVENT_BACKEND', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import app as flask_app
+from models.db import db, SavedGame
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_game(app):
+    def make(**fields):
+        game = SavedGame(**{'hero_name': 'Tester', 'hero_class': 'Warrior', 'hero_race': 'Human', **fields})
+        db.session.add(game)
+        db.session.commit()
+        return game.id
+    return make
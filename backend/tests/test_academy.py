@@ -0,0 +1,61 @@
+"""Academy routes"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.db import db, Building, ConstructionJob
+from models.events import subscribe_game_events
+from models.talent_summary import load_talent_summary
+
+
+def queue_academy(game_id, minutes_ago=1):
+    now = datetime.utcnow()
+    db.session.add(ConstructionJob(game_id=game_id, building_type='academy', from_level=0, target_level=1,
+                                   started_at=now - timedelta(minutes=minutes_ago + 1),
+                                   completes_at=now - timedelta(minutes=minutes_ago)))
+    db.session.commit()
+
+
+def test_talents_with_academy_due_but_unresolved(client, make_game):
+    game_id = make_game()
+    assert not load_talent_summary(game_id).has_academy
+    queue_academy(game_id)
+
+    response = client.get(f'/api/academy/{game_id}/talents')
+
+    assert response.status_code == 200, response.get_json()
+    assert Building.query.filter_by(game_id=game_id, building_type='academy').count() == 1
+    assert ConstructionJob.query.filter_by(game_id=game_id).count() == 0
+
+
+def test_talents_without_academy(client, make_game):
+    game_id = make_game()
+    queue_academy(game_id, minutes_ago=-5)
+
+    response = client.get(f'/api/academy/{game_id}/talents')
+
+    assert response.status_code == 403
+    assert ConstructionJob.query.filter_by(game_id=game_id).count() == 1
+
+
+def test_invest_publishes_new_rates(client, make_game):
+    game_id = make_game()
+    db.session.add_all([
+        Building(game_id=game_id, building_type='academy', level=1),
+        Building(game_id=game_id, building_type='wood_mine', level=1),
+    ])
+    db.session.commit()
+    subscription = subscribe_game_events(game_id)
+    try:
+        base = client.get(f'/api/game/production/{game_id}').get_json()['production_rates']['wood']
+
+        response = client.post(f'/api/academy/{game_id}/talents/forestry_expertise/invest')
+
+        assert response.status_code == 200, response.get_json()
+        event = subscription.get(timeout=1)
+    finally:
+        subscription.close()
+    assert event['type'] == 'resources_changed'
+    assert event['rates']['wood'] == pytest.approx(base * 1.1)
+    assert 'wood' in event['caps']
@@ -0,0 +1,36 @@
+"""Item salvage"""
+
+from models.db import db, Item, Resource
+
+
+def add_stack(game_id, quantity):
+    item = Item(game_id=game_id, item_template='iron_sword', rarity='common', quantity=quantity)
+    db.session.add(item)
+    db.session.commit()
+    return item.id
+
+
+def gold_rows(game_id):
+    return Resource.query.filter_by(game_id=game_id, resource_type='gold').all()
+
+
+def test_salvage_credits_gold(client, make_game):
+    game_id = make_game()
+    db.session.add(Resource(game_id=game_id, resource_type='gold', amount=100))
+    item_id = add_stack(game_id, 3)
+
+    response = client.post(f'/api/game/{game_id}/items/salvage', json={'item_ids': [item_id]})
+
+    assert response.status_code == 200, response.get_json()
+    assert [row.amount for row in gold_rows(game_id)] == [115]
+
+
+def test_salvage_without_gold_resource(client, make_game):
+    game_id = make_game()
+    item_id = add_stack(game_id, 2)
+
+    response = client.post(f'/api/game/{game_id}/items/salvage', json={'item_ids': [item_id]})
+
+    assert response.status_code == 200, response.get_json()
+    assert [row.amount for row in gold_rows(game_id)] == [10]
+    assert db.session.get(Item, item_id) is None
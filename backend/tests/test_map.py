@@ -0,0 +1,37 @@
+"""World map routes"""
+
+from models.db import db, MapTile
+from models.map_state import get_map_state, map_version
+
+
+def test_occupy_tile_updates_cached_state(client, make_game):
+    game_id = make_game()
+    assert client.post(f'/api/map/generate/{game_id}', json={'radius': 2}).status_code == 201
+    MapTile.query.filter_by(game_id=game_id, q=0, r=0).update({'occupied_by': 'player'})
+    db.session.commit()
+    state = get_map_state(game_id)
+    version = state.version
+
+    response = client.post(f'/api/map/tile/{game_id}/1/0/occupy', json={'occupied_by': 'player'})
+
+    assert response.status_code == 200
+    assert response.get_json()['tile']['occupied_by'] == 'player'
+    assert map_version(game_id) == version + 1
+    # This worker's state was updated in place, not reloaded
+    assert get_map_state(game_id) is state
+    assert state.owners[(1, 0)] == 'player'
+    assert (2, 0) in state.frontier
+
+
+def test_occupy_tile_seen_by_stale_worker(client, make_game):
+    game_id = make_game()
+    client.post(f'/api/map/generate/{game_id}', json={'radius': 2})
+    state = get_map_state(game_id)
+    # Another worker's change: cached state is one version behind
+    state.version -= 1
+
+    assert client.post(f'/api/map/tile/{game_id}/1/0/occupy', json={'occupied_by': 'enemy'}).status_code == 200
+
+    reloaded = get_map_state(game_id)
+    assert reloaded is not state
+    assert reloaded.owners[(1, 0)] == 'enemy'
@@ -0,0 +1,54 @@
+"""Resource write buffer"""
+
+import time
+
+from models.db import Resource
+from models.resource_buffer import resource_writes
+
+
+def test_failed_flush_is_requeued_and_retried(app, make_game, monkeypatch):
+    game_id = make_game()
+    write = resource_writes._write
+    attempts = []
+
+    def fail_once(game_id, changes):
+        attempts.append(game_id)
+        if len(attempts) == 1:
+            raise RuntimeError('database is locked')
+        write(game_id, changes)
+
+    monkeypatch.setattr(resource_writes, '_write', fail_once)
+    monkeypatch.setattr('models.resource_buffer.RETRY_SECONDS', 0.01)
+
+    amount, applied = resource_writes.add(game_id, 'gold', 5)
+    assert (amount, applied) == (5, 5)
+    assert resource_writes.has_pending()
+
+    deadline = time.monotonic() + 2
+    while resource_writes.has_pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(attempts) == 2
+    assert Resource.query.filter_by(game_id=game_id, resource_type='gold').one().amount == 5
+    assert game_id not in resource_writes._failures
+
+
+def test_failed_flush_keeps_later_deltas(app, make_game, monkeypatch):
+    game_id = make_game()
+
+    def fail(game_id, changes):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(resource_writes, '_write', fail)
+    monkeypatch.setattr('models.resource_buffer.RETRY_SECONDS', 60)
+
+    resource_writes.add(game_id, 'gold', 5)
+    amount, _ = resource_writes.add(game_id, 'gold', 3)
+    assert amount == 8
+    assert resource_writes._failures[game_id] == 2
+
+    monkeypatch.undo()
+    resource_writes.flush_all()
+
+    assert Resource.query.filter_by(game_id=game_id, resource_type='gold').one().amount == 8
+    assert game_id not in resource_writes._failures
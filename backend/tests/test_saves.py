@@ -0,0 +1,24 @@
+"""Save route"""
+
+from models.db import db, Resource
+from models.events import subscribe_game_events
+
+
+def test_save_over_game_publishes_snapshot(client, make_game):
+    game_id = make_game()
+    db.session.add(Resource(game_id=game_id, resource_type='gold', amount=100))
+    db.session.commit()
+    subscription = subscribe_game_events(game_id)
+    try:
+        response = client.post('/api/game/save', json={
+            'game_id': game_id, 'hero_name': 'Tester', 'hero_class': 'Warrior', 'hero_race': 'Human',
+            'resources': {'gold': 40}, 'buildings': [], 'units': [],
+        })
+
+        assert response.status_code == 200, response.get_json()
+        event = subscription.get(timeout=1)
+    finally:
+        subscription.close()
+    assert event['type'] == 'snapshot'
+    assert event['resources']['gold'] == 40
+    assert 'rates' in event and 'caps' in event
@@ -0,0 +1,32 @@
+"""Game snapshots"""
+
+import zlib
+
+import pytest
+
+from models import snapshot
+from models.snapshot import MAGIC, FORMAT_VERSION, SnapshotError, decode_snapshot, export_game
+
+
+def test_export_import_round_trip(client, make_game):
+    game_id = make_game()
+
+    response = client.post(f'/api/game/{game_id}/clone')
+
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()['game_id'] != game_id
+
+
+def test_decompression_bomb_rejected(monkeypatch):
+    monkeypatch.setattr(snapshot, 'MAX_SNAPSHOT_BYTES', 1024)
+    blob = MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(b'\0' * 1025)
+
+    with pytest.raises(SnapshotError, match='larger than'):
+        decode_snapshot(blob)
+
+
+def test_truncated_snapshot_rejected(app, make_game):
+    blob = export_game(make_game())
+
+    with pytest.raises(SnapshotError, match='Corrupt'):
+        decode_snapshot(blob[:-4])
@@ -0,0 +1,27 @@
+"""Training queue"""
+
+from datetime import datetime, timedelta
+
+from models.db import db, TrainingBatch
+from models.training import next_training_wave
+
+
+def add_batch(game_id, started_at, trained, wave_size, seconds_per_wave):
+    batch = TrainingBatch(game_id=game_id, building_type='barracks', unit_type='soldier', race='Human',
+                          count=10, trained=trained, wave_size=wave_size, seconds_per_wave=seconds_per_wave,
+                          started_at=started_at, completes_at=started_at + timedelta(hours=1))
+    db.session.add(batch)
+    return batch
+
+
+def test_next_training_wave_matches_batches(app, make_game):
+    game_id = make_game()
+    assert next_training_wave(game_id) is None
+
+    start = datetime(2026, 1, 1, 12, 0, 0, 250000)
+    batches = [add_batch(game_id, start, 3, 2, 7.5),
+               add_batch(game_id, start - timedelta(seconds=50), 0, 1, 100)]
+    db.session.commit()
+
+    assert next_training_wave(game_id) == min(batch.next_wave_at() for batch in batches)
+    assert next_training_wave(game_id) == datetime(2026, 1, 1, 12, 0, 15, 250000)
@@ -0,0 +1,29 @@
+"""Recruitment routes"""
+
+from datetime import datetime, timedelta
+
+from models.db import db, ConstructionJob, Resource, TrainingBatch
+
+
+def test_recruit_with_barracks_due_but_unresolved(client, make_game):
+    game_id = make_game()
+    now = datetime.utcnow()
+    db.session.add(ConstructionJob(game_id=game_id, building_type='barracks', from_level=0, target_level=1,
+                                   started_at=now - timedelta(minutes=2), completes_at=now - timedelta(minutes=1)))
+    for resource_type in ('gold', 'food', 'wood', 'iron', 'stone', 'crystal'):
+        db.session.add(Resource(game_id=game_id, resource_type=resource_type, amount=10000))
+    db.session.commit()
+
+    response = client.post(f'/api/game/unit/{game_id}/recruit',
+                           json={'unit_type': 'soldier', 'race': 'Human', 'count': 1})
+
+    assert response.status_code == 201, response.get_json()
+    assert TrainingBatch.query.filter_by(game_id=game_id).count() == 1
+
+
+def test_recruit_without_barracks(client, make_game):
+    game_id = make_game()
+    response = client.post(f'/api/game/unit/{game_id}/recruit',
+                           json={'unit_type': 'soldier', 'race': 'Human', 'count': 1})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'No barracks in town'
@@ -110,6 +110,8 @@ const AttackModal: React.FC<AttackModalProps> = ({ tile, gameId, onClose, onAtta
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
+          // The server computes power for these units with bonuses applied
+          units: unitSelection,
           player_power: playerPower
         })
       });
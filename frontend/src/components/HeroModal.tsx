@@ -1,5 +1,5 @@
 import React, { FC, useState, useEffect } from 'react';
-import { SavedGame, Item } from '../services/gameService';
+import { SavedGame, Item, HeroStats, gameService } from '../services/gameService';
 import imageUtils from '../utils/imageUtils';
 import './HeroModal.css';
 
@@ -9,7 +9,11 @@ interface HeroModalProps {
 }
 
 export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
-  const [items, setItems] = useState<Item[]>([]);
+  const [equippedItems, setEquippedItems] = useState<Item[]>([]);
+  const [inventoryItems, setInventoryItems] = useState<Item[]>([]);
+  const [nextCursor, setNextCursor] = useState<number | null>(null);
+  const [inventoryCount, setInventoryCount] = useState(0);
+  const [stats, setStats] = useState<HeroStats | null>(null);
   const [selectedItem, setSelectedItem] = useState<Item | null>(null);
 
   useEffect(() => {
@@ -18,11 +22,28 @@ export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
 
   const loadItems = async () => {
     try {
-      const response = await fetch(`http://localhost:5000/api/game/load/${gameState.id}`);
-      const data = await response.json();
-      if (data.items) {
-        setItems(data.items);
-      }
+      // The hero with equipped items (stats include equipment and
+      // talents), plus the first page of the inventory
+      const [hero, inventory] = await Promise.all([
+        gameService.getHero(gameState.id),
+        gameService.getItems(gameState.id, { equipped: false }),
+      ]);
+      setEquippedItems(hero.data.equipped);
+      setStats(hero.data.stats.total);
+      setInventoryItems(inventory.data.items);
+      setNextCursor(inventory.data.next_cursor);
+      setInventoryCount(inventory.data.counts.unequipped);
+    } catch (error) {
+      console.error('Failed to load items:', error);
+    }
+  };
+
+  const loadMoreItems = async () => {
+    if (nextCursor === null) return;
+    try {
+      const response = await gameService.getItems(gameState.id, { equipped: false, cursor: nextCursor });
+      setInventoryItems(prev => [...prev, ...response.data.items]);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Failed to load items:', error);
     }
@@ -56,8 +77,6 @@ export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
     }
   };
 
-  const equippedItems = items.filter(item => item.equipped);
-  const inventoryItems = items.filter(item => !item.equipped);
 
   const getItemsBySlot = (slot: string) => {
     return equippedItems.find(item => item.template_data.slot === slot);
@@ -107,19 +126,19 @@ export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
                 </div>
                 <div className="hero-stat-item">
                   <span className="stat-label">Attack</span>
-                  <span className="stat-value">⚔️ {gameState.hero_attack || 10}</span>
+                  <span className="stat-value">⚔️ {stats?.physical_attack ?? '-'}</span>
                 </div>
                 <div className="hero-stat-item">
                   <span className="stat-label">Defense</span>
-                  <span className="stat-value">🛡️ {gameState.hero_defense || 8}</span>
+                  <span className="stat-value">🛡️ {stats?.physical_defense ?? '-'}</span>
                 </div>
                 <div className="hero-stat-item">
                   <span className="stat-label">Magic</span>
-                  <span className="stat-value">✨ {gameState.hero_magic || 5}</span>
+                  <span className="stat-value">✨ {stats?.magical_attack ?? '-'}</span>
                 </div>
                 <div className="hero-stat-item">
                   <span className="stat-label">HP</span>
-                  <span className="stat-value">❤️ {gameState.hero_hp || 100}</span>
+                  <span className="stat-value">❤️ {stats?.health_point ?? '-'}</span>
                 </div>
               </div>
             </div>
@@ -183,7 +202,7 @@ export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
             </div>
 
             <div className="hero-inventory-section">
-              <h3>🎒 Inventory ({inventoryItems.length} items)</h3>
+              <h3>🎒 Inventory ({inventoryCount} items)</h3>
               {inventoryItems.length === 0 ? (
                 <div className="hero-empty-inventory">No items in inventory</div>
               ) : (
@@ -194,7 +213,10 @@ export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
                       className={`hero-item-card rarity-${item.rarity}`}
                       onClick={() => setSelectedItem(item)}
                     >
-                      <div className="hero-item-name">{item.template_data.name}</div>
+                      <div className="hero-item-name">
+                        {item.template_data.name}
+                        {item.quantity > 1 && ` ×${item.quantity}`}
+                      </div>
                       <div className="hero-item-type">{item.template_data.slot}</div>
                       <div className="hero-item-rarity">{item.rarity}</div>
                       <button 
@@ -210,6 +232,11 @@ export const HeroModal: FC<HeroModalProps> = ({ gameState, onClose }) => {
                   ))}
                 </div>
               )}
+              {nextCursor !== null && (
+                <button className="hero-load-more-btn" onClick={loadMoreItems}>
+                  Load more
+                </button>
+              )}
             </div>
 
             {selectedItem && (
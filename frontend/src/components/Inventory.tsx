@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { Item } from '../services/gameService';
+import { Item, gameService } from '../services/gameService';
 import './Inventory.css';
 
 interface InventoryProps {
@@ -8,7 +8,10 @@ interface InventoryProps {
 }
 
 const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
-  const [items, setItems] = useState<Item[]>([]);
+  const [equippedItems, setEquippedItems] = useState<Item[]>([]);
+  const [inventoryItems, setInventoryItems] = useState<Item[]>([]);
+  const [nextCursor, setNextCursor] = useState<number | null>(null);
+  const [inventoryCount, setInventoryCount] = useState(0);
   const [loading, setLoading] = useState(true);
   const [selectedItem, setSelectedItem] = useState<Item | null>(null);
 
@@ -18,11 +21,15 @@ const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
 
   const loadItems = async () => {
     try {
-      const response = await fetch(`http://localhost:5000/api/game/load/${gameId}`);
-      const data = await response.json();
-      if (data.items) {
-        setItems(data.items);
-      }
+      // Equipped items plus the first page of the rest
+      const [equipped, inventory] = await Promise.all([
+        gameService.getItems(gameId, { equipped: true }),
+        gameService.getItems(gameId, { equipped: false }),
+      ]);
+      setEquippedItems(equipped.data.items);
+      setInventoryItems(inventory.data.items);
+      setNextCursor(inventory.data.next_cursor);
+      setInventoryCount(inventory.data.counts.unequipped);
       setLoading(false);
     } catch (error) {
       console.error('Failed to load items:', error);
@@ -30,6 +37,17 @@ const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
     }
   };
 
+  const loadMoreItems = async () => {
+    if (nextCursor === null) return;
+    try {
+      const response = await gameService.getItems(gameId, { equipped: false, cursor: nextCursor });
+      setInventoryItems(prev => [...prev, ...response.data.items]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Failed to load items:', error);
+    }
+  };
+
   const handleEquip = async (itemId: number) => {
     try {
       const response = await fetch(`http://localhost:5000/api/game/${gameId}/item/${itemId}/equip`, {
@@ -58,8 +76,18 @@ const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
     }
   };
 
-  const equippedItems = items.filter(item => item.equipped);
-  const inventoryItems = items.filter(item => !item.equipped);
+
+  const handleSalvage = async (itemId: number) => {
+    try {
+      const response = await gameService.salvageItems(gameId, { item_ids: [itemId] });
+      if (response.data.success) {
+        setSelectedItem(null);
+        loadItems();
+      }
+    } catch (error) {
+      console.error('Failed to salvage item:', error);
+    }
+  };
 
   const getItemsBySlot = (slot: string) => {
     return equippedItems.find(item => item.template_data.slot === slot);
@@ -115,7 +143,7 @@ const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
               </div>
 
               <div className="inventory-section">
-                <h3>Inventory ({inventoryItems.length} items)</h3>
+                <h3>Inventory ({inventoryCount} items)</h3>
                 {inventoryItems.length === 0 ? (
                   <div className="empty-inventory">No items in inventory</div>
                 ) : (
@@ -126,7 +154,10 @@ const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
                         className={`item-card rarity-${item.rarity}`}
                         onClick={() => setSelectedItem(item)}
                       >
-                        <div className="item-name">{item.template_data.name}</div>
+                        <div className="item-name">
+                          {item.template_data.name}
+                          {item.quantity > 1 && <span className="item-quantity"> ×{item.quantity}</span>}
+                        </div>
                         <div className="item-type">{item.template_data.slot}</div>
                         <div className="item-rarity">{item.rarity}</div>
                         <button 
@@ -138,10 +169,24 @@ const Inventory: React.FC<InventoryProps> = ({ gameId, onClose }) => {
                         >
                           Equip
                         </button>
+                        <button 
+                          className="salvage-btn"
+                          onClick={(e) => {
+                            e.stopPropagation();
+                            handleSalvage(item.id);
+                          }}
+                        >
+                          Salvage
+                        </button>
                       </div>
                     ))}
                   </div>
                 )}
+                {nextCursor !== null && (
+                  <button className="load-more-btn" onClick={loadMoreItems}>
+                    Load more
+                  </button>
+                )}
               </div>
 
               {selectedItem && (
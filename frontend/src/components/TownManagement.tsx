@@ -1,5 +1,5 @@
 import React, { FC, useEffect, useState } from 'react';
-import { gameService, SavedGame, Resources, Building, Unit, BuildingType, UnitType } from '../services/gameService';
+import { gameService, SavedGame, Resources, Building, Unit, BuildingType, UnitType, TownSnapshot, TownStreamEvent } from '../services/gameService';
 import imageUtils from '../utils/imageUtils';
 import { GameHeader } from './GameHeader';
 import { HeroModal } from './HeroModal';
@@ -38,12 +38,84 @@ export const TownManagement: FC<TownManagementProps> = ({ gameId, heroRace, onLo
     loadAvailableUnits();
   }, [gameId, heroRace]);
 
-  // Auto-refresh game state every 2 seconds to show production in real-time
+  // Live updates: the server sends one snapshot (amounts + rates), then only
+  // deltas. Resources are extrapolated locally so no polling is needed.
   useEffect(() => {
-    const interval = setInterval(() => {
+    let anchor = { resources: {} as Resources, rates: {} as Resources, caps: {} as Resources, time: Date.now() };
+    let hasSnapshot = false;
+
+    const currentResources = (): Resources => {
+      const elapsed = (Date.now() - anchor.time) / 1000;
+      const resources: Resources = { ...anchor.resources };
+      Object.entries(anchor.rates).forEach(([type, rate]) => {
+        const amount = resources[type] || 0;
+        const cap = anchor.caps[type] ?? Infinity;
+        // Production stops at the storage cap but never lowers an amount above it
+        resources[type] = amount >= cap ? amount : Math.min(cap, amount + rate * elapsed);
+      });
+      return resources;
+    };
+
+    const source = new EventSource(gameService.townStreamUrl(gameId));
+
+    source.addEventListener('snapshot', (e) => {
+      const snapshot: TownSnapshot = JSON.parse((e as MessageEvent).data);
+      anchor = { resources: snapshot.resources, rates: snapshot.rates, caps: snapshot.caps || {}, time: Date.now() };
+      hasSnapshot = true;
+    });
+
+    const handleDelta = (e: Event) => {
+      const event: TownStreamEvent = JSON.parse((e as MessageEvent).data);
+      if (event.rates) {
+        // Re-anchor at now so the new rates only apply from this point on
+        anchor = { resources: currentResources(), rates: event.rates, caps: event.caps || anchor.caps, time: Date.now() };
+      }
+      Object.entries(event.resources || {}).forEach(([type, delta]) => {
+        anchor.resources[type] = (anchor.resources[type] || 0) + delta;
+      });
+
+      setGameState((prev) => {
+        if (!prev) return prev;
+        if (event.building) {
+          const building = event.building;
+          const exists = prev.buildings.some((b) => b.id === building.id);
+          return {
+            ...prev,
+            buildings: exists
+              ? prev.buildings.map((b) => (b.id === building.id ? building : b))
+              : [...prev.buildings, building],
+          };
+        }
+        if (event.unit) {
+          const unit = event.unit;
+          const exists = prev.units.some((u) => u.id === unit.id);
+          return {
+            ...prev,
+            units: exists ? prev.units.map((u) => (u.id === unit.id ? unit : u)) : [...prev.units, unit],
+          };
+        }
+        return prev;
+      });
+    };
+
+    ['building_created', 'building_upgraded', 'units_recruited', 'resources_changed'].forEach((type) =>
+      source.addEventListener(type, handleDelta)
+    );
+
+    // Events were lost: reload the town; the stream reconnects with a new snapshot
+    source.addEventListener('resync', () => {
       loadGameState();
-    }, 2000);
-    return () => clearInterval(interval);
+    });
+
+    const ticker = setInterval(() => {
+      if (!hasSnapshot) return;
+      setGameState((prev) => (prev ? { ...prev, resources: currentResources() } : prev));
+    }, 1000);
+
+    return () => {
+      clearInterval(ticker);
+      source.close();
+    };
   }, [gameId]);
 
   const loadGameState = async () => {
@@ -99,6 +99,7 @@ export interface Item {
   id: number;
   item_template: string;
   rarity: string;
+  quantity: number;  // identical unequipped items share one stack
   equipped: boolean;
   stats: {
     [key: string]: number;
@@ -128,7 +129,65 @@ export interface SavedGame {
   items: Item[];
 }
 
+// GET /game/<id>/hero: stats after equipment and talents
+export interface HeroDetails {
+  game_id: number;
+  hero_name: string;
+  hero_class: string;
+  hero_race: string;
+  level: number;
+  experience: number;
+  xp_needed: number;
+  stats: {
+    base: HeroStats;
+    equipment: Partial<HeroStats>;
+    multiplier: number;
+    total: HeroStats;
+    version: number;
+  };
+  equipped: Item[];
+}
+
+// GET /game/<id>/items: one page of items, newest first
+export interface ItemFilters {
+  type?: string;
+  rarity?: string;
+  equipped?: boolean;
+  limit?: number;
+  cursor?: number;
+}
+
+export interface ItemCounts {
+  total: number;
+  equipped: number;
+  unequipped: number;
+  by_rarity: { [rarity: string]: number };
+  by_type: { [type: string]: number };
+}
+
+export interface ItemPage {
+  items: Item[];
+  next_cursor: number | null;  // pass as cursor for the next page
+  counts: ItemCounts;
+}
+
+// POST /game/<id>/items/salvage: select stacks by id, or by type and rarity
+export interface SalvageRequest {
+  item_ids?: number[];
+  type?: string;
+  rarity?: string;
+}
+
+export interface SalvageResult {
+  success: boolean;
+  stacks: number;
+  items: number;
+  gold: number;
+  counts: ItemCounts;
+}
+
 export interface SaveGameRequest {
+  game_id?: number;  // update this game, writing only what changed
   hero_name: string;
   hero_class: string;
   hero_race: string;
@@ -143,6 +202,12 @@ export interface SaveGameResponse {
   message: string;
   game_id: number;
   saved_at: string;
+  changes?: { hero: number; resources: number; buildings: number; units: number };
+}
+
+export interface ImportGameResponse {
+  message: string;
+  game_id: number;
 }
 
 export type SaveGameSummary = Omit<SavedGame, 'resources' | 'buildings' | 'units'>;
@@ -166,8 +231,26 @@ export interface UnitType {
   hp: number;
 }
 
+export interface TownSnapshot {
+  resources: Resources;
+  rates: Resources;
+  caps?: Resources;       // storage limit per resource; production stops there
+  anchor: string;
+}
+
+export interface TownStreamEvent {
+  type: 'building_created' | 'building_upgraded' | 'units_recruited' | 'resources_changed';
+  resources?: Resources;  // deltas to apply to the anchor amounts
+  rates?: Resources;      // new production rates, when they changed
+  caps?: Resources;       // new storage limits, when they changed
+  building?: Building;
+  unit?: Unit;
+}
+
 export interface ProductionRates {
   production_rates: Resources;
+  storage_caps: Resources;
+  full_at: { [key: string]: string };  // when each produced resource hits its cap
   calculated_at: string;
 }
 
@@ -187,16 +270,42 @@ export const gameService = {
   saveGame: (gameData: SaveGameRequest): Promise<AxiosResponse<SaveGameResponse>> =>
     axios.post(`${endpoints.game}/save`, gameData),
 
+  // Whole-game binary snapshots
+  exportGame: (gameId: number): Promise<AxiosResponse<ArrayBuffer>> =>
+    axios.get(`${endpoints.game}/${gameId}/export`, { responseType: 'arraybuffer' }),
+
+  importGame: (snapshot: ArrayBuffer): Promise<AxiosResponse<ImportGameResponse>> =>
+    axios.post(`${endpoints.game}/import`, snapshot, {
+      headers: { 'Content-Type': 'application/vnd.carondor.snapshot' },
+    }),
+
+  cloneGame: (gameId: number): Promise<AxiosResponse<ImportGameResponse>> =>
+    axios.post(`${endpoints.game}/${gameId}/clone`),
+
   loadGame: (gameId: number): Promise<AxiosResponse<SavedGame>> =>
     axios.get(`${endpoints.game}/load/${gameId}`),
 
   listGames: (): Promise<AxiosResponse<SaveGameSummary[]>> =>
     axios.get(`${endpoints.game}/list`),
 
+  getHero: (gameId: number): Promise<AxiosResponse<HeroDetails>> =>
+    axios.get(`${endpoints.game}/${gameId}/hero`),
+
+  getItems: (gameId: number, filters: ItemFilters = {}): Promise<AxiosResponse<ItemPage>> =>
+    axios.get(`${endpoints.game}/${gameId}/items`, { params: filters }),
+
+  salvageItems: (gameId: number, selection: SalvageRequest): Promise<AxiosResponse<SalvageResult>> =>
+    axios.post(`${endpoints.game}/${gameId}/items/salvage`, selection),
+
   // Town management
   getTownStatus: (gameId: number): Promise<AxiosResponse<SavedGame>> =>
     axios.get(`${endpoints.game}/town/${gameId}`),
 
+  // Server-Sent Events stream: one snapshot, then deltas (see TownStreamEvent);
+  // a save sends a new snapshot; a 'resync' event means deltas were lost and the stream is about to reconnect
+  townStreamUrl: (gameId: number): string =>
+    `${endpoints.game}/town/${gameId}/stream`,
+
   // Resources
   getResource: (gameId: number, resourceType: string): Promise<AxiosResponse<{ type: string; amount: number; name: string }>> =>
     axios.get(`${endpoints.game}/resource/${gameId}/${resourceType}`),